@@ -0,0 +1,162 @@
+import contextvars
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import SynchronousOnlyOperation
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# Primary/replica database routing
+#
+# Writes go to the primary ('default'); reads go to a random healthy replica
+# (settings.DATABASE_REPLICAS) except when they must see this request's
+# writes. A request reads from the primary once it has written, from the
+# start if it is a POST, PUT, PATCH or DELETE, inside use_primary(), and
+# whenever the primary is in a transaction. Outside requests (management
+# commands, flusher threads) only the last two apply. Each process checks
+# every DATABASE_REPLICA_CHECK_SECONDS that its replicas answer and have
+# applied the primary's migrations, and leaves out those that do not.
+
+WRITE_METHODS = frozenset(['POST', 'PUT', 'PATCH', 'DELETE'])
+
+
+class _Pin:
+    """
+    Whether the current request reads from the primary. Mutable and shared
+    with nested scopes, so a write made in a copied context (sync_to_async)
+    still pins the whole request.
+    """
+    __slots__ = ('primary', 'parent')
+
+    def __init__(self, primary=False, parent=None):
+        self.primary = primary
+        self.parent = parent
+
+    def stick(self):
+        pin = self
+        while pin is not None:
+            pin.primary = True
+            pin = pin.parent
+
+
+_pin = contextvars.ContextVar('eveshield_db_pin', default=None)
+
+
+@contextmanager
+def use_primary():
+    """Read from the primary inside the block"""
+    token = _pin.set(_Pin(primary=True, parent=_pin.get()))
+    try:
+        yield
+    finally:
+        _pin.reset(token)
+
+
+class ReadYourWritesMiddleware:
+    """
+    Scopes read-your-writes stickiness to one request.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _pin.set(_Pin(primary=request.method in WRITE_METHODS))
+        try:
+            return self.get_response(request)
+        finally:
+            _pin.reset(token)
+
+    async def __acall__(self, request):
+        token = _pin.set(_Pin(primary=request.method in WRITE_METHODS))
+        try:
+            return await self.get_response(request)
+        finally:
+            _pin.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._health = {}  # replica alias -> (answered, monotonic time to check again)
+
+    def db_for_read(self, model, **hints):
+        pin = _pin.get()
+        if pin is not None and pin.primary:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db  # related objects come from where their instance did
+        replicas = self.healthy_replicas()
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        pin = _pin.get()
+        if pin is not None:
+            pin.stick()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication
+        return db == DEFAULT_DB_ALIAS
+
+    def healthy_replicas(self):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', ())
+        if not replicas:
+            return []
+        now = time.monotonic()
+        healthy = []
+        for alias in replicas:
+            with self._lock:
+                answered, check_at = self._health.get(alias, (True, 0))
+            if check_at <= now:
+                answered = self.check(alias)
+            if answered:
+                healthy.append(alias)
+        return healthy
+
+    def check(self, alias):
+        """
+        Whether a replica answers with the primary's schema; the answer is
+        kept for DATABASE_REPLICA_CHECK_SECONDS. A replica that has not
+        applied every migration the primary has (an empty file, a copy that
+        stopped replicating before a deploy) is left out like a dead one.
+        """
+        try:
+            applied = self.applied_migrations(DEFAULT_DB_ALIAS)
+            connection = connections[alias]
+            connection.ensure_connection()
+            answered = self.applied_migrations(alias) >= applied
+            if not answered:
+                print(f"Database replica {alias} is behind the primary's migrations, reading from the primary")
+        except SynchronousOnlyOperation:
+            # Routed from async code; check on the next synchronous read instead
+            return self._health.get(alias, (True, 0))[0]
+        except Exception as e:
+            print(f"Database replica {alias} is unavailable, reading from the primary: {e}")
+            answered = False
+        with self._lock:
+            self._health[alias] = (answered, time.monotonic() + getattr(settings, 'DATABASE_REPLICA_CHECK_SECONDS', 5.0))
+        return answered
+
+    @staticmethod
+    def applied_migrations(alias):
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM django_migrations')
+            return cursor.fetchone()[0]
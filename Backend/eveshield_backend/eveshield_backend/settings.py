@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import time, timedelta
 
@@ -40,6 +41,8 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'users.apps.UsersConfig',
+    'trigger.apps.TriggerConfig',
+    'tracking.apps.TrackingConfig',
     'rest_framework_simplejwt',
     'rest_framework.authtoken',
     'rest_framework_simplejwt.token_blacklist',
@@ -47,6 +50,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so reads made anywhere in a request that writes go to the primary
+    'eveshield_backend.routers.ReadYourWritesMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -68,10 +73,53 @@ CORS_ALLOWED_ORIGINS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ]
 }
 
+# Per-process cache of authenticated users (users/authentication.py). Saves and
+# deletes in this process invalidate it at once; other processes see them
+# within TTL_SECONDS.
+AUTH_USER_CACHE = {
+    "TTL_SECONDS": 30,
+    "MAX_ENTRIES": 10_000,
+}
+
+# Threads async register/login hash passwords on, off the event loop (users/passwords.py)
+PASSWORD_HASHER_POOL = {
+    "WORKERS": min(4, os.cpu_count() or 1),
+    "MAX_PENDING": 64,            # hashes waiting beyond this get 503 instead of queueing
+}
+
+# Shared secret internal services (the Flask voice pipeline) send in X-Service-Token
+SERVICE_TOKEN = os.getenv("EVESHIELD_SERVICE_TOKEN")
+
+# SOS presses are acknowledged from memory and written behind in batches (trigger/buffer.py)
+SOS_QUEUE = {
+    "MAX_PENDING": 100_000,       # beyond this new presses get 503 instead of growing memory
+    "BATCH_SIZE": 1000,           # rows per bulk_create transaction
+    "FLUSH_INTERVAL": 0.2,        # seconds between flushes
+    # The voice pipeline's /sos-events endpoint, which feeds the dashboard
+    "PUBLISH_URL": os.getenv("EVESHIELD_SOS_EVENTS_URL"),
+    "PUBLISH_TIMEOUT": 2.0,
+}
+
+# GPS pings are buffered per user and stored as compressed chunks (tracking/store.py)
+TRACKING = {
+    "CHUNK_POINTS": 120,              # points per stored chunk (two minutes at one ping a second)
+    "MAX_CHUNK_AGE": 30.0,            # seconds before a partial chunk is written anyway
+    "FLUSH_INTERVAL": 1.0,
+    "MAX_PENDING_POINTS": 500_000,    # beyond this new pings get 503 instead of growing memory
+    "LATEST_TTL": 2.0,                # seconds a latest position is served from memory
+    "LATEST_IDLE": 3600.0,            # seconds before an unused latest position is forgotten
+}
+
+# Per-process cache for caller lookups by E.164 number (users/directory.py)
+CALLER_LOOKUP_CACHE = {
+    "TTL_SECONDS": 60,
+    "MAX_ENTRIES": 50_000,
+}
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=15),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=14),
@@ -98,6 +146,16 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
 }
 
+# In-memory blacklist check in front of the token_blacklist tables (users/blacklist.py).
+# Run `python manage.py prune_tokens` daily to delete expired tokens.
+TOKEN_BLACKLIST_CACHE = {
+    "CAPACITY": 1_000_000,
+    "ERROR_RATE": 0.001,
+    "LRU_SIZE": 10_000,
+    "REFRESH_SECONDS": 1.0,
+    "REBUILD_SECONDS": 3600,
+}
+
 ROOT_URLCONF = 'eveshield_backend.urls'
 
 TEMPLATES = [
@@ -121,12 +179,61 @@ WSGI_APPLICATION = 'eveshield_backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+#
+# 'default' is the primary. Read replicas are listed in EVESHIELD_DB_REPLICAS
+# (Postgres hosts, or SQLite paths) and become 'replica_1', 'replica_2', ...;
+# eveshield_backend.routers sends reads there and keeps each request that
+# writes on the primary. Nothing here replicates: Postgres replicas need
+# streaming replication, and SQLite paths must be mirrors kept current by an
+# external tool (e.g. Litestream), which makes them useful for tests and
+# single-host setups only. Migrations only run on the primary, and a replica
+# that lacks any of its migrations is not read from.
+
+DB_ENGINE = os.getenv("EVESHIELD_DB_ENGINE", "sqlite")
+DB_REPLICAS = [replica for replica in os.getenv("EVESHIELD_DB_REPLICAS", "").split(",") if replica]
+
+
+def database(location):
+    if DB_ENGINE == "postgres":
+        return {
+            'ENGINE': 'django.db.backends.postgresql',
+            'HOST': location,
+            'PORT': os.getenv("EVESHIELD_DB_PORT", "5432"),
+            'NAME': os.getenv("EVESHIELD_DB_NAME", "eveshield"),
+            'USER': os.getenv("EVESHIELD_DB_USER", "eveshield"),
+            'PASSWORD': os.getenv("EVESHIELD_DB_PASSWORD", ""),
+            # psycopg 3's connection pool (pip install "psycopg[pool]"); pooling replaces CONN_MAX_AGE
+            'OPTIONS': {'pool': {'min_size': 2, 'max_size': int(os.getenv("EVESHIELD_DB_POOL_SIZE", "10"))}},
+        }
+    return {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': location,
+        # Keep connections open between requests, checked before reuse
+        'CONN_MAX_AGE': int(os.getenv("EVESHIELD_DB_CONN_MAX_AGE", "60")),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # WAL lets readers run alongside the writer; IMMEDIATE takes the write
+            # lock when a transaction starts so concurrent writers wait for it
+            # (up to timeout seconds) instead of failing with "database is locked"
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
+
+
+DATABASES = {
+    'default': database(os.getenv("EVESHIELD_DB_HOST", "localhost") if DB_ENGINE == "postgres" else BASE_DIR / 'db.sqlite3'),
 }
+for number, replica in enumerate(DB_REPLICAS, 1):
+    DATABASES[f'replica_{number}'] = {**database(replica), 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['eveshield_backend.routers.PrimaryReplicaRouter']
+
+# How often each process checks that its replicas answer; one that does not
+# is left out of reads until it answers again
+DATABASE_REPLICA_CHECK_SECONDS = 5.0
 
 
 # Password validation
@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import tempfile
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import connections, router, transaction
+from django.db.utils import load_backend
+from django.test import RequestFactory, TransactionTestCase, override_settings
+
+from rest_framework_simplejwt.tokens import AccessToken
+
+from tracking.store import TrackStore
+from users.authentication import CachedJWTAuthentication, user_cache
+from users.directory import CallerDirectory
+from .routers import PrimaryReplicaRouter, ReadYourWritesMiddleware, use_primary
+
+# ========= TEST CASES FOR PRIMARY/REPLICA ROUTING ========
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'])
+class PrimaryReplicaRouterTestCase(TransactionTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        # Two local SQLite databases: the test primary and a copy of it as the replica
+        self.add_replica('replica_1', self.copy_primary('replica.sqlite3'))
+
+        self.router = next(r for r in router.routers if isinstance(r, PrimaryReplicaRouter))
+        self.router._health.clear()
+        self.factory = RequestFactory()
+        self.User = get_user_model()
+
+    def copy_primary(self, filename):
+        path = os.path.join(self.directory, filename)
+        connections['default'].ensure_connection()
+        copy = sqlite3.connect(path)
+        connections['default'].connection.backup(copy)
+        copy.close()
+        return path
+
+    def add_replica(self, alias, name):
+        settings_dict = {**connections['default'].settings_dict, 'NAME': name}
+        connections[alias] = load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, alias)
+
+        def remove():
+            connections[alias].close()
+            del connections[alias]
+        self.addCleanup(remove)
+
+    def create_user(self):
+        return self.User.objects.create_user(phone_number="+254712345678", username="Test User", password="pw")
+
+    def test_reads_go_to_a_replica_and_writes_to_the_primary(self):
+        self.assertEqual(self.User.objects.all().db, 'replica_1')
+        self.assertEqual(router.db_for_write(self.User), 'default')
+
+        with transaction.atomic():
+            self.assertEqual(self.User.objects.all().db, 'default')
+        with use_primary():
+            self.assertEqual(self.User.objects.all().db, 'default')
+
+    def test_a_request_reads_its_own_writes(self):
+        seen = []
+
+        def view(request):
+            seen.append(self.User.objects.all().db)
+            if request.GET.get('write'):
+                self.create_user()
+            seen.append(self.User.objects.all().db)
+
+        middleware = ReadYourWritesMiddleware(view)
+        middleware(self.factory.get('/'))
+        middleware(self.factory.get('/', {'write': '1'}))
+        middleware(self.factory.post('/'))
+
+        self.assertEqual(seen, ['replica_1', 'replica_1', 'replica_1', 'default', 'default', 'default'])
+        self.assertEqual(self.User.objects.all().db, 'replica_1')
+
+    def test_writes_in_async_requests_stick_too(self):
+        async def view(request):
+            await sync_to_async(self.create_user)()
+            return await sync_to_async(lambda: self.User.objects.all().db)()
+
+        self.assertEqual(async_to_sync(ReadYourWritesMiddleware(view))(self.factory.get('/')), 'default')
+
+    def test_cache_misses_read_from_the_primary(self):
+        # The replica was copied before the user existed, so a read routed there would miss it
+        user = self.create_user()
+        user_cache.clear()
+        token = AccessToken.for_user(user)
+
+        self.assertEqual(CachedJWTAuthentication().get_user(token).pk, user.pk)
+        user_cache.clear()
+        self.assertEqual(async_to_sync(CachedJWTAuthentication().aget_user)(token).pk, user.pk)
+        self.assertEqual(CallerDirectory().lookup('+254712345678')['user_id'], str(user.pk))
+
+        store = TrackStore(autostart=False)
+        self.assertIsNone(store.latest_position(user.pk))
+        self.assertEqual(store.track(user.pk, user.date_joined, user.date_joined), [])
+
+    def test_unavailable_replica_is_left_out(self):
+        self.add_replica('replica_2', os.path.join(self.directory, 'missing', 'replica.sqlite3'))
+
+        with self.settings(DATABASE_REPLICAS=['replica_2', 'replica_1']):
+            self.assertEqual({self.User.objects.all().db for _ in range(20)}, {'replica_1'})
+            self.assertFalse(self.router._health['replica_2'][0])
+
+        with self.settings(DATABASE_REPLICAS=['replica_2']):
+            self.assertEqual(self.User.objects.all().db, 'default')
+
+    def test_replica_without_the_schema_is_left_out(self):
+        self.add_replica('replica_2', os.path.join(self.directory, 'empty.sqlite3'))
+
+        with self.settings(DATABASE_REPLICAS=['replica_2']):
+            self.assertEqual(self.User.objects.all().db, 'default')
+            self.assertFalse(self.router._health['replica_2'][0])
+
+    def test_replica_behind_the_primary_migrations_is_left_out(self):
+        with connections['replica_1'].cursor() as cursor:
+            cursor.execute('DELETE FROM django_migrations WHERE id = (SELECT MAX(id) FROM django_migrations)')
+
+        self.assertEqual(self.User.objects.all().db, 'default')
+        self.assertFalse(self.router._health['replica_1'][0])
+
+    def test_sqlite_connections_use_wal(self):
+        with connections['replica_1'].cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+        self.assertEqual(connections['replica_1'].transaction_mode, 'IMMEDIATE')
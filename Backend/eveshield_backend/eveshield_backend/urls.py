@@ -20,8 +20,8 @@ from django.urls import path, include
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/users/', include('users.urls')),
-    # path('api/trigger/', include('trigger.urls')),
-    # path('api/tracking/', include('tracking.urls')),
+    path('api/trigger/', include('trigger.urls')),
+    path('api/tracking/', include('tracking.urls')),
     # path('api/onboarding/', include('onboarding.urls')),
     # path('api/resources/', include('resources.urls')),
 ]
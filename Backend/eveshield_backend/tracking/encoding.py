@@ -0,0 +1,91 @@
+import struct
+import sys
+import zlib
+from array import array
+
+
+# Chunk format for a run of GPS points
+#
+# Coordinates are quantized to microdegrees (about 11 cm at the equator)
+# and times to milliseconds. The first point is stored in the header; the
+# rest are stored as differences from the previous point in typed arrays,
+# which for a moving phone are small, repetitive numbers that zlib packs
+# into a few bytes per point.
+#
+#   header: version, count, t0 (ms since epoch), lat0, lon0 (microdegrees)
+#   body (zlib): time deltas int64[count-1], lat deltas int32[count-1],
+#                lon deltas int32[count-1], accuracy uint16[count] (metres, 0 unknown)
+
+VERSION = 1
+HEADER = struct.Struct('<BIqii')
+SCALE = 1_000_000
+
+
+def _little_endian(values):
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def _quantize(value):
+    return int(round(value * SCALE))
+
+
+def encode_points(points):
+    """
+    Pack (time_ms, latitude, longitude, accuracy) tuples, sorted by time,
+    into bytes.
+    """
+    if not points:
+        raise ValueError("A chunk needs at least one point")
+    points = sorted(points, key=lambda point: point[0])
+
+    times = [int(point[0]) for point in points]
+    lats = [_quantize(point[1]) for point in points]
+    lons = [_quantize(point[2]) for point in points]
+    accuracy = array('H', (min(65535, int(round(point[3]))) if point[3] else 0 for point in points))
+
+    body = b''.join([
+        _little_endian(array('q', (b - a for a, b in zip(times, times[1:])))).tobytes(),
+        _little_endian(array('i', (b - a for a, b in zip(lats, lats[1:])))).tobytes(),
+        _little_endian(array('i', (b - a for a, b in zip(lons, lons[1:])))).tobytes(),
+        _little_endian(accuracy).tobytes(),
+    ])
+    return HEADER.pack(VERSION, len(points), times[0], lats[0], lons[0]) + zlib.compress(body, 6)
+
+
+def _read(typecode, body, offset, count):
+    values = array(typecode)
+    size = values.itemsize * count
+    values.frombytes(body[offset:offset + size])
+    return _little_endian(values), offset + size
+
+
+def _running(start, deltas):
+    values = [start]
+    for delta in deltas:
+        values.append(values[-1] + delta)
+    return values
+
+
+def decode_points(data):
+    """
+    The (time_ms, latitude, longitude, accuracy) tuples of a chunk; accuracy
+    is None when it was not reported.
+    """
+    version, count, t0, lat0, lon0 = HEADER.unpack_from(data)
+    if version != VERSION:
+        raise ValueError(f"Unknown track chunk version {version}")
+    body = zlib.decompress(data[HEADER.size:])
+
+    time_deltas, offset = _read('q', body, 0, count - 1)
+    lat_deltas, offset = _read('i', body, offset, count - 1)
+    lon_deltas, offset = _read('i', body, offset, count - 1)
+    accuracy, _ = _read('H', body, offset, count)
+
+    return [
+        (t, lat / SCALE, lon / SCALE, acc or None)
+        for t, lat, lon, acc in zip(
+            _running(t0, time_deltas), _running(lat0, lat_deltas), _running(lon0, lon_deltas), accuracy
+        )
+    ]
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.db import models
+
+from .encoding import decode_points
+
+
+class TrackChunk(models.Model):
+    """
+    A run of one user's GPS points, delta-encoded and compressed into
+    ``data`` (see tracking/encoding.py) instead of one row per point.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="track_chunks")
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    count = models.PositiveIntegerField()
+    data = models.BinaryField()
+
+    class Meta:
+        ordering = ['start_time']
+        indexes = [models.Index(fields=['user', 'end_time'])]
+
+    def points(self):
+        return decode_points(bytes(self.data))
+
+    def __str__(self):
+        return f"{self.count} points for {self.user_id} from {self.start_time:%Y-%m-%d %H:%M:%S}"
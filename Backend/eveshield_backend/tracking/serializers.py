@@ -0,0 +1,60 @@
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.utils import timezone
+from rest_framework import serializers
+
+from .store import to_ms
+
+MAX_CLOCK_SKEW_MS = 24 * 3600 * 1000  # pings further than this from the server's clock are refused
+
+
+class GPSPointSerializer(serializers.Serializer):
+    """
+    Validates a GPS ping. Accepts the app's {latitude, longitude} as well as
+    the shorter {lat, lng}; timestamp is ISO 8601 or epoch milliseconds
+    within a day of now, and defaults to now.
+    """
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+    accuracy = serializers.FloatField(min_value=0, required=False, allow_null=True)
+    timestamp = serializers.JSONField(required=False)
+
+    ALIASES = {'lat': 'latitude', 'lng': 'longitude', 'lon': 'longitude'}
+
+    def to_internal_value(self, data):
+        if isinstance(data, dict):
+            data = {self.ALIASES.get(key, key): value for key, value in data.items()}
+        return super().to_internal_value(data)
+
+    def validate_timestamp(self, value):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            if not math.isfinite(value):
+                raise serializers.ValidationError("Use ISO 8601 or epoch milliseconds.")
+            time_ms = int(value)
+        elif isinstance(value, str):
+            try:
+                moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            except ValueError:
+                raise serializers.ValidationError("Use ISO 8601 or epoch milliseconds.")
+            if timezone.is_naive(moment):
+                moment = moment.replace(tzinfo=dt_timezone.utc)
+            time_ms = to_ms(moment)
+        else:
+            raise serializers.ValidationError("Use ISO 8601 or epoch milliseconds.")
+        if abs(time_ms - to_ms(timezone.now())) > MAX_CLOCK_SKEW_MS:
+            raise serializers.ValidationError("Timestamp is more than a day away from now.")
+        return time_ms
+
+    def as_point(self, data, now_ms):
+        return (data.get('timestamp', now_ms), data['latitude'], data['longitude'], data.get('accuracy'))
+
+
+def as_dict(point):
+    time_ms, latitude, longitude, accuracy = point
+    return {
+        'timestamp': datetime.fromtimestamp(time_ms / 1000, tz=dt_timezone.utc).isoformat(),
+        'latitude': latitude,
+        'longitude': longitude,
+        'accuracy': accuracy,
+    }
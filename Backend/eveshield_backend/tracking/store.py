@@ -0,0 +1,258 @@
+import atexit
+import os
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, InterfaceError, OperationalError, close_old_connections, transaction
+
+from eveshield_backend.routers import use_primary
+
+from .encoding import decode_points, encode_points
+from .models import TrackChunk
+
+
+# GPS track store
+#
+# Pings are buffered per user in memory and written as compressed chunks
+# (one TrackChunk row per CHUNK_POINTS points, or per MAX_CHUNK_AGE seconds
+# of pings) in one bulk_create transaction per flush. Reads merge the
+# stored chunks with the pings still buffered, so a track is complete up to
+# the last accepted ping of this process. The latest position of every
+# user seen by this process is kept in memory and served from there; at
+# most every LATEST_TTL seconds per user it is checked against their newest
+# stored chunk, which other processes may have written since. Users neither
+# pinging nor asked about for LATEST_IDLE seconds are forgotten.
+
+DEFAULTS = {
+    'CHUNK_POINTS': 120,
+    'MAX_CHUNK_AGE': 30.0,          # seconds a ping may wait for its chunk to fill
+    'FLUSH_INTERVAL': 1.0,
+    'MAX_PENDING_POINTS': 500_000,  # beyond this new pings are refused
+    'LATEST_TTL': 2.0,              # seconds a latest position is served without a database check
+    'LATEST_IDLE': 3600.0,          # seconds before an unused latest position is evicted
+}
+
+
+class QueueFull(Exception):
+    pass
+
+
+def to_datetime(ms):
+    return datetime.fromtimestamp(ms / 1000, tz=dt_timezone.utc)
+
+
+def to_ms(value):
+    return int(value.timestamp() * 1000)
+
+
+class TrackStore:
+    def __init__(self, options=None, autostart=True):
+        self.options = options or {**DEFAULTS, **getattr(settings, 'TRACKING', {})}
+        self.autostart = autostart
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = {}      # user id -> [(time_ms, latitude, longitude, accuracy)]
+        self._oldest = {}       # user id -> monotonic time its first pending ping arrived
+        self._pending_points = 0
+        # user id -> (newest point seen or None, monotonic time it was checked
+        # against the database, monotonic time it was last added to or read)
+        self._latest = {}
+        self._next_eviction = 0.0
+        self._pid = None
+        self.points_written = self.chunks_written = self.points_dropped = 0
+
+    def add(self, user_id, points):
+        """Buffer pings for a user; raises QueueFull when the buffer is at its limit"""
+        with self._lock:
+            if self._pending_points + len(points) > self.options['MAX_PENDING_POINTS']:
+                raise QueueFull()
+            pending = self._pending.setdefault(user_id, [])
+            if not pending:
+                self._oldest[user_id] = time.monotonic()
+            pending.extend(points)
+            self._pending_points += len(points)
+
+            newest = max(points, key=lambda point: point[0])
+            latest, checked, _ = self._latest.get(user_id, (None, 0.0, 0.0))
+            if latest is None or newest[0] >= latest[0]:
+                latest = newest
+            self._latest[user_id] = (latest, checked, time.monotonic())
+            full = len(pending) >= self.options['CHUNK_POINTS']
+
+        if self.autostart and self._pid != os.getpid():
+            self._start()
+        if full:
+            self._wake.set()
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name='track-flush', daemon=True).start()
+        atexit.register(self.flush, True)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.options['FLUSH_INTERVAL'])
+            self._wake.clear()
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception as e:
+                print(f"Track flush failed, will retry: {e}")
+                time.sleep(1.0)
+            if time.monotonic() >= self._next_eviction:
+                self._next_eviction = time.monotonic() + min(60.0, self.options['LATEST_IDLE'])
+                self.evict_idle()
+
+    def evict_idle(self):
+        """Forget latest positions unused for LATEST_IDLE seconds; returns how many"""
+        cutoff = time.monotonic() - self.options['LATEST_IDLE']
+        with self._lock:
+            # Buffered pings may be newer than anything stored, so their users stay
+            idle = [user_id for user_id, (_, _, seen) in self._latest.items()
+                    if seen < cutoff and user_id not in self._pending]
+            for user_id in idle:
+                del self._latest[user_id]
+        return len(idle)
+
+    def _take_due(self, force):
+        """Remove and return the runs that are full or old enough to write"""
+        size = self.options['CHUNK_POINTS']
+        now = time.monotonic()
+        runs = []
+        with self._lock:
+            for user_id in list(self._pending):
+                pending = self._pending[user_id]
+                old = now - self._oldest[user_id] >= self.options['MAX_CHUNK_AGE']
+                if not (force or old or len(pending) >= size):
+                    continue
+                # Write whole chunks; a partial one waits unless it has aged out
+                cut = len(pending) if (force or old) else len(pending) - len(pending) % size
+                for start in range(0, cut, size):
+                    runs.append((user_id, pending[start:start + size]))
+                rest = pending[cut:]
+                self._pending_points -= cut
+                if rest:
+                    self._pending[user_id] = rest
+                    self._oldest[user_id] = now
+                else:
+                    del self._pending[user_id]
+                    del self._oldest[user_id]
+        return runs
+
+    def _requeue(self, runs):
+        with self._lock:
+            for user_id, points in runs:
+                self._pending[user_id] = points + self._pending.get(user_id, [])
+                self._oldest.setdefault(user_id, time.monotonic())
+                self._pending_points += len(points)
+
+    def flush(self, force=False):
+        """Write due chunks in one transaction; returns the number of points written"""
+        with self._flush_lock:
+            runs = self._take_due(force)
+            if not runs:
+                return 0
+            chunks, encoded = [], []
+            for user_id, points in runs:
+                points.sort(key=lambda point: point[0])
+                try:
+                    chunks.append(TrackChunk(
+                        user_id=user_id,
+                        start_time=to_datetime(points[0][0]),
+                        end_time=to_datetime(points[-1][0]),
+                        count=len(points),
+                        data=encode_points(points),
+                    ))
+                except (ValueError, OverflowError, OSError) as e:
+                    # Out of range for a datetime or the encoding; only this run is lost
+                    self.points_dropped += len(points)
+                    print(f"Dropping {len(points)} GPS points of user {user_id} that cannot be stored: {e}")
+                    continue
+                encoded.append((user_id, points))
+            try:
+                try:
+                    with transaction.atomic():
+                        TrackChunk.objects.bulk_create(chunks)
+                except IntegrityError:
+                    # A user was deleted while their pings were buffered; drop only theirs
+                    existing = set(get_user_model().objects.filter(
+                        pk__in={chunk.user_id for chunk in chunks}).values_list('pk', flat=True))
+                    chunks = [chunk for chunk in chunks if chunk.user_id in existing]
+                    encoded = [run for run in encoded if run[0] in existing]
+                    with transaction.atomic():
+                        TrackChunk.objects.bulk_create(chunks)
+            except (OperationalError, InterfaceError):
+                # The database is unreachable: keep the points for the next flush
+                self._requeue(encoded)
+                raise
+            except Exception as e:
+                # Retrying would fail the same way and hold up every user's points
+                self.points_dropped += sum(len(points) for _, points in encoded)
+                print(f"Dropping {len(chunks)} GPS chunks that cannot be stored: {e}")
+                return 0
+
+            written = sum(chunk.count for chunk in chunks)
+            self.points_written += written
+            self.chunks_written += len(chunks)
+            return written
+
+    def track(self, user_id, start, end):
+        """The user's points between two datetimes, oldest first"""
+        start_ms, end_ms = to_ms(start), to_ms(end)
+        # From the primary: points leave the buffer as soon as they are written,
+        # before a replica may have them
+        with use_primary():
+            chunks = list(TrackChunk.objects.filter(
+                user_id=user_id, end_time__gte=start, start_time__lte=end
+            ).only('data'))
+        points = [
+            point for chunk in chunks for point in decode_points(bytes(chunk.data))
+            if start_ms <= point[0] <= end_ms
+        ]
+        with self._lock:
+            points.extend(point for point in self._pending.get(user_id, ()) if start_ms <= point[0] <= end_ms)
+        points.sort(key=lambda point: point[0])
+        return points
+
+    def latest_position(self, user_id):
+        """The newest known point for a user, or None"""
+        now = time.monotonic()
+        with self._lock:
+            latest, checked, _ = self._latest.get(user_id, (None, 0.0, 0.0))
+            if checked and now - checked < self.options['LATEST_TTL']:
+                self._latest[user_id] = (latest, checked, now)
+                return latest
+
+        # Another process may have stored newer pings than this one has seen
+        chunks = TrackChunk.objects.filter(user_id=user_id)
+        if latest is not None:
+            chunks = chunks.filter(end_time__gt=to_datetime(latest[0]))
+        with use_primary():
+            chunk = chunks.order_by('-end_time').only('data').first()
+        stored = max(decode_points(bytes(chunk.data)), key=lambda point: point[0]) if chunk else None
+        with self._lock:
+            current = self._latest.get(user_id, (None,))[0]
+            if current is None or (stored is not None and stored[0] > current[0]):
+                current = stored
+            self._latest[user_id] = (current, now, now)
+            return current
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending_points': self._pending_points,
+                'tracked_users': len(self._latest),
+                'points_written': self.points_written,
+                'chunks_written': self.chunks_written,
+                'points_dropped': self.points_dropped,
+            }
+
+
+track_store = TrackStore()
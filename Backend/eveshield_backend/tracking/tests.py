@@ -0,0 +1,217 @@
+import json
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase
+from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from users.authentication import user_cache
+from .encoding import decode_points, encode_points
+from .models import TrackChunk
+from .store import TrackStore, track_store
+
+# ========= TEST CASES FOR GPS TRACKING ========
+
+
+def walk(count, start_ms=1_760_000_000_000, step_ms=1000):
+    """A phone moving through Nairobi at walking pace, one ping a second"""
+    rng = random.Random(count)
+    lat, lon = -1.292066, 36.821945
+    points = []
+    for i in range(count):
+        lat += rng.uniform(-0.00001, 0.00002)
+        lon += rng.uniform(-0.00001, 0.00002)
+        points.append((start_ms + i * step_ms, lat, lon, rng.choice([4.0, 5.0, 8.0, None])))
+    return points
+
+
+class TrackEncodingTestCase(TestCase):
+
+    def test_round_trip_keeps_microdegree_precision(self):
+        points = walk(500)
+        decoded = decode_points(encode_points(points))
+
+        self.assertEqual(len(decoded), 500)
+        for (t, lat, lon, acc), (dt, dlat, dlon, dacc) in zip(points, decoded):
+            self.assertEqual(t, dt)
+            self.assertAlmostEqual(lat, dlat, places=6)
+            self.assertAlmostEqual(lon, dlon, places=6)
+            self.assertEqual(acc, dacc)
+
+    def test_points_are_stored_sorted_and_compact(self):
+        points = walk(120)
+        self.assertEqual(decode_points(encode_points(list(reversed(points))))[0][0], points[0][0])
+
+        # A row per point would carry at least 8 + 8 + 8 + 8 bytes of values
+        self.assertLess(len(encode_points(points)) / len(points), 8)
+
+
+class TrackingAPITestCase(TestCase):
+
+    def setUp(self):
+        user_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            phone_number="+254712345678", username="Test User", password="password123"
+        )
+        access = str(RefreshToken.for_user(self.user).access_token)
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {access}"}
+
+        # Flush from the test thread; a flusher thread could not see the test transaction
+        self.addCleanup(setattr, track_store, "autostart", track_store.autostart)
+        self.addCleanup(setattr, track_store, "options", track_store.options)
+        track_store.autostart = False
+        track_store.options = {**track_store.options, "CHUNK_POINTS": 100, "MAX_CHUNK_AGE": 3600}
+        track_store._pending.clear()
+        track_store._oldest.clear()
+        track_store._latest.clear()
+        track_store._pending_points = 0
+
+    def post(self, data, **extra):
+        return self.client.post('/api/tracking/gps/', json.dumps(data), content_type="application/json", **extra)
+
+    def test_accepts_app_and_short_payloads(self):
+        response = self.post({"latitude": -1.2921, "longitude": 36.8219}, **self.auth)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.json(), {"accepted": 1})
+
+        now_ms = int(datetime.now(dt_timezone.utc).timestamp() * 1000)
+        response = self.post([
+            {"lat": -1.2922, "lng": 36.8220, "accuracy": 5,
+             "timestamp": datetime.fromtimestamp(now_ms / 1000 - 60, tz=dt_timezone.utc).isoformat()},
+            {"lat": -1.2923, "lng": 36.8221, "timestamp": now_ms - 59_000},
+        ], **self.auth)
+        self.assertEqual(response.json(), {"accepted": 2})
+        self.assertEqual(track_store.stats()["pending_points"], 3)
+
+        self.assertEqual(self.post({"lat": 100, "lng": 0}, **self.auth).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.post({"lat": 1}, **self.auth).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.post({"latitude": 1, "longitude": 1}).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_rejects_timestamps_far_from_now(self):
+        now_ms = int(datetime.now(dt_timezone.utc).timestamp() * 1000)
+        for timestamp in (now_ms - 2 * 86_400_000, now_ms + 2 * 86_400_000, 1e300, "2001-01-01T00:00:00Z"):
+            response = self.post({"lat": 1, "lng": 1, "timestamp": timestamp}, **self.auth)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, timestamp)
+        # NaN and Infinity are not JSON, but Python's parser accepts them
+        response = self.client.post('/api/tracking/gps/', '{"lat": 1, "lng": 1, "timestamp": NaN}',
+                                    content_type="application/json", **self.auth)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(track_store.stats()["pending_points"], 0)
+
+    def test_flush_writes_full_chunks_in_one_transaction(self):
+        other = get_user_model().objects.create_user(
+            phone_number="+254712345679", username="Other User", password="password123"
+        )
+        track_store.add(self.user.id, walk(250))
+        track_store.add(other.id, walk(100))
+
+        # Partial chunks wait for more points; full ones go in one bulk insert
+        with self.assertNumQueries(3):
+            self.assertEqual(track_store.flush(), 300)
+        self.assertEqual(TrackChunk.objects.count(), 3)
+        self.assertEqual(track_store.stats()["pending_points"], 50)
+
+        self.assertEqual(track_store.flush(force=True), 50)
+        chunk = TrackChunk.objects.filter(user=self.user).order_by('-start_time').first()
+        self.assertEqual(chunk.count, 50)
+        self.assertEqual(len(chunk.points()), 50)
+
+    def test_track_merges_stored_and_buffered_points(self):
+        now_ms = int(datetime.now(dt_timezone.utc).timestamp() * 1000)
+        points = walk(150, start_ms=now_ms - 600_000)
+        track_store.add(self.user.id, points)
+        track_store.flush()  # stores the first 100, leaves 50 buffered
+
+        response = self.client.get('/api/tracking/track/?since=3600', **self.auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["count"], 150)
+        timestamps = [point["timestamp"] for point in response.json()["points"]]
+        self.assertEqual(timestamps, sorted(timestamps))
+
+        start = datetime.fromtimestamp((now_ms - 600_000 + 90_000) / 1000, tz=dt_timezone.utc)
+        end = start + timedelta(seconds=19)
+        response = self.client.get('/api/tracking/track/', {"start": start.isoformat(), "end": end.isoformat()},
+                                   **self.auth)
+        self.assertEqual(response.json()["count"], 20)
+
+        response = self.client.get('/api/tracking/track/?start=yesterday', **self.auth)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_latest_position_survives_a_restart(self):
+        self.assertEqual(self.client.get('/api/tracking/latest/', **self.auth).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+        now_ms = int(datetime.now(dt_timezone.utc).timestamp() * 1000)
+        points = walk(100, start_ms=now_ms - 600_000)
+        self.post([{"latitude": lat, "longitude": lon, "timestamp": t} for t, lat, lon, _ in points], **self.auth)
+        response = self.client.get('/api/tracking/latest/', **self.auth)
+        self.assertAlmostEqual(response.json()["latitude"], points[-1][1], places=6)
+
+        track_store.flush()
+        fresh = TrackStore(options=track_store.options, autostart=False)
+        latest = fresh.latest_position(self.user.id)
+        self.assertEqual(latest[0], points[-1][0])
+        self.assertAlmostEqual(latest[2], points[-1][2], places=6)
+
+    def test_latest_position_sees_points_stored_by_another_process(self):
+        points = walk(200)
+        track_store.add(self.user.id, points[:100])
+        self.assertEqual(track_store.latest_position(self.user.id)[0], points[99][0])
+
+        other = TrackStore(options=track_store.options, autostart=False)
+        other.add(self.user.id, points[100:])
+        other.flush()
+        # Served from memory until the entry is LATEST_TTL old
+        with self.assertNumQueries(0):
+            self.assertEqual(track_store.latest_position(self.user.id)[0], points[99][0])
+        track_store.options = {**track_store.options, "LATEST_TTL": 0}
+        self.assertEqual(track_store.latest_position(self.user.id)[0], points[-1][0])
+
+    def test_unused_latest_positions_are_evicted(self):
+        other = get_user_model().objects.create_user(
+            phone_number="+254712345679", username="Other User", password="password123"
+        )
+        track_store.add(self.user.id, walk(100))
+        track_store.flush()
+        track_store.add(other.id, walk(10))  # still buffered
+        self.assertIsNone(track_store.latest_position(12345))
+        self.assertEqual(track_store.stats()["tracked_users"], 3)
+
+        self.assertEqual(track_store.evict_idle(), 0)
+        track_store.options = {**track_store.options, "LATEST_IDLE": 0}
+        self.assertEqual(track_store.evict_idle(), 2)
+        self.assertEqual(track_store.stats()["tracked_users"], 1)
+        # Forgotten, not lost: the next read goes back to the database
+        self.assertEqual(track_store.latest_position(self.user.id)[0], walk(100)[-1][0])
+
+    def test_a_run_that_cannot_be_encoded_does_not_hold_up_the_others(self):
+        other = get_user_model().objects.create_user(
+            phone_number="+254712345679", username="Other User", password="password123"
+        )
+        track_store.add(self.user.id, walk(100))
+        track_store.add(other.id, [(10 ** 18, 1.0, 1.0, None)] + walk(99))
+
+        self.assertEqual(track_store.flush(), 100)
+        self.assertEqual(track_store.stats()["pending_points"], 0)
+        self.assertEqual(track_store.stats()["points_dropped"], 100)
+        self.assertEqual(TrackChunk.objects.get().user_id, self.user.id)
+
+
+class TrackFlushTransactionTestCase(TransactionTestCase):
+    # Foreign keys are only checked at commit, which TestCase never reaches
+
+    def test_points_of_deleted_users_are_dropped(self):
+        user, other = (
+            get_user_model().objects.create_user(phone_number=number, username="Test User", password="password123")
+            for number in ("+254712345678", "+254712345679")
+        )
+        store = TrackStore(options={**track_store.options, "CHUNK_POINTS": 100}, autostart=False)
+        store.add(user.id, walk(100))
+        store.add(other.id, walk(100))
+        other.delete()
+
+        self.assertEqual(store.flush(), 100)
+        self.assertEqual(store.stats()["pending_points"], 0)
+        self.assertEqual(TrackChunk.objects.get().user_id, user.id)
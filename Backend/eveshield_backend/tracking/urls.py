@@ -0,0 +1,9 @@
+from django.urls import path
+from .views import GPSPingAPIView, TrackAPIView, LatestPositionAPIView
+
+urlpatterns = [
+    ##### Tracking API urls ######
+    path('gps/', GPSPingAPIView.as_view(), name='gps'),
+    path('track/', TrackAPIView.as_view(), name='track'),
+    path('latest/', LatestPositionAPIView.as_view(), name='latest-position'),
+]
@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.generics import GenericAPIView
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from .serializers import GPSPointSerializer, as_dict
+from .store import QueueFull, to_ms, track_store
+
+
+MAX_POINTS_PER_REQUEST = 1000
+MAX_TRACK_RANGE = timedelta(days=7)
+
+
+def _parse_time(value):
+    moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+class GPSPingAPIView(GenericAPIView):
+    """
+    An endpoint to record the user's location (POST a point or a list of
+    points). Points are buffered and written in compressed chunks.
+    """
+
+    permission_classes = (IsAuthenticated,)
+    serializer_class = GPSPointSerializer
+
+    def post(self, request, *args, **kwargs):
+        items = request.data if isinstance(request.data, list) else [request.data]
+        if not items:
+            return Response({"error": "No points sent."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > MAX_POINTS_PER_REQUEST:
+            return Response(
+                {"error": f"At most {MAX_POINTS_PER_REQUEST} points per request."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = self.get_serializer(data=items, many=True)
+
+        serializer.is_valid(raise_exception=True)
+
+        now_ms = to_ms(timezone.now())
+        points = [serializer.child.as_point(item, now_ms) for item in serializer.validated_data]
+
+        try:
+            track_store.add(request.user.id, points)
+        except QueueFull:
+            return Response({"error": "Tracking is busy, retry shortly."},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": "1"})
+
+        return Response({"accepted": len(points)}, status=status.HTTP_202_ACCEPTED)
+
+
+class TrackAPIView(GenericAPIView):
+    """
+    An endpoint to fetch the user's track, either the last ?since=<seconds>
+    (default one hour) or between ?start= and ?end= (ISO 8601).
+    """
+
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        try:
+            end = _parse_time(request.query_params['end']) if 'end' in request.query_params else timezone.now()
+            if 'start' in request.query_params:
+                start = _parse_time(request.query_params['start'])
+            else:
+                start = end - timedelta(seconds=float(request.query_params.get('since', 3600)))
+        except ValueError:
+            return Response({"error": "Invalid time range."}, status=status.HTTP_400_BAD_REQUEST)
+        if start > end or end - start > MAX_TRACK_RANGE:
+            return Response(
+                {"error": f"The range must be positive and at most {MAX_TRACK_RANGE.days} days."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        points = track_store.track(request.user.id, start, end)
+
+        return Response(
+            {
+                'start': start.isoformat(),
+                'end': end.isoformat(),
+                'count': len(points),
+                'points': [as_dict(point) for point in points],
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+class LatestPositionAPIView(GenericAPIView):
+    """
+    An endpoint to fetch the user's most recent known position.
+    """
+
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        point = track_store.latest_position(request.user.id)
+        if point is None:
+            return Response({"error": "No position recorded yet."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(as_dict(point), status=status.HTTP_200_OK)
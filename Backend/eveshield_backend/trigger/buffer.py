@@ -0,0 +1,170 @@
+import atexit
+import json
+import os
+import threading
+import time
+import urllib.request
+from collections import deque
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, InterfaceError, OperationalError, close_old_connections, transaction
+
+from .models import SOSEvent
+
+
+# Write-behind buffer for SOS presses
+#
+# The view only appends to an in-memory deque and answers; a flusher thread
+# per process drains it every FLUSH_INTERVAL seconds, writing up to
+# BATCH_SIZE events per bulk_create transaction and then publishing the
+# batch to the voice pipeline's dashboard. Presses accepted but not yet
+# flushed live only in memory: the buffer is flushed on clean shutdown, and
+# FLUSH_INTERVAL bounds what a crash can lose. A batch that fails because
+# the database is unreachable is put back and retried; one that can never
+# be written is dropped and logged rather than blocking the presses behind it.
+
+DEFAULTS = {
+    'MAX_PENDING': 100_000,
+    'BATCH_SIZE': 1000,
+    'FLUSH_INTERVAL': 0.2,
+    'PUBLISH_URL': None,
+    'PUBLISH_TIMEOUT': 2.0,
+}
+
+
+class QueueFull(Exception):
+    pass
+
+
+class SOSBuffer:
+    def __init__(self, options=None, autostart=True):
+        self.options = options or {**DEFAULTS, **getattr(settings, 'SOS_QUEUE', {})}
+        self.autostart = autostart
+        self._pending = deque()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+        self.accepted = self.written = self.published = self.rejected = self.dropped = 0
+
+    def enqueue(self, event):
+        """Accept an unsaved SOSEvent; raises QueueFull when the backlog is at its limit"""
+        if len(self._pending) >= self.options['MAX_PENDING']:
+            self.rejected += 1
+            raise QueueFull()
+        self._pending.append(event)
+        self.accepted += 1
+        if self.autostart and self._pid != os.getpid():
+            self._start()
+        if len(self._pending) >= self.options['BATCH_SIZE']:
+            self._wake.set()
+
+    def pending(self):
+        return len(self._pending)
+
+    def _start(self):
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='sos-flush', daemon=True).start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.options['FLUSH_INTERVAL'])
+            self._wake.clear()
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception as e:
+                print(f"SOS flush failed, will retry: {e}")
+                time.sleep(1.0)
+
+    def flush(self):
+        """Write everything pending in BATCH_SIZE transactions; returns how many were written"""
+        written = []
+        try:
+            with self._flush_lock:
+                while self._pending:
+                    batch = []
+                    while self._pending and len(batch) < self.options['BATCH_SIZE']:
+                        batch.append(self._pending.popleft())
+                    written.append(self.write(batch))
+        finally:
+            # Publish outside the lock so a slow dashboard never holds up the next flush
+            for batch in written:
+                self.publish(batch)
+        return sum(len(batch) for batch in written)
+
+    def write(self, batch):
+        """Store one batch; returns the events stored"""
+        try:
+            try:
+                with transaction.atomic():
+                    SOSEvent.objects.bulk_create(batch)
+            except IntegrityError:
+                # A user was deleted while their presses were buffered; drop only theirs
+                existing = set(get_user_model().objects.filter(
+                    pk__in={event.user_id for event in batch}).values_list('pk', flat=True))
+                kept = [event for event in batch if event.user_id in existing]
+                self.dropped += len(batch) - len(kept)
+                batch = kept
+                with transaction.atomic():
+                    SOSEvent.objects.bulk_create(batch)
+        except (OperationalError, InterfaceError):
+            # The database is unreachable: put the batch back in order and let the next flush retry it
+            self._pending.extendleft(reversed(batch))
+            raise
+        except Exception as e:
+            # Retrying would fail the same way and hold up every press behind this batch
+            self.dropped += len(batch)
+            print(f"Dropping {len(batch)} SOS events that cannot be stored: {e}")
+            return []
+        self.written += len(batch)
+        return batch
+
+    def publish(self, events):
+        url = self.options['PUBLISH_URL']
+        if not url or not events:
+            return
+        payload = json.dumps({'events': [self.as_dict(event) for event in events]}).encode('utf-8')
+        request = urllib.request.Request(url, data=payload, method='POST', headers={
+            'Content-Type': 'application/json',
+            'X-Service-Token': getattr(settings, 'SERVICE_TOKEN', None) or '',
+        })
+        try:
+            with urllib.request.urlopen(request, timeout=self.options['PUBLISH_TIMEOUT']) as response:
+                response.read()
+            self.published += len(events)
+        except Exception as e:
+            # The events are already stored; the dashboard only misses the live update
+            print(f"Publishing {len(events)} SOS events failed: {e}")
+
+    @staticmethod
+    def as_dict(event):
+        return {
+            'id': str(event.id),
+            'user_id': str(event.user_id),
+            'phone_number': getattr(event, 'phone_number', None),
+            'source': event.source,
+            'latitude': event.latitude,
+            'longitude': event.longitude,
+            'accuracy': event.accuracy,
+            'message': event.message,
+            'created_at': event.created_at.isoformat(),
+        }
+
+    def stats(self):
+        return {
+            'pending': len(self._pending),
+            'accepted': self.accepted,
+            'written': self.written,
+            'published': self.published,
+            'rejected': self.rejected,
+            'dropped': self.dropped,
+        }
+
+
+sos_buffer = SOSBuffer()
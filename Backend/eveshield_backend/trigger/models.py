@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.db import models
+import uuid
+
+
+class SOSEvent(models.Model):
+    SOURCES = [
+        ('app', 'Mobile app'),
+        ('web', 'Web'),
+        ('sms', 'SMS'),
+        ('wearable', 'Wearable'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="sos_events")
+    source = models.CharField(max_length=20, choices=SOURCES, default='app')
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    accuracy = models.FloatField(null=True, blank=True)  # metres
+    message = models.CharField(max_length=500, blank=True, default='')
+    # When the press was accepted, not when the batch reached the database
+    created_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['user', '-created_at'])]
+
+    def __str__(self):
+        return f"SOS from {self.user_id} at {self.created_at:%Y-%m-%d %H:%M:%S}"
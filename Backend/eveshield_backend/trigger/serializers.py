@@ -0,0 +1,19 @@
+from rest_framework import serializers
+
+from .models import SOSEvent
+
+
+class SOSEventSerializer(serializers.Serializer):
+    """
+    Validates an SOS press; no database access, so it is safe in async views.
+    """
+    source = serializers.ChoiceField(choices=SOSEvent.SOURCES, default='app')
+    latitude = serializers.FloatField(min_value=-90, max_value=90, required=False, allow_null=True)
+    longitude = serializers.FloatField(min_value=-180, max_value=180, required=False, allow_null=True)
+    accuracy = serializers.FloatField(min_value=0, required=False, allow_null=True)
+    message = serializers.CharField(max_length=500, required=False, allow_blank=True, default='')
+
+    def validate(self, data):
+        if (data.get('latitude') is None) != (data.get('longitude') is None):
+            raise serializers.ValidationError("latitude and longitude must be sent together.")
+        return data
@@ -0,0 +1,144 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from users.authentication import user_cache
+from .buffer import SOSBuffer, sos_buffer
+from .models import SOSEvent
+
+# ========= TEST CASES FOR SOS INGESTION ========
+
+
+class SOSTriggerTestCase(TestCase):
+
+    def setUp(self):
+        user_cache.clear()
+        self.sos_url = '/api/trigger/sos/'
+        self.user = get_user_model().objects.create_user(
+            phone_number="+254712345678", username="Test User", password="password123"
+        )
+        access = str(RefreshToken.for_user(self.user).access_token)
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {access}"}
+
+        # Flush from the test thread; a flusher thread could not see the test transaction
+        self.addCleanup(setattr, sos_buffer, "autostart", sos_buffer.autostart)
+        self.addCleanup(setattr, sos_buffer, "options", sos_buffer.options)
+        sos_buffer.autostart = False
+        sos_buffer.options = {**sos_buffer.options, "PUBLISH_URL": None}
+        sos_buffer._pending.clear()
+
+    def post(self, data, **extra):
+        return self.client.post(self.sos_url, json.dumps(data), content_type="application/json", **extra)
+
+    def test_sos_is_acknowledged_then_written_behind(self):
+        response = self.post({"source": "web", "latitude": -1.2921, "longitude": 36.8219}, **self.auth)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.json()["status"], "queued")
+        self.assertFalse(SOSEvent.objects.exists())
+
+        self.assertEqual(sos_buffer.flush(), 1)
+        event = SOSEvent.objects.get(id=response.json()["id"])
+        self.assertEqual(event.user_id, self.user.id)
+        self.assertEqual(event.source, "web")
+
+    def test_request_path_does_not_touch_the_database(self):
+        self.post({}, **self.auth)  # loads the user into the cache
+
+        with self.assertNumQueries(0):
+            response = self.post({"message": "help"}, **self.auth)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+    def test_rejects_unauthenticated_and_invalid_presses(self):
+        self.assertEqual(self.post({}).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.post({}, HTTP_AUTHORIZATION="Bearer nope").status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.post({"latitude": 120, "longitude": 0}, **self.auth).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.post({"latitude": 1.0}, **self.auth).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(sos_buffer.pending(), 0)
+
+    def test_full_queue_sheds_load(self):
+        sos_buffer.options = {**sos_buffer.options, "MAX_PENDING": 1}
+        self.assertEqual(self.post({}, **self.auth).status_code, status.HTTP_202_ACCEPTED)
+        response = self.post({}, **self.auth)
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response["Retry-After"], "1")
+
+    def test_flush_writes_in_batches(self):
+        sos_buffer.options = {**sos_buffer.options, "BATCH_SIZE": 1000}
+        for _ in range(2500):
+            self.post({}, **self.auth)
+
+        # One transaction per batch of 1000 (SQLite splits each insert by its parameter limit)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(sos_buffer.flush(), 2500)
+        transactions = [q for q in queries.captured_queries if q["sql"].startswith("SAVEPOINT")]
+        self.assertEqual(len(transactions), 3)
+        self.assertEqual(SOSEvent.objects.count(), 2500)
+
+    def test_unreachable_database_requeues_the_batch_in_order(self):
+        ids = [self.post({}, **self.auth).json()["id"] for _ in range(3)]
+
+        with mock.patch.object(SOSEvent.objects, "bulk_create", side_effect=OperationalError("gone away")):
+            with self.assertRaises(OperationalError):
+                sos_buffer.flush()
+        self.assertEqual([str(event.id) for event in sos_buffer._pending], ids)
+
+        self.assertEqual(sos_buffer.flush(), 3)
+        self.assertEqual(sos_buffer.pending(), 0)
+
+    def test_batches_are_published_to_the_dashboard(self):
+        received = []
+
+        class Dashboard(BaseHTTPRequestHandler):
+            def do_POST(self):
+                received.append((json.loads(self.rfile.read(int(self.headers["Content-Length"]))),
+                                 self.headers.get("X-Service-Token")))
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Dashboard)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        buffer = SOSBuffer(options={**sos_buffer.options, "PUBLISH_URL": f"http://127.0.0.1:{server.server_port}/"},
+                           autostart=False)
+        buffer.enqueue(SOSEvent(user=self.user, source="app", created_at=self.user.date_joined))
+        with self.settings(SERVICE_TOKEN="service-secret"):
+            buffer.flush()
+
+        payload, token = received[0]
+        self.assertEqual(token, "service-secret")
+        self.assertEqual(payload["events"][0]["user_id"], str(self.user.id))
+        self.assertEqual(buffer.stats()["published"], 1)
+
+
+class SOSFlushTransactionTestCase(TransactionTestCase):
+    # Foreign keys are only checked at commit, which TestCase never reaches
+
+    def test_presses_of_deleted_users_are_dropped(self):
+        user, other = (
+            get_user_model().objects.create_user(phone_number=number, username="Test User", password="password123")
+            for number in ("+254712345678", "+254712345679")
+        )
+        buffer = SOSBuffer(options={**sos_buffer.options, "PUBLISH_URL": None}, autostart=False)
+        for owner in (user, other, user):
+            buffer.enqueue(SOSEvent(user_id=owner.id, source="app", created_at=owner.date_joined))
+        other.delete()
+
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(buffer.pending(), 0)
+        self.assertEqual(buffer.stats()["dropped"], 1)
+        self.assertEqual(set(SOSEvent.objects.values_list("user_id", flat=True)), {user.id})
@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import SOSTriggerView
+
+urlpatterns = [
+    ##### SOS API urls ######
+    path('sos/', SOSTriggerView.as_view(), name='sos'),
+]
@@ -0,0 +1,60 @@
+import json
+import uuid
+
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from users.authentication import CachedJWTAuthentication
+from .buffer import QueueFull, sos_buffer
+from .models import SOSEvent
+from .serializers import SOSEventSerializer
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class SOSTriggerView(View):
+    """
+    An endpoint to raise an SOS. Async and database-free on the request
+    path: the press is validated, queued for a batched write and
+    acknowledged with 202.
+    """
+
+    authentication = CachedJWTAuthentication()
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            header = self.authentication.get_header(request)
+            raw_token = self.authentication.get_raw_token(header) if header else None
+            if raw_token is None:
+                return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+            token = self.authentication.get_validated_token(raw_token)
+            user = await self.authentication.aget_user(token)
+        except (InvalidToken, TokenError, AuthenticationFailed) as e:
+            return JsonResponse({"detail": str(getattr(e, 'detail', e))}, status=401)
+
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({"error": "Invalid JSON."}, status=400)
+
+        serializer = SOSEventSerializer(data=data if isinstance(data, dict) else {})
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=400)
+
+        event = SOSEvent(id=uuid.uuid4(), user_id=user.pk, created_at=timezone.now(), **serializer.validated_data)
+        event.phone_number = user.phone_e164 or user.phone_number
+
+        try:
+            sos_buffer.enqueue(event)
+        except QueueFull:
+            return JsonResponse({"error": "SOS queue is full, retry shortly."}, status=503,
+                                headers={"Retry-After": "1"})
+
+        return JsonResponse(
+            {"id": str(event.id), "status": "queued", "created_at": event.created_at.isoformat()},
+            status=202
+        )
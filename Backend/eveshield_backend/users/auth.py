@@ -1,85 +1,156 @@
-from django.shortcuts import render
-from rest_framework import serializers
-from .serializers import RegisterUserSerializer, LoginUserSerializer, UserSerializer
+from django.db import IntegrityError
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.request import Request
+from .serializers import RegisterUserSerializer, LoginUserSerializer, UserSerializer, CachedTokenRefreshSerializer
 from rest_framework.generics import GenericAPIView
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenRefreshView
+from asgiref.sync import sync_to_async
+from .blacklist import CachedRefreshToken as RefreshToken
+from .models import normalize_phone_number
+from .passwords import HasherBusy, password_pool
 from django.contrib.auth import get_user_model
 
 
 # authentication & Permisions api views
+#
+# Register and login are async: under ASGI a burst of logins must not hold
+# up other requests (SOS presses above all) while passwords are hashed, so
+# hashing runs on the hasher pool (users/passwords.py) and queries go
+# through the async ORM.
 
 User = get_user_model()
 
 
-class RegisterUserAPIView(GenericAPIView):
+class APIJsonResponse(JsonResponse):
     """
-    An endpoint for the client to create a new User.
+    JsonResponse that keeps its payload on .data, as DRF's Response does.
+    """
+
+    def __init__(self, data, **kwargs):
+        super().__init__(data, **kwargs)
+        self.data = data
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncAPIView(View):
+    """
+    Base for async endpoints that parse requests like DRF views (JSON or
+    form data) without going through DRF's synchronous dispatch.
     """
 
-    permission_classes = (AllowAny,)
-    serializer_class = RegisterUserSerializer
+    parser_classes = (JSONParser, FormParser, MultiPartParser)
+
+    def get_data(self, request):
+        return Request(request, parsers=[parser() for parser in self.parser_classes]).data
+
+    @staticmethod
+    def tokens_for(user):
+        token = RefreshToken.for_user(user)
+        return {"refresh": str(token), "access": str(token.access_token)}
+
+    @staticmethod
+    def busy():
+        return APIJsonResponse({"error": "Too many logins in progress, retry shortly."},
+                               status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": "1"})
+
+
+class RegisterUserAPIView(AsyncAPIView):
+    """
+    An endpoint for the client to create a new User.
+    """
 
-    def get(self, request):
-        return Response(
+    async def get(self, request):
+        return APIJsonResponse(
             {
                 'message': 'Use POST request with phone_number & password to register new user'
             },
             status=status.HTTP_200_OK
         )
 
-    def post(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)
+    async def post(self, request, *args, **kwargs):
+        try:
+            serializer = RegisterUserSerializer(data=self.get_data(request))
+        except ParseError as e:
+            return APIJsonResponse({"detail": str(e.detail)}, status=status.HTTP_400_BAD_REQUEST)
 
-        serializer.is_valid(raise_exception=True)
+        if not serializer.is_valid():
+            return APIJsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        user = serializer.save()
+        taken = {"phone_number": ["A user with this phone number already exists."]}
+        phone_number = serializer.validated_data['phone_number']
+        if await User.objects.filter(phone_e164=normalize_phone_number(phone_number)).aexists():
+            return APIJsonResponse(taken, status=status.HTTP_400_BAD_REQUEST)
 
-        token = RefreshToken.for_user(user)
+        try:
+            user = await User.objects.acreate_user(**serializer.validated_data)
+        except HasherBusy:
+            return self.busy()
+        except IntegrityError:
+            # Registered by a concurrent request since the check above
+            return APIJsonResponse(taken, status=status.HTTP_400_BAD_REQUEST)
 
-        data = serializer.data
+        data = RegisterUserSerializer(user).data
 
-        data["tokens"] = {"refresh": str(
-            token), "access": str(token.access_token)}
+        data["tokens"] = await sync_to_async(self.tokens_for)(user)
 
-        return Response(data, status=status.HTTP_201_CREATED)
+        return APIJsonResponse(data, status=status.HTTP_201_CREATED)
 
 
-class LoginUserAPIView(GenericAPIView):
+class LoginUserAPIView(AsyncAPIView):
     """
     An endpoint to authenticate existing users using their phone_number and password.
     """
 
-    permission_classes = (AllowAny,)
-    serializer_class = LoginUserSerializer
-
-    def get(self, request):
-        return Response(
+    async def get(self, request):
+        return APIJsonResponse(
             {
                 "message": "Use POST request with phone_number & password to login user"
             },
             status=status.HTTP_200_OK
         )
 
-    def post(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)
+    async def post(self, request, *args, **kwargs):
+        try:
+            serializer = LoginUserSerializer(data=self.get_data(request))
+        except ParseError as e:
+            return APIJsonResponse({"detail": str(e.detail)}, status=status.HTTP_400_BAD_REQUEST)
 
-        serializer.is_valid(raise_exception=True)
+        if not serializer.is_valid():
+            return APIJsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        user = serializer.validated_data
+        try:
+            user = await self.authenticate(**serializer.validated_data)
+        except HasherBusy:
+            return self.busy()
+        if user is None:
+            return APIJsonResponse({"non_field_errors": ["Incorrect Credentials"]},
+                                   status=status.HTTP_400_BAD_REQUEST)
 
-        serializer = UserSerializer(user)
+        data = UserSerializer(user).data
 
-        token = RefreshToken.for_user(user)
+        data["tokens"] = await sync_to_async(self.tokens_for)(user)
 
-        data = serializer.data
+        return APIJsonResponse(data, status=status.HTTP_200_OK)
 
-        data["tokens"] = {"refresh": str(
-            token), "access": str(token.access_token)}
-
-        return Response(data, status=status.HTTP_200_OK)
+    @staticmethod
+    async def authenticate(phone_number, password):
+        try:
+            user = await User.objects.aget_by_natural_key(phone_number)
+        except User.DoesNotExist:
+            # Hash anyway so unknown numbers take as long as wrong passwords
+            await password_pool.make_password(password)
+            return None
+        if await password_pool.check_password(user, password) and user.is_active:
+            return user
+        return None
 
 
 class LogoutUserAPIView(GenericAPIView):
@@ -97,3 +168,11 @@ class LogoutUserAPIView(GenericAPIView):
             return Response({"detail": "Successfully logged out."}, status=status.HTTP_205_RESET_CONTENT)
         except Exception as e:
             return Response({"error": "Invalid token."}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class RefreshTokenAPIView(TokenRefreshView):
+    """
+    An endpoint to exchange a refresh token for a new access and refresh token pair.
+    """
+
+    serializer_class = CachedTokenRefreshSerializer
@@ -0,0 +1,110 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from eveshield_backend.routers import use_primary
+
+
+DEFAULTS = {
+    'TTL_SECONDS': 30.0,    # how long another process's change to a user may go unseen
+    'MAX_ENTRIES': 10_000,
+}
+
+
+class UserCache:
+    """
+    Per-process TTL cache of users keyed by the token's user id claim.
+    """
+
+    def __init__(self, options=None):
+        self.options = options or {**DEFAULTS, **getattr(settings, 'AUTH_USER_CACHE', {})}
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, user_id):
+        key = str(user_id)
+        with self._lock:
+            entry = self._users.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._users.move_to_end(key)
+                self.hits += 1
+                # Views may change request.user; never hand out the shared instance
+                return copy.copy(entry[0])
+            self.misses += 1
+            return None
+
+    def set(self, user_id, user):
+        key = str(user_id)
+        with self._lock:
+            self._users[key] = (copy.copy(user), time.monotonic() + self.options['TTL_SECONDS'])
+            self._users.move_to_end(key)
+            while len(self._users) > self.options['MAX_ENTRIES']:
+                self._users.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._users.pop(str(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._users),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user from the per-process
+    cache, so repeated calls from one user skip the database. Misses read
+    from the primary: a miss often follows an invalidation by a write the
+    replicas may not have yet.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        user = user_cache.get(user_id) if user_id is not None else None
+        if user is None:
+            with use_primary():
+                user = super().get_user(validated_token)
+            user_cache.set(user_id, user)
+        return user
+
+    async def aget_user(self, validated_token):
+        """
+        get_user for async views: a cache hit stays on the event loop, only a
+        miss goes to a worker thread for the database query.
+        """
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        user = user_cache.get(user_id) if user_id is not None else None
+        if user is None:
+            with use_primary():
+                user = await sync_to_async(super().get_user)(validated_token)
+            user_cache.set(user_id, user)
+        return user
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate(getattr(instance, api_settings.USER_ID_FIELD))
@@ -0,0 +1,200 @@
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connections
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+# Blacklist check layer in front of the token_blacklist tables
+#
+# Every refresh and logout adds a row, so with rotation on the tables grow
+# to millions of rows. The cache keeps a bloom filter of every blacklisted
+# JTI, loaded once and then topped up by primary key, and an LRU of JTIs
+# confirmed as blacklisted. Most tokens are not blacklisted and the bloom
+# filter answers those without touching the database; a bloom hit is
+# confirmed with one indexed lookup and then remembered in the LRU. The
+# periodic full reload runs on a background thread and the new filter is
+# swapped in when it is complete; requests keep using the old one meanwhile.
+
+DEFAULTS = {
+    'CAPACITY': 1_000_000,          # expected blacklisted tokens before the filter is resized
+    'ERROR_RATE': 0.001,            # bloom false positive rate at capacity
+    'LRU_SIZE': 10_000,             # confirmed blacklisted JTIs kept in memory
+    'REFRESH_SECONDS': 1.0,         # how stale another process's blacklisting may be
+    'REBUILD_SECONDS': 3600,        # full reload, drops tokens removed by prune_tokens
+    'LOAD_BATCH_SIZE': 10_000,
+}
+
+
+def cache_settings():
+    return {**DEFAULTS, **getattr(settings, 'TOKEN_BLACKLIST_CACHE', {})}
+
+
+class BloomFilter:
+    """
+    Fixed size bloom filter over strings using double hashing.
+    """
+
+    def __init__(self, capacity, error_rate):
+        capacity = max(1, int(capacity))
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class BlacklistCache:
+    """
+    Per-process view of the token blacklist.
+    """
+
+    def __init__(self, options=None):
+        self.options = options or cache_settings()
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._bloom = None
+            self._recent = OrderedDict()
+            self._last_id = 0
+            self._refreshed_at = 0.0
+            self._rebuilt_at = 0.0
+            self._rebuilding = False
+        self.hits = self.misses = self.database_checks = 0
+
+    def _load(self, bloom, after_id):
+        """Adds blacklisted JTIs with a primary key above after_id; returns the last id seen"""
+        batch_size = self.options['LOAD_BATCH_SIZE']
+        while True:
+            rows = list(
+                BlacklistedToken.objects.filter(id__gt=after_id)
+                .order_by('id')
+                .values_list('id', 'token__jti')[:batch_size]
+            )
+            for _id, jti in rows:
+                bloom.add(jti)
+            if rows:
+                after_id = rows[-1][0]
+            if len(rows) < batch_size:
+                return after_id
+
+    def rebuild(self):
+        capacity = max(self.options['CAPACITY'], 2 * BlacklistedToken.objects.count())
+        bloom = BloomFilter(capacity, self.options['ERROR_RATE'])
+        last_id = self._load(bloom, 0)
+        with self._lock:
+            self._bloom = bloom
+            self._last_id = last_id
+            self._refreshed_at = self._rebuilt_at = time.monotonic()
+
+    def _rebuild_in_background(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+
+        def run():
+            try:
+                self.rebuild()
+            except Exception as e:
+                print(f"Rebuilding the token blacklist filter failed: {e}")
+            finally:
+                with self._lock:
+                    self._rebuilding = False
+                connections.close_all()
+
+        threading.Thread(target=run, name='blacklist-rebuild', daemon=True).start()
+
+    def refresh(self):
+        now = time.monotonic()
+        if self._bloom is None:
+            self.rebuild()
+            return
+        if now - self._rebuilt_at >= self.options['REBUILD_SECONDS'] or self._bloom.count > self._bloom.capacity:
+            self._rebuild_in_background()
+        if now - self._refreshed_at >= self.options['REFRESH_SECONDS']:
+            with self._lock:
+                bloom, after_id = self._bloom, self._last_id
+            last_id = self._load(bloom, after_id)
+            with self._lock:
+                # A rebuild swapped in meanwhile has loaded from scratch
+                if self._bloom is bloom:
+                    self._last_id = max(self._last_id, last_id)
+                    self._refreshed_at = now
+
+    def _remember(self, jti):
+        self._recent[jti] = True
+        self._recent.move_to_end(jti)
+        while len(self._recent) > self.options['LRU_SIZE']:
+            self._recent.popitem(last=False)
+
+    def add(self, jti):
+        """Records a token this process has just blacklisted"""
+        if self._bloom is None:
+            self.rebuild()
+        with self._lock:
+            self._bloom.add(jti)
+            self._remember(jti)
+
+    def contains(self, jti):
+        self.refresh()
+        with self._lock:
+            if jti in self._recent:
+                self._recent.move_to_end(jti)
+                self.hits += 1
+                return True
+            if jti not in self._bloom:
+                self.misses += 1
+                return False
+
+        # Bloom hit: a false positive, a pruned token or a real blacklisting
+        self.database_checks += 1
+        if not BlacklistedToken.objects.filter(token__jti=jti).exists():
+            return False
+        with self._lock:
+            self._remember(jti)
+        return True
+
+
+blacklist_cache = BlacklistCache()
+
+
+class CachedRefreshToken(RefreshToken):
+    """
+    Refresh token whose blacklist check goes through the in-memory cache.
+    """
+
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+
+        if blacklist_cache.contains(jti):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        result = super().blacklist()
+        blacklist_cache.add(self.payload[api_settings.JTI_CLAIM])
+        return result
@@ -0,0 +1,132 @@
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from rest_framework import status
+from rest_framework.generics import GenericAPIView
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from .directory import caller_directory
+from .models import EmergencyContact
+from .serializers import (
+    EmergencyContactSerializer,
+    EmergencyContactUpdateSerializer,
+    EmergencyContactDeleteSerializer,
+    UserSerializer
+)
+
+
+# Emergency contact api views
+#
+# Contacts are created, updated and deleted in batches, each batch in one
+# transaction with a constant number of queries however many contacts it
+# holds. bulk_create and bulk_update send no model signals, so the caller
+# directory cache is invalidated here.
+
+MAX_BULK_CONTACTS = 100
+
+
+def _as_list(data):
+    return data if isinstance(data, list) else [data]
+
+
+class EmergencyContactListAPIView(GenericAPIView):
+    """
+    An endpoint to list the user's emergency contacts (GET) and add one or
+    many at once (POST a contact or a list of contacts).
+    """
+
+    permission_classes = (IsAuthenticated,)
+    serializer_class = EmergencyContactSerializer
+
+    def get(self, request):
+        user = request.user
+        prefetch_related_objects([user], 'emergency_contacts')
+        return Response(
+            {
+                'user': UserSerializer(user).data,
+                'contacts': self.get_serializer(user.emergency_contacts.all(), many=True).data,
+            },
+            status=status.HTTP_200_OK
+        )
+
+    def post(self, request, *args, **kwargs):
+        items = _as_list(request.data)
+        if len(items) > MAX_BULK_CONTACTS:
+            return Response(
+                {"error": f"At most {MAX_BULK_CONTACTS} contacts per request."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = self.get_serializer(data=items, many=True)
+
+        serializer.is_valid(raise_exception=True)
+
+        contacts = [EmergencyContact(user=request.user, **item) for item in serializer.validated_data]
+
+        with transaction.atomic():
+            EmergencyContact.objects.bulk_create(contacts)
+        caller_directory.invalidate(user_id=request.user.id)
+
+        return Response(self.get_serializer(contacts, many=True).data, status=status.HTTP_201_CREATED)
+
+
+class EmergencyContactBulkAPIView(GenericAPIView):
+    """
+    An endpoint to update (PATCH a list of contacts with their ids) or
+    delete (DELETE {"ids": [...]}) many of the user's emergency contacts.
+    """
+
+    permission_classes = (IsAuthenticated,)
+    serializer_class = EmergencyContactUpdateSerializer
+
+    def patch(self, request, *args, **kwargs):
+        items = _as_list(request.data)
+        if len(items) > MAX_BULK_CONTACTS:
+            return Response(
+                {"error": f"At most {MAX_BULK_CONTACTS} contacts per request."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = self.get_serializer(data=items, many=True, partial=True)
+
+        serializer.is_valid(raise_exception=True)
+
+        changes = {item['id']: item for item in serializer.validated_data if 'id' in item}
+        if len(changes) != len(items):
+            return Response({"error": "Every contact needs a unique id."}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            contacts = list(
+                EmergencyContact.objects.select_for_update().filter(user=request.user, id__in=changes)
+            )
+            if len(contacts) != len(changes):
+                missing = set(changes) - {contact.id for contact in contacts}
+                return Response(
+                    {"error": "Contacts not found.", "ids": sorted(str(contact_id) for contact_id in missing)},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+            fields = set()
+            for contact in contacts:
+                for field, value in changes[contact.id].items():
+                    if field != 'id':
+                        setattr(contact, field, value)
+                        fields.add(field)
+            if fields:
+                EmergencyContact.objects.bulk_update(contacts, sorted(fields))
+        caller_directory.invalidate(user_id=request.user.id)
+
+        return Response(EmergencyContactSerializer(contacts, many=True).data, status=status.HTTP_200_OK)
+
+    def delete(self, request, *args, **kwargs):
+        serializer = EmergencyContactDeleteSerializer(data=request.data)
+
+        serializer.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            deleted, _ = EmergencyContact.objects.filter(
+                user=request.user, id__in=serializer.validated_data['ids']
+            ).delete()
+        caller_directory.invalidate(user_id=request.user.id)
+
+        return Response({"deleted": deleted}, status=status.HTTP_200_OK)
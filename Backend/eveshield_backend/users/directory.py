@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework import status
+from rest_framework.generics import GenericAPIView
+from rest_framework.response import Response
+
+from eveshield_backend.routers import use_primary
+
+from .models import EmergencyContact, normalize_phone_number
+from .permissions import HasServiceToken
+
+
+DEFAULTS = {
+    'TTL_SECONDS': 60.0,
+    'MAX_ENTRIES': 50_000,
+}
+
+User = get_user_model()
+
+
+class CallerDirectory:
+    """
+    Per-process cache from E.164 numbers to the caller's profile and
+    emergency contacts. Unknown numbers are cached too, so repeat calls
+    from unregistered phones do not query either.
+    """
+
+    def __init__(self, options=None):
+        self.options = options or {**DEFAULTS, **getattr(settings, 'CALLER_LOOKUP_CACHE', {})}
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._numbers_by_user = {}
+        self.hits = self.misses = 0
+
+    def lookup(self, phone_number):
+        e164 = normalize_phone_number(phone_number)
+        if not e164:
+            return None
+        with self._lock:
+            entry = self._entries.get(e164)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(e164)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # From the primary: the entry may have just been invalidated by a write
+        with use_primary():
+            profile = self._load(e164)
+        with self._lock:
+            self._entries[e164] = (profile, time.monotonic() + self.options['TTL_SECONDS'])
+            self._entries.move_to_end(e164)
+            if profile is not None:
+                self._numbers_by_user[profile['user_id']] = e164
+            while len(self._entries) > self.options['MAX_ENTRIES']:
+                evicted, (evicted_profile, _) = self._entries.popitem(last=False)
+                if evicted_profile is not None:
+                    self._numbers_by_user.pop(evicted_profile['user_id'], None)
+        return profile
+
+    @staticmethod
+    def _load(e164):
+        # The oldest account wins if legacy rows share a number
+        user = (
+            User.objects.filter(phone_e164=e164, is_active=True)
+            .prefetch_related('emergency_contacts')
+            .order_by('date_joined')
+            .first()
+        )
+        if user is None:
+            return None
+        return {
+            'user_id': str(user.id),
+            'username': user.username,
+            'phone_number': user.phone_e164,
+            'contacts': [
+                {
+                    'name': contact.name,
+                    'phone_number': normalize_phone_number(contact.phone_number),
+                    'relationship': contact.relationship,
+                }
+                for contact in user.emergency_contacts.all()
+            ],
+        }
+
+    def invalidate(self, phone_number=None, user_id=None):
+        with self._lock:
+            if user_id is not None:
+                cached = self._numbers_by_user.pop(str(user_id), None)
+                if cached:
+                    self._entries.pop(cached, None)
+            if phone_number:
+                self._entries.pop(normalize_phone_number(phone_number), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._numbers_by_user.clear()
+            self.hits = self.misses = 0
+
+
+caller_directory = CallerDirectory()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_caller(sender, instance, **kwargs):
+    # Also drops a cached "unknown" for a number that has just registered
+    caller_directory.invalidate(phone_number=instance.phone_e164, user_id=instance.id)
+
+
+@receiver(post_save, sender=EmergencyContact)
+@receiver(post_delete, sender=EmergencyContact)
+def invalidate_caller_contacts(sender, instance, **kwargs):
+    caller_directory.invalidate(user_id=instance.user_id)
+
+
+class CallerLookupAPIView(GenericAPIView):
+    """
+    An endpoint for the voice pipeline to match an incoming caller's number
+    to a registered user and their emergency contacts.
+    """
+
+    authentication_classes = ()
+    permission_classes = (HasServiceToken,)
+
+    def get(self, request):
+        phone_number = request.query_params.get('phone')
+        if not phone_number:
+            return Response({"error": "phone is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        profile = caller_directory.lookup(phone_number)
+        if profile is None:
+            return Response({"detail": "No registered user for this number."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(profile, status=status.HTTP_200_OK)
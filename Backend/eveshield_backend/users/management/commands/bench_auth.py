@@ -0,0 +1,121 @@
+import asyncio
+import json
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from trigger.buffer import sos_buffer
+
+
+BENCH_PHONE = '+254700000999'
+BENCH_PASSWORD = 'bench-password-123'
+
+
+async def call(application, path, payload, token=None):
+    """POST JSON straight to the ASGI application; returns the status code"""
+    body = json.dumps(payload).encode()
+    headers = [(b'host', b'localhost'), (b'content-type', b'application/json'),
+               (b'content-length', str(len(body)).encode())]
+    if token:
+        headers.append((b'authorization', f'Bearer {token}'.encode()))
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+        'root_path': '', 'headers': headers, 'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    disconnected = asyncio.Event()
+    response = {}
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+
+    try:
+        await application(scope, receive, send)
+    finally:
+        disconnected.set()
+    return response.get('status')
+
+
+def summary(latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return (f"p50 {statistics.median(latencies) * 1000:7.1f} ms   "
+            f"p95 {p95 * 1000:7.1f} ms   max {latencies[-1] * 1000:7.1f} ms")
+
+
+class Command(BaseCommand):
+    help = "Measure SOS latency with and without a concurrent burst of logins, through the ASGI application"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=50, help="Logins in the burst")
+        parser.add_argument('--concurrency', type=int, default=20, help="Logins in flight at once")
+        parser.add_argument('--sos', type=int, default=100, help="SOS presses per phase")
+        parser.add_argument('--sos-interval', type=float, default=0.01,
+                            help="Seconds between SOS presses")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        user = User.objects.filter(phone_number=BENCH_PHONE).first()
+        if user is None:
+            user = User.objects.create_user(BENCH_PHONE, 'Benchmark User', password=BENCH_PASSWORD)
+        access = str(RefreshToken.for_user(user).access_token)
+
+        try:
+            asyncio.run(self.run(get_asgi_application(), access, options))
+        finally:
+            sos_buffer.flush()
+            user.delete()
+
+    async def run(self, application, access, options):
+        async def sos_phase():
+            async def press():
+                start = time.perf_counter()
+                status = await call(application, '/api/trigger/sos/', {'message': 'benchmark'}, access)
+                latencies.append(time.perf_counter() - start)
+                return status
+
+            latencies = []
+            presses = []
+            for _ in range(options['sos']):
+                presses.append(asyncio.ensure_future(press()))
+                await asyncio.sleep(options['sos_interval'])
+            statuses = await asyncio.gather(*presses)
+            return latencies, statuses
+
+        async def login_burst():
+            semaphore = asyncio.Semaphore(options['concurrency'])
+
+            async def login():
+                async with semaphore:
+                    return await call(application, '/api/users/auth/login/',
+                                      {'phone_number': BENCH_PHONE, 'password': BENCH_PASSWORD})
+
+            start = time.perf_counter()
+            statuses = await asyncio.gather(*(login() for _ in range(options['logins'])))
+            return time.perf_counter() - start, statuses
+
+        await call(application, '/api/trigger/sos/', {}, access)  # warm the user cache
+
+        idle, _ = await sos_phase()
+        (loaded, sos_statuses), (elapsed, login_statuses) = await asyncio.gather(sos_phase(), login_burst())
+
+        ok = sum(1 for status in login_statuses if status == 200)
+        self.stdout.write(f"SOS, idle:        {summary(idle)}")
+        self.stdout.write(f"SOS, under login: {summary(loaded)}")
+        self.stdout.write(f"SOS accepted under load: {sum(1 for s in sos_statuses if s == 202)}/{len(sos_statuses)}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Logins: {ok}/{len(login_statuses)} succeeded, {len(login_statuses) / elapsed:.1f}/s "
+            f"at concurrency {options['concurrency']}"
+        ))
@@ -0,0 +1,182 @@
+import csv
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from users.models import normalize_phone_number
+
+
+# Bulk onboarding of partner users
+#
+# Rows are streamed from the file in batches. Each batch is validated with
+# the model's field validators (phone_regex included), its passwords are
+# hashed across a process pool while the previous batch is written, and it
+# is inserted with bulk_create in one transaction. After every committed
+# batch the number of rows consumed is saved to a checkpoint file, so an
+# interrupted import picks up where it stopped; numbers already registered
+# are skipped, so re-running a batch is harmless. bulk_create bypasses
+# save() and its signals, so phone_e164 is set here, and running servers
+# pick up numbers they had cached as unknown within CALLER_LOOKUP_CACHE's TTL.
+
+User = get_user_model()
+
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+
+def _init_worker(settings_module):
+    # Spawned workers (macOS, Windows) start without Django configured
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+
+
+def read_records(path, fmt):
+    """Yield the file's records one at a time; None for a line that is not JSON"""
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+
+class Command(BaseCommand):
+    help = "Import users from a CSV or JSONL file with phone_number, username, email and password fields"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV with a header row, or one JSON object per line")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the file extension")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Users hashed and inserted per transaction")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Processes hashing passwords")
+        parser.add_argument('--checkpoint', help="Progress file to resume from (default: <path>.checkpoint)")
+        parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist")
+        fmt = options['format'] or FORMATS.get(os.path.splitext(path)[1].lower())
+        if fmt is None:
+            raise CommandError("Cannot tell the format from the file name; pass --format")
+
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        done = 0 if options['restart'] else self.load_checkpoint(checkpoint, path)
+        if done:
+            self.stdout.write(f"Resuming after row {done}")
+
+        self.counts = {'created': 0, 'existing': 0, 'invalid': 0}
+        self.seen = set()
+        resumed_from, started = done, time.monotonic()
+        records = itertools.islice(enumerate(read_records(path, fmt), 1), done, None)
+
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker,
+                                 initargs=(settings.SETTINGS_MODULE,)) as pool:
+            # Hash batch n on the pool while batch n - 1 is written
+            in_flight = None
+            while True:
+                batch = list(itertools.islice(records, options['batch_size']))
+                if batch:
+                    users, passwords = self.prepare(batch)
+                    chunksize = max(1, len(passwords) // (options['workers'] * 4))
+                    hashing = (users, pool.map(make_password, passwords, chunksize=chunksize), batch[-1][0])
+                if in_flight:
+                    done = self.write(*in_flight)
+                    self.save_checkpoint(checkpoint, path, done)
+                    rate = (done - resumed_from) / max(time.monotonic() - started, 1e-6)
+                    self.stdout.write(
+                        f"{done} rows: {self.counts['created']} created, {self.counts['existing']} already "
+                        f"registered, {self.counts['invalid']} invalid ({rate:.0f} rows/s)"
+                    )
+                if not batch:
+                    break
+                in_flight = hashing
+
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {self.counts['created']} users in {time.monotonic() - started:.1f}s "
+            f"({self.counts['existing']} already registered, {self.counts['invalid']} invalid)"
+        ))
+
+    def prepare(self, batch):
+        """Unsaved users for the valid rows of a batch, and their raw passwords"""
+        users, passwords = [], []
+        for row, record in batch:
+            if not isinstance(record, dict):
+                self.reject(row, "not a JSON object")
+                continue
+            phone_number = normalize_phone_number(record.get('phone_number'))
+            user = User(
+                phone_number=phone_number,
+                phone_e164=phone_number,
+                username=record.get('username') or None,
+                email=User.objects.normalize_email(record.get('email') or None),
+            )
+            try:
+                user.clean_fields(exclude=['password'])
+            except ValidationError as e:
+                self.reject(row, "; ".join(f"{field}: {' '.join(errors)}" for field, errors in e.message_dict.items()))
+                continue
+            if phone_number in self.seen:
+                self.counts['existing'] += 1
+                continue
+            self.seen.add(phone_number)
+            users.append(user)
+            passwords.append(record.get('password') or None)  # None makes an unusable password
+        return users, passwords
+
+    def reject(self, row, reason):
+        self.counts['invalid'] += 1
+        self.stderr.write(f"Row {row} skipped: {reason}")
+
+    def write(self, users, hashes, last_row):
+        """Insert a prepared batch; returns the number of rows consumed so far"""
+        for user, password in zip(users, hashes):
+            user.password = password
+        if not users:
+            return last_row
+
+        with transaction.atomic():
+            existing = set(
+                User.objects.filter(phone_e164__in=[user.phone_e164 for user in users])
+                .values_list('phone_e164', flat=True)
+            )
+            new_users = [user for user in users if user.phone_e164 not in existing]
+            User.objects.bulk_create(new_users)
+
+        self.counts['created'] += len(new_users)
+        self.counts['existing'] += len(users) - len(new_users)
+        return last_row
+
+    @staticmethod
+    def load_checkpoint(checkpoint, path):
+        if not os.path.exists(checkpoint):
+            return 0
+        with open(checkpoint) as f:
+            state = json.load(f)
+        if state.get('path') != os.path.abspath(path) or state.get('size') != os.path.getsize(path):
+            raise CommandError(f"{checkpoint} belongs to another file; pass --restart to start over")
+        return state['rows']
+
+    @staticmethod
+    def save_checkpoint(checkpoint, path, rows):
+        state = {'path': os.path.abspath(path), 'size': os.path.getsize(path), 'rows': rows}
+        with open(f'{checkpoint}.tmp', 'w') as f:
+            json.dump(state, f)
+        os.replace(f'{checkpoint}.tmp', checkpoint)
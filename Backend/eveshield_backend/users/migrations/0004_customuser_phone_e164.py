@@ -0,0 +1,58 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:53
+
+import re
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+
+def normalize_phone_number(phone_number, country_code='254'):
+    # Frozen copy of users.models.normalize_phone_number as of this migration
+    if not phone_number:
+        return phone_number
+    number = re.sub(r'[\s\-().]', '', str(phone_number))
+    if number.startswith('00'):
+        number = '+' + number[2:]
+    if number.startswith('+'):
+        return number
+    if number.startswith('0') and len(number) == 10:
+        return f'+{country_code}{number[1:]}'
+    if number.startswith(country_code) and len(number) == len(country_code) + 9:
+        return '+' + number
+    if len(number) == 9 and number[0] in '17':
+        return f'+{country_code}{number}'
+    return number
+
+
+def backfill_phone_e164(apps, schema_editor):
+    # Walk the table by primary key so each batch is one indexed range read
+    CustomUser = apps.get_model('users', 'CustomUser')
+    db_alias = schema_editor.connection.alias
+    users = CustomUser.objects.using(db_alias).only('id', 'phone_number').order_by('id')
+    last_id = None
+    while True:
+        batch = list((users.filter(id__gt=last_id) if last_id else users)[:BATCH_SIZE])
+        if not batch:
+            break
+        for user in batch:
+            user.phone_e164 = normalize_phone_number(user.phone_number)
+        CustomUser.objects.using(db_alias).bulk_update(batch, ['phone_e164'])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_alter_customuser_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='phone_e164',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=16, null=True),
+        ),
+        migrations.RunPython(backfill_phone_e164, migrations.RunPython.noop),
+    ]
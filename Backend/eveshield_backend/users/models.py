@@ -2,8 +2,36 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager, PermissionsMixin
 from django.conf import settings
 from django.core.validators import RegexValidator
+import re
 import uuid
 
+from .passwords import password_pool
+
+
+DEFAULT_COUNTRY_CODE = '254'
+
+
+def normalize_phone_number(phone_number, country_code=DEFAULT_COUNTRY_CODE):
+    """
+    Canonical E.164 form of a phone number, e.g. '0712 345-678', '254712345678'
+    and '+254712345678' all become '+254712345678'. Numbers that cannot be
+    made E.164 are returned stripped of formatting.
+    """
+    if not phone_number:
+        return phone_number
+    number = re.sub(r'[\s\-().]', '', str(phone_number))
+    if number.startswith('00'):
+        number = '+' + number[2:]
+    if number.startswith('+'):
+        return number
+    if number.startswith('0') and len(number) == 10:
+        return f'+{country_code}{number[1:]}'
+    if number.startswith(country_code) and len(number) == len(country_code) + 9:
+        return '+' + number
+    if len(number) == 9 and number[0] in '17':
+        return f'+{country_code}{number}'
+    return number
+
 
 # User
 
@@ -14,6 +42,7 @@ class CustomUserManager(BaseUserManager):
             raise ValueError("Phone number is required")
 
         email = self.normalize_email(email)
+        phone_number = self.normalize_phone_number(phone_number)
 
         user = self.model(
             phone_number=phone_number,
@@ -42,9 +71,43 @@ class CustomUserManager(BaseUserManager):
 
     def normalize_phone_number(self, phone_number):
         # Normalize e.g. 0712345678 -> +254712345678
-        if phone_number.startswith('0') and len(phone_number) == 10:
-            return '+254' + phone_number[1:]
-        return phone_number
+        return normalize_phone_number(phone_number)
+
+    def get_by_natural_key(self, phone_number):
+        # The number exactly as registered first: legacy rows can hold both the
+        # 07... and +254... forms of one number, each its own account
+        user = self.filter(phone_number=phone_number).first()
+        if user is None:
+            # Then any other format of a registered number
+            e164 = self.normalize_phone_number(phone_number)
+            user = self.filter(phone_e164=e164).order_by('date_joined').first()
+        if user is None:
+            raise self.model.DoesNotExist
+        return user
+
+    async def aget_by_natural_key(self, phone_number):
+        user = await self.filter(phone_number=phone_number).afirst()
+        if user is None:
+            e164 = self.normalize_phone_number(phone_number)
+            user = await self.filter(phone_e164=e164).order_by('date_joined').afirst()
+        if user is None:
+            raise self.model.DoesNotExist
+        return user
+
+    async def acreate_user(self, phone_number, username, email=None, password=None, **extra_fields):
+        """create_user for async views; the password is hashed on the hasher pool."""
+        if not phone_number:
+            raise ValueError("Phone number is required")
+
+        user = self.model(
+            phone_number=self.normalize_phone_number(phone_number),
+            username=username,
+            email=self.normalize_email(email),
+            **extra_fields
+        )
+        user.password = await password_pool.make_password(password)
+        await user.asave(using=self._db)
+        return user
 
 
 class CustomUser(AbstractUser, PermissionsMixin):
@@ -59,6 +122,8 @@ class CustomUser(AbstractUser, PermissionsMixin):
         max_length=15,
         unique=True
     )
+    # phone_number in E.164, filled on save; what incoming calls are matched on
+    phone_e164 = models.CharField(max_length=16, null=True, blank=True, db_index=True, editable=False)
 
     date_of_birth = models.DateField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
@@ -72,6 +137,13 @@ class CustomUser(AbstractUser, PermissionsMixin):
     USERNAME_FIELD = 'phone_number'  # Set phone_number as the primary identifier
     REQUIRED_FIELDS = ['username']  # username is a required field
 
+    def save(self, *args, **kwargs):
+        self.phone_e164 = normalize_phone_number(self.phone_number)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phone_number' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'phone_e164'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.phone_number
 
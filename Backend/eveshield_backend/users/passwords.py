@@ -0,0 +1,80 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, verify_password
+
+
+# Password hashing off the event loop
+#
+# A PBKDF2 hash costs tens of milliseconds of CPU. Run on the event loop it
+# stalls every other request of the process (Django's own acheck_password
+# does exactly that), so async views hash on a small thread pool instead;
+# hashlib releases the GIL while it hashes, so the threads run in parallel.
+# The pool is bounded twice: WORKERS hashes run at once and at most
+# MAX_PENDING wait, beyond which logins are refused with 503 rather than
+# queueing without limit.
+
+DEFAULTS = {
+    'WORKERS': min(4, os.cpu_count() or 1),
+    'MAX_PENDING': 64,
+}
+
+
+class HasherBusy(Exception):
+    pass
+
+
+class PasswordHasherPool:
+    def __init__(self, options=None):
+        self.options = options or {**DEFAULTS, **getattr(settings, 'PASSWORD_HASHER_POOL', {})}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._pending = 0
+        self.hashed = self.rejected = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.options['WORKERS'], thread_name_prefix='password-hasher')
+            return self._executor
+
+    async def _run(self, func, *args):
+        executor = self._get_executor()
+        with self._lock:
+            if self._pending >= self.options['WORKERS'] + self.options['MAX_PENDING']:
+                self.rejected += 1
+                raise HasherBusy()
+            self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self.hashed += 1
+
+    async def make_password(self, raw_password):
+        return await self._run(make_password, raw_password)
+
+    async def check_password(self, user, raw_password):
+        """
+        Whether raw_password is the user's; a hash made with outdated
+        parameters is upgraded and saved, as User.check_password does.
+        """
+        is_correct, must_update = await self._run(verify_password, raw_password, user.password)
+        if is_correct and must_update:
+            user.password = await self.make_password(raw_password)
+            await user.asave(update_fields=['password'])
+        return is_correct
+
+    def stats(self):
+        with self._lock:
+            return {'pending': self._pending, 'hashed': self.hashed, 'rejected': self.rejected}
+
+
+password_pool = PasswordHasherPool()
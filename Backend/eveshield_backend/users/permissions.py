@@ -0,0 +1,17 @@
+import hmac
+
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+
+class HasServiceToken(BasePermission):
+    """
+    Allows internal services (the voice pipeline) that send the shared
+    SERVICE_TOKEN in the X-Service-Token header. Denies everyone when no
+    token is configured.
+    """
+
+    def has_permission(self, request, view):
+        expected = getattr(settings, 'SERVICE_TOKEN', None)
+        supplied = request.headers.get('X-Service-Token', '')
+        return bool(expected) and hmac.compare_digest(supplied.encode(), expected.encode())
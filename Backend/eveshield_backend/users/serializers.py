@@ -1,5 +1,8 @@
-from django.contrib.auth import get_user_model, authenticate
+from django.contrib.auth import get_user_model
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from .blacklist import CachedRefreshToken
+from .models import EmergencyContact, normalize_phone_number
 
 User = get_user_model()
 
@@ -17,27 +20,52 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 class RegisterUserSerializer(serializers.ModelSerializer):
+    """
+    Validates a registration without touching the database, so it is safe in
+    async views; the register view checks the number is not taken.
+    """
     class Meta:
         model = User
         fields = ['id', 'phone_number', 'username', 'email', 'password']
         extra_kwargs = {
             "password": {"write_only": True},
-            "email": {"required": False, "allow_blank": True, "allow_null": True}
+            "email": {"required": False, "allow_blank": True, "allow_null": True},
+            "phone_number": {"validators": [User.phone_regex]}
         }
 
-    def create(self, validated_data):
-        return User.objects.create_user(**validated_data)
-
 
 class LoginUserSerializer(serializers.Serializer):
     """
-    Serializer class to authenticate users with phone_number and password.
+    Serializer class for the phone_number and password users log in with;
+    the login view checks them against the database.
     """
     phone_number = serializers.CharField()
     password = serializers.CharField(write_only=True)
 
-    def validate(self, data):
-        user = authenticate(**data)
-        if user and user.is_active:
-            return user
-        raise serializers.ValidationError("Incorrect Credentials")
+
+class CachedTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = CachedRefreshToken
+
+
+class EmergencyContactSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = EmergencyContact
+        fields = ['id', 'name', 'phone_number', 'relationship']
+        read_only_fields = ['id']
+
+    def validate_phone_number(self, value):
+        return normalize_phone_number(value)
+
+
+class EmergencyContactUpdateSerializer(EmergencyContactSerializer):
+    """
+    One item of a bulk update: the contact's id plus the fields to change.
+    """
+    id = serializers.UUIDField()
+
+    class Meta(EmergencyContactSerializer.Meta):
+        read_only_fields = []
+
+
+class EmergencyContactDeleteSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.UUIDField(), min_length=1, max_length=100)
@@ -1,6 +1,28 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .authentication import CachedJWTAuthentication, user_cache
+from .blacklist import BlacklistCache, BloomFilter, blacklist_cache, cache_settings
+from .directory import caller_directory
+from .models import EmergencyContact, normalize_phone_number
+from .passwords import password_pool
+from .serializers import RegisterUserSerializer
 
 # ========= TEST CASES FOR USER REGISTRATION, LOGIN & LOGOUT ========
 
@@ -64,3 +86,440 @@ class UserAPITestCase(APITestCase):
         }, format="json")
 
         self.assertEqual(response.status_code, status.HTTP_205_RESET_CONTENT)
+
+
+# ========= TEST CASES FOR TOKEN REFRESH, BLACKLIST CACHE & PRUNING ========
+
+
+class TokenBlacklistTestCase(APITestCase):
+
+    def setUp(self):
+        blacklist_cache.reset()
+        self.register_url = '/api/users/auth/register/'
+        self.login_url = '/api/users/auth/login/'
+        self.logout_url = '/api/users/auth/logout/'
+        self.refresh_url = '/api/users/auth/refresh/'
+        self.client.post(self.register_url, {
+            "phone_number": "+254712345678",
+            "username": "Test User",
+            "password": "password123"
+        })
+        response = self.client.post(self.login_url, {
+            "phone_number": "+254712345678",
+            "password": "password123"
+        })
+        self.tokens = response.data["tokens"]
+
+    def test_refresh_rotates_and_rejects_reused_token(self):
+        response = self.client.post(self.refresh_url, {"refresh": self.tokens["refresh"]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("access", response.data)
+        self.assertNotEqual(response.data["refresh"], self.tokens["refresh"])
+
+        # The rotated token was blacklisted and is answered from the cache
+        response = self.client.post(self.refresh_url, {"refresh": self.tokens["refresh"]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(blacklist_cache.hits, 1)
+
+    def test_refresh_after_logout_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.tokens["access"]}')
+        self.client.post(self.logout_url, {"refresh": self.tokens["refresh"]}, format="json")
+
+        response = self.client.post(self.refresh_url, {"refresh": self.tokens["refresh"]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_blacklisting_from_another_process_is_picked_up(self):
+        token = RefreshToken(self.tokens["refresh"])
+        self.assertFalse(blacklist_cache.contains(token["jti"]))
+
+        # Blacklisted behind the cache's back, as another worker would
+        token.blacklist()
+        options = blacklist_cache.options
+        self.addCleanup(setattr, blacklist_cache, "options", options)
+        blacklist_cache.options = {**options, "REFRESH_SECONDS": 0}
+        self.assertTrue(blacklist_cache.contains(token["jti"]))
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        values = [f"jti-{i}" for i in range(1000)]
+        for value in values:
+            bloom.add(value)
+        self.assertTrue(all(value in bloom for value in values))
+        false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_prune_tokens_deletes_expired_tokens(self):
+        expired = OutstandingToken.objects.create(
+            jti="expired", token="x", expires_at=timezone.now() - timedelta(days=1)
+        )
+        BlacklistedToken.objects.create(token=expired)
+        live = OutstandingToken.objects.count() - 1
+
+        call_command("prune_tokens", batch_size=1, stdout=StringIO())
+
+        self.assertFalse(OutstandingToken.objects.filter(jti="expired").exists())
+        self.assertFalse(BlacklistedToken.objects.filter(token_id=expired.id).exists())
+        self.assertEqual(OutstandingToken.objects.count(), live)
+
+
+
+class BlacklistRebuildTestCase(TransactionTestCase):
+    # The rebuild thread has its own connection and only sees committed rows
+
+    def test_periodic_rebuild_runs_in_the_background(self):
+        cache = BlacklistCache(options={**cache_settings(), "REFRESH_SECONDS": 3600})
+        cache.rebuild()
+        old = cache._bloom
+        token = OutstandingToken.objects.create(jti="late", token="x", expires_at=timezone.now() + timedelta(days=1))
+        BlacklistedToken.objects.create(token=token)
+
+        # The due rebuild does not hold up the check, which still uses the old filter
+        cache.options = {**cache.options, "REBUILD_SECONDS": 0}
+        self.assertFalse(cache.contains("late"))
+
+        deadline = time.monotonic() + 5
+        while cache._bloom is old and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertIsNot(cache._bloom, old)
+        self.assertIn("late", cache._bloom)
+
+
+# ========= TEST CASES FOR CACHED JWT AUTHENTICATION ========
+
+
+class CachedJWTAuthenticationTestCase(APITestCase):
+
+    def setUp(self):
+        user_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            phone_number="+254712345678", username="Test User", password="password123"
+        )
+        self.access = str(RefreshToken.for_user(self.user).access_token)
+        self.authentication = CachedJWTAuthentication()
+        self.request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {self.access}')
+
+    def test_repeated_requests_skip_the_database(self):
+        user, _ = self.authentication.authenticate(self.request)
+        self.assertEqual(user.pk, self.user.pk)
+
+        with self.assertNumQueries(0):
+            user, _ = self.authentication.authenticate(self.request)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user_cache.stats()["hits"], 1)
+        self.assertEqual(user_cache.stats()["misses"], 1)
+
+    def test_deactivating_a_user_invalidates_the_cache(self):
+        self.authentication.authenticate(self.request)
+
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate(self.request)
+
+    def test_entries_expire_after_ttl(self):
+        options = user_cache.options
+        self.addCleanup(setattr, user_cache, "options", options)
+        user_cache.options = {**options, "TTL_SECONDS": 0}
+
+        self.authentication.authenticate(self.request)
+        with self.assertNumQueries(1):
+            self.authentication.authenticate(self.request)
+
+
+# ========= TEST CASES FOR PHONE NORMALIZATION & CALLER LOOKUP ========
+
+
+@override_settings(SERVICE_TOKEN="service-secret")
+class CallerLookupTestCase(APITestCase):
+
+    def setUp(self):
+        caller_directory.clear()
+        self.lookup_url = '/api/users/callers/lookup/'
+        self.user = get_user_model().objects.create_user(
+            phone_number="254712345678", username="Test User", password="password123"
+        )
+        EmergencyContact.objects.create(
+            user=self.user, name="Jane", phone_number="0722 000 111", relationship="Sister"
+        )
+
+    def test_normalize_phone_number(self):
+        for raw in ("0712345678", "0712 345-678", "254712345678", "+254712345678", "00254712345678", "712345678"):
+            self.assertEqual(normalize_phone_number(raw), "+254712345678")
+
+    def test_create_user_stores_e164(self):
+        self.assertEqual(self.user.phone_number, "+254712345678")
+        self.assertEqual(self.user.phone_e164, "+254712345678")
+
+    def test_login_with_local_format(self):
+        response = self.client.post('/api/users/auth/login/', {
+            "phone_number": "0712345678",
+            "password": "password123"
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_login_prefers_the_exactly_matching_legacy_account(self):
+        # A legacy row holding the local form of the same number, registered first
+        User = get_user_model()
+        legacy = User(phone_number="0712345678", username="Legacy User")
+        legacy.set_password("legacy-password")
+        legacy.save()
+        User.objects.filter(pk=legacy.pk).update(date_joined=self.user.date_joined - timedelta(days=1))
+
+        for phone_number, password in (("+254712345678", "password123"), ("0712345678", "legacy-password")):
+            response = self.client.post('/api/users/auth/login/', {
+                "phone_number": phone_number,
+                "password": password
+            })
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(User.objects.get_by_natural_key("0712345678"), legacy)
+        self.assertEqual(User.objects.get_by_natural_key("+254712345678"), self.user)
+        self.assertEqual(async_to_sync(User.objects.aget_by_natural_key)("0712345678"), legacy)
+        self.assertEqual(async_to_sync(User.objects.aget_by_natural_key)("+254712345678"), self.user)
+        # Other formats still find the earliest account
+        self.assertEqual(User.objects.get_by_natural_key("0712 345 678"), legacy)
+        with self.assertRaises(User.DoesNotExist):
+            User.objects.get_by_natural_key("+254799999999")
+
+    def test_lookup_requires_service_token(self):
+        response = self.client.get(self.lookup_url, {"phone": "+254712345678"})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_lookup_returns_profile_and_contacts_from_cache(self):
+        self.client.credentials(HTTP_X_SERVICE_TOKEN="service-secret")
+        response = self.client.get(self.lookup_url, {"phone": "0712 345 678"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["user_id"], str(self.user.id))
+        self.assertEqual(response.data["contacts"][0]["phone_number"], "+254722000111")
+
+        with self.assertNumQueries(0):
+            self.client.get(self.lookup_url, {"phone": "+254712345678"})
+        self.assertEqual(caller_directory.hits, 1)
+
+    def test_lookup_cache_invalidated_by_changes(self):
+        self.client.credentials(HTTP_X_SERVICE_TOKEN="service-secret")
+        self.assertEqual(self.client.get(self.lookup_url, {"phone": "+254799999999"}).status_code,
+                         status.HTTP_404_NOT_FOUND)
+        get_user_model().objects.create_user(phone_number="+254799999999", username="New", password="password123")
+        self.assertEqual(self.client.get(self.lookup_url, {"phone": "+254799999999"}).status_code,
+                         status.HTTP_200_OK)
+
+        self.client.get(self.lookup_url, {"phone": "+254712345678"})
+        EmergencyContact.objects.create(user=self.user, name="Tom", phone_number="+254733000111", relationship="Friend")
+        response = self.client.get(self.lookup_url, {"phone": "+254712345678"})
+        self.assertEqual(len(response.data["contacts"]), 2)
+
+
+# ========= TEST CASES FOR BULK EMERGENCY CONTACTS ========
+
+
+class EmergencyContactAPITestCase(APITestCase):
+
+    def setUp(self):
+        self.contacts_url = '/api/users/contacts/'
+        self.bulk_url = '/api/users/contacts/bulk/'
+        self.user = get_user_model().objects.create_user(
+            phone_number="+254712345678", username="Test User", password="password123"
+        )
+        self.client.force_authenticate(self.user)
+
+    def contacts(self, count, prefix="Contact"):
+        return [
+            {"name": f"{prefix} {i}", "phone_number": f"07220001{i:02d}", "relationship": "Friend"}
+            for i in range(count)
+        ]
+
+    def test_bulk_create_costs_constant_queries(self):
+        # savepoint, one insert, release: the same for one contact or fifty
+        with self.assertNumQueries(3):
+            response = self.client.post(self.contacts_url, self.contacts(1, "One"), format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        with self.assertNumQueries(3):
+            response = self.client.post(self.contacts_url, self.contacts(50), format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 50)
+        self.assertEqual(response.data[0]["phone_number"], "+254722000100")
+        self.assertEqual(self.user.emergency_contacts.count(), 51)
+
+    def test_list_costs_one_query(self):
+        self.client.post(self.contacts_url, self.contacts(20), format="json")
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.contacts_url)
+        self.assertEqual(len(response.data["contacts"]), 20)
+        self.assertEqual(response.data["user"]["phone_number"], "+254712345678")
+
+    def test_bulk_update_and_delete(self):
+        created = self.client.post(self.contacts_url, self.contacts(10), format="json").data
+        changes = [{"id": contact["id"], "relationship": "Sibling"} for contact in created]
+
+        # savepoint, one select, one update, release
+        with self.assertNumQueries(4):
+            response = self.client.patch(self.bulk_url, changes, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.user.emergency_contacts.filter(relationship="Sibling").count(), 10)
+
+        response = self.client.delete(self.bulk_url, {"ids": [c["id"] for c in created[:4]]}, format="json")
+        self.assertEqual(response.data["deleted"], 4)
+        self.assertEqual(self.user.emergency_contacts.count(), 6)
+
+    def test_other_users_contacts_are_out_of_reach(self):
+        other = get_user_model().objects.create_user(
+            phone_number="+254799999999", username="Other", password="password123"
+        )
+        contact = EmergencyContact.objects.create(
+            user=other, name="Theirs", phone_number="+254733000111", relationship="Friend"
+        )
+
+        response = self.client.patch(self.bulk_url, [{"id": str(contact.id), "name": "Mine"}], format="json")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.delete(self.bulk_url, {"ids": [str(contact.id)]}, format="json")
+        self.assertEqual(response.data["deleted"], 0)
+
+
+# ========= TEST CASES FOR ASYNC REGISTRATION & LOGIN ========
+
+
+class AsyncAuthTestCase(APITestCase):
+
+    def setUp(self):
+        self.register_url = '/api/users/auth/register/'
+        self.login_url = '/api/users/auth/login/'
+        self.client.post(self.register_url, {
+            "phone_number": "+254712345678",
+            "username": "Test User",
+            "password": "password123"
+        }, format="json")
+
+    def test_validation_does_not_touch_the_database(self):
+        serializer = RegisterUserSerializer(data={"phone_number": "+254712345679", "username": "New", "password": "x"})
+        with self.assertNumQueries(0):
+            self.assertTrue(serializer.is_valid())
+        self.assertFalse(RegisterUserSerializer(data={"phone_number": "0712", "username": "New"}).is_valid())
+
+    def test_register_rejects_taken_number_in_any_format(self):
+        response = self.client.post(self.register_url, {
+            "phone_number": "254712345678",
+            "username": "Someone Else",
+            "password": "password123"
+        }, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("phone_number", response.data)
+
+    def test_login_hashes_on_the_pool(self):
+        hashed = password_pool.stats()["hashed"]
+        response = self.client.post(self.login_url, {"phone_number": "+254712345678", "password": "wrong"},
+                                    format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {"non_field_errors": ["Incorrect Credentials"]})
+
+        # Unknown numbers cost a hash too, so they cannot be told apart by timing
+        self.client.post(self.login_url, {"phone_number": "+254799999999", "password": "wrong"}, format="json")
+        self.assertEqual(password_pool.stats()["hashed"], hashed + 2)
+
+    def test_login_hash_is_upgraded(self):
+        user = get_user_model().objects.get(phone_number="+254712345678")
+        user.password = PBKDF2PasswordHasher().encode("password123", "s" * 22, iterations=1000)
+        user.save(update_fields=["password"])
+
+        response = self.client.post(self.login_url, {"phone_number": "+254712345678", "password": "password123"},
+                                    format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertIn(f"${PBKDF2PasswordHasher.iterations}$", user.password)
+
+    def test_busy_hasher_sheds_logins(self):
+        self.addCleanup(setattr, password_pool, "options", password_pool.options)
+        password_pool.options = {**password_pool.options, "WORKERS": 1, "MAX_PENDING": 0}
+        password_pool._pending += 1
+        self.addCleanup(setattr, password_pool, "_pending", 0)
+
+        response = self.client.post(self.login_url, {"phone_number": "+254712345678", "password": "password123"},
+                                    format="json")
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response["Retry-After"], "1")
+
+
+class AuthBenchmarkTestCase(TransactionTestCase):
+    # The benchmark drives the ASGI application, whose queries run outside the test transaction
+
+    def test_bench_auth_reports_sos_latency_under_login_load(self):
+        out = StringIO()
+        call_command("bench_auth", "--logins", "2", "--concurrency", "2", "--sos", "5", "--sos-interval", "0",
+                     stdout=out)
+        self.assertIn("SOS, under login", out.getvalue())
+        self.assertIn("Logins: 2/2 succeeded", out.getvalue())
+        self.assertFalse(get_user_model().objects.exists())
+
+
+# ========= TEST CASES FOR BULK USER IMPORT ========
+
+
+class ImportUsersTestCase(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dir = directory.name
+        get_user_model().objects.create_user(
+            phone_number="+254700000001", username="Already Here", password="password123"
+        )
+
+    def write(self, name, content):
+        path = os.path.join(self.dir, name)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def run_import(self, path, *args):
+        out, err = StringIO(), StringIO()
+        call_command("import_users", path, "--workers", "2", *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_imports_csv_in_batches(self):
+        path = self.write("partners.csv", "\n".join([
+            "phone_number,username,email,password",
+            "0712000001,Amina,AMINA@Example.com,secret-1",
+            "+254712000002,Baraka,,secret-2",
+            "not-a-number,Broken,,secret-3",
+            "254712000001,Amina Again,,secret-4",
+            "+254700000001,Already Here,,secret-5",
+            "0712000003,Chebet,,",
+        ]) + "\n")
+
+        # Per batch with new users: savepoint, existing numbers, insert, release
+        with self.assertNumQueries(2 * 4):
+            out, err = self.run_import(path, "--batch-size", "2")
+
+        self.assertIn("Imported 3 users", out)
+        self.assertIn("Row 3 skipped: phone_number", err)
+        self.assertFalse(os.path.exists(path + ".checkpoint"))
+
+        amina = get_user_model().objects.get(phone_e164="+254712000001")
+        self.assertEqual(amina.phone_number, "+254712000001")
+        self.assertEqual(amina.email, "AMINA@example.com")
+        self.assertTrue(amina.check_password("secret-1"))
+        self.assertFalse(get_user_model().objects.get(username="Chebet").has_usable_password())
+
+    def test_resumes_from_checkpoint(self):
+        lines = [json.dumps({"phone_number": f"07120000{i:02d}", "username": f"User {i}", "password": "pw"})
+                 for i in range(1, 7)]
+        path = self.write("partners.jsonl", "\n".join(lines) + "\nnot json\n")
+        with open(path + ".checkpoint", "w") as f:
+            json.dump({"path": os.path.abspath(path), "size": os.path.getsize(path), "rows": 4}, f)
+
+        out, err = self.run_import(path)
+
+        self.assertIn("Resuming after row 4", out)
+        self.assertIn("Row 7 skipped: not a JSON object", err)
+        self.assertEqual(
+            sorted(get_user_model().objects.exclude(username="Already Here").values_list("username", flat=True)),
+            ["User 5", "User 6"]
+        )
+
+        # Running again re-reads everything; the two imported numbers are skipped
+        out, _ = self.run_import(path)
+        self.assertIn("Imported 4 users", out)
+        self.assertIn("2 already registered", out)
@@ -1,8 +1,11 @@
 from django.urls import path
+from .contacts import EmergencyContactListAPIView, EmergencyContactBulkAPIView
+from .directory import CallerLookupAPIView
 from .auth import (
     RegisterUserAPIView,
     LoginUserAPIView,
-    LogoutUserAPIView
+    LogoutUserAPIView,
+    RefreshTokenAPIView
 )
 
 urlpatterns = [
@@ -10,4 +13,12 @@ urlpatterns = [
     path('auth/register/', RegisterUserAPIView.as_view(), name='register'),
     path('auth/login/', LoginUserAPIView.as_view(), name='login'),
     path('auth/logout/', LogoutUserAPIView.as_view(), name='logout'),
+    path('auth/refresh/', RefreshTokenAPIView.as_view(), name='token_refresh'),
+
+    ##### Emergency contact API urls ######
+    path('contacts/', EmergencyContactListAPIView.as_view(), name='contacts'),
+    path('contacts/bulk/', EmergencyContactBulkAPIView.as_view(), name='contacts_bulk'),
+
+    ##### Internal service API urls ######
+    path('callers/lookup/', CallerLookupAPIView.as_view(), name='caller_lookup'),
 ]
@@ -1,18 +1,121 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response, send_from_directory, send_file
 from twilio.twiml.voice_response import VoiceResponse
+import cProfile
+import hmac
+import io
+import math
+import multiprocessing
+import os
 import threading
+import time
+import uuid
+import wave
 from services.phone_service import PhoneService
-from services.dashboard_service import DashboardService, create_dashboard
+from services.audio_archive import CALL_SID
+from services.dashboard_service import DashboardService
+from services.report_store import ReportStore
+from services.call_coalescer import CallCoalescer
+from services.caller_directory import CallerDirectory
+from services.alert_service import AlertService, compose_message
+from services.incident_clusterer import IncidentClusterer
+from services.ml_scheduler import MLScheduler
+from services.summary_pipeline import SummaryPipeline
+from services import report_export
+from services.overload_controller import OverloadController, FULL, KEYWORDS, RAW
+from dashboard import run_dashboard
 from models.emergency_classifier import EmergencyClassifier
 from config import Config
-from datetime import datetime
+from datetime import datetime, timedelta
+from utils import metrics, profiler
+from utils.language_utils import detect_language, get_response_text
 
 app = Flask(__name__)
 
 # Initialize services
 phone_service = PhoneService()
-dashboard_service = DashboardService()
 classifier = EmergencyClassifier()
+report_store = ReportStore()
+dashboard_service = DashboardService(classifier=classifier, store=report_store)
+call_coalescer = CallCoalescer(report_store)
+incident_clusterer = IncidentClusterer(report_store)
+caller_directory = CallerDirectory(Config.CALLER_DIRECTORY_URL) if Config.CALLER_DIRECTORY_URL else None
+alert_service = AlertService(report_store) if Config.ALERT_SMS_ENABLED else None
+ml_scheduler = MLScheduler()
+summary_pipeline = SummaryPipeline(
+    classifier, report_store, phone_service, ml_scheduler, clusterer=incident_clusterer
+)
+
+def ml_backlog() -> int:
+    """Summaries waiting: in this worker's scheduler, or in the store for ml_worker.py"""
+    if Config.ML_MODE == 'inline':
+        return sum(ml_scheduler.queue_depth().values())
+    return report_store.count_summary_status('pending')
+
+overload_controller = OverloadController(ml_backlog)
+_resuming = threading.Lock()
+
+def resume_deferred_work():
+    """Re-queue surge-deferred reports in the background while load stays low"""
+    if not _resuming.acquire(blocking=False):
+        return
+    
+    def run():
+        try:
+            # Refill the queue only up to where the controller would still recover
+            resume_below = max(1, int(Config.SURGE_QUEUE_KEYWORDS * Config.SURGE_RECOVERY_RATIO))
+            while overload_controller.level == FULL:
+                room = min(Config.SURGE_RESUME_BATCH, resume_below - ml_backlog())
+                if room <= 0:
+                    time.sleep(1.0)
+                    continue
+                if not summary_pipeline.resume_deferred(room, submit=Config.ML_MODE == 'inline'):
+                    break
+        except Exception as e:
+            print(f"Resuming deferred reports failed: {e}")
+        finally:
+            _resuming.release()
+    
+    threading.Thread(target=run, name='resume-deferred', daemon=True).start()
+
+overload_controller.on_recover(resume_deferred_work)
+
+metrics.QUEUE_DEPTH.set_function(
+    lambda: {('ml', severity): depth for severity, depth in ml_scheduler.queue_depth().items()}
+)
+
+@app.before_request
+def start_request_timer():
+    # Always timed: the overload controller watches webhook latency
+    g.request_started = time.perf_counter()
+    
+    # Per-request cProfile for admins: send X-Profile: cprofile with X-Admin-Token
+    if request.headers.get('X-Profile') == 'cprofile' and profiler.is_admin(request.headers.get('X-Admin-Token')):
+        g.cprofile = cProfile.Profile()
+        g.cprofile.enable()
+
+@app.after_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        metrics.REQUEST_SECONDS.observe(elapsed, request.endpoint or 'unknown', str(response.status_code))
+        if request.endpoint == 'process_emergency' and Config.SURGE_ENABLED:
+            overload_controller.observe_latency(elapsed)
+    
+    profile = g.pop('cprofile', None)
+    if profile is not None:
+        profile.disable()
+        response.headers['X-Profile-File'] = profiler.save_cprofile(profile, request.endpoint or 'request')
+    return response
+
+def from_twilio() -> bool:
+    """Whether this request is a callback signed by Twilio with our auth token"""
+    url = request.url
+    if Config.TWILIO_WEBHOOK_BASE_URL:
+        url = Config.TWILIO_WEBHOOK_BASE_URL.rstrip('/') + request.full_path.rstrip('?')
+    return phone_service.is_twilio_request(
+        url, request.form.to_dict(), request.headers.get('X-Twilio-Signature', '')
+    )
 
 @app.route('/emergency-call', methods=['POST'])
 def handle_emergency_call():
@@ -29,28 +132,77 @@ def process_emergency():
     call_sid = request.form.get('CallSid', 'Unknown')
     
     if speech_result:
-        # Process with ML
-        analysis = classifier.process_emergency_report(speech_result)
-        
-        # Add call metadata
-        analysis.update({
-            'caller_number': caller_number,
-            'call_sid': call_sid,
-            'timestamp': datetime.now().isoformat()
-        })
+        # Under surge the expensive steps are deferred until load drops
+        level = overload_controller.level if Config.SURGE_ENABLED else FULL
+        incident = call_coalescer.find_incident(caller_number) if level < RAW else None
+        # Registered callers are linked to their profile and emergency contacts
+        caller = caller_directory.lookup(caller_number) if caller_directory and not incident else None
+        if incident:
+            # Repeat call: fold it into the caller's open incident
+            analysis = call_coalescer.coalesce(
+                incident, speech_result, call_sid, classifier, defer_summary=level >= KEYWORDS
+            )
+            report_id = analysis.pop('report_id')
+        elif level == RAW:
+            # Keep the transcript and answer; analysis runs on recovery
+            report_id = str(uuid.uuid4())
+            analysis = {
+                'original_text': speech_result,
+                'caller_number': caller_number,
+                'call_sid': call_sid,
+                'timestamp': datetime.now().isoformat(),
+                'summary_status': 'deferred',
+                'degradation_level': level
+            }
+            if caller:
+                analysis['caller'] = caller
+            dashboard_service.add_emergency_report(analysis, report_id=report_id)
+        else:
+            # Cheap keyword pass now; the summary is scheduled by severity
+            analysis = classifier.quick_analysis(speech_result)
+            
+            # Add call metadata
+            analysis.update({
+                'caller_number': caller_number,
+                'call_sid': call_sid,
+                'timestamp': datetime.now().isoformat(),
+                'summary_status': 'deferred' if level >= KEYWORDS else 'pending',
+                'degradation_level': level
+            })
+            if caller:
+                analysis['caller'] = caller
+            
+            # Other callers reporting the same incident join it; a near
+            # duplicate reuses the incident's summary instead of a new one
+            report_id = str(uuid.uuid4())
+            match = incident_clusterer.assign(report_id, analysis)
+            if match['similarity'] >= Config.CLUSTER_DUPLICATE_SIMILARITY:
+                representative = report_store.get_report(match['representative'])
+                if representative and representative.get('summary_status') == 'done':
+                    analysis['summary'] = representative['summary']
+                    analysis['summary_status'] = 'done'
+            
+            # Save to the shared store the dashboard reads from
+            dashboard_service.add_emergency_report(analysis, report_id=report_id)
         
-        # Save to dashboard
-        dashboard_service.add_emergency_report(analysis)
+        # Text the caller's emergency contacts in the background
+        if caller and alert_service:
+            alert_service.notify(report_id, caller, compose_message(caller, analysis, report_id))
         
         # Save to file
-        call_id = phone_service.save_emergency_call(analysis)
+        call_id = phone_service.save_emergency_call(analysis, call_id=report_id)
         
-        # Respond to caller
+        if analysis.get('summary_status') == 'pending' and Config.ML_MODE == 'inline':
+            summary_pipeline.submit(
+                report_id, analysis['severity'], analysis['original_text'], analysis.get('language')
+            )
+        
+        # Respond to caller in the language they spoke
+        language = analysis.get('language') or detect_language(speech_result)
         response = VoiceResponse()
         response.say(
-            f"Thank you. Your emergency has been recorded and help is being dispatched. "
-            f"Reference number: {call_id[:8]}. "
-            f"Asante. Dharura yako imerekodiwa na msaada unakuja.",
+            f"{get_response_text('confirmation', language)} "
+            f"{get_response_text('reference', language)}: {call_id[:8]}.",
             language='en'
         )
         
@@ -61,32 +213,223 @@ def process_emergency():
     response.say("No emergency message received. Please call again if you need help.")
     return str(response)
 
+@app.route('/sos-events', methods=['POST'])
+def sos_events():
+    """SOS button presses published in batches by the Django backend"""
+    token = request.headers.get('X-Service-Token') or ''
+    if not Config.SERVICE_TOKEN or not hmac.compare_digest(token, Config.SERVICE_TOKEN):
+        return jsonify({'error': 'Forbidden'}), 403
+    events = (request.get_json(silent=True) or {}).get('events')
+    if not isinstance(events, list):
+        return jsonify({'error': 'Expected {"events": [...]}'}), 400
+    
+    reports, skipped = {}, 0
+    for event in events:
+        try:
+            event_id = event['id']
+            if not isinstance(event_id, (str, int)) or isinstance(event_id, bool):
+                raise TypeError(f"invalid id {event_id!r}")
+            location = None
+            if event.get('latitude') is not None and event.get('longitude') is not None:
+                latitude, longitude = float(event['latitude']), float(event['longitude'])
+                if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                    raise ValueError(f"coordinates out of range: {latitude}, {longitude}")
+                location = f"{latitude:.5f}, {longitude:.5f}"
+        except (KeyError, TypeError, ValueError) as e:
+            # One malformed event must not cost the rest of the batch
+            print(f"Skipping SOS event: {e}")
+            skipped += 1
+            continue
+        source = event.get('source', 'app')
+        reports[str(event_id)] = {
+            'timestamp': event.get('created_at') or datetime.now().isoformat(),
+            'caller_number': event.get('phone_number'),
+            'emergency_type': 'sos',
+            'severity': 'HIGH',
+            'location': location,
+            'original_text': event.get('message') or f"SOS button pressed ({source})",
+            'summary': f"SOS button pressed ({source})",
+            'summary_status': 'done',
+            'user_id': event.get('user_id'),
+        }
+    # Keyed by event id, so a re-published batch neither duplicates nor
+    # overwrites a report that repeat calls have since been coalesced into
+    report_store.add_reports(reports)
+    return jsonify({'stored': len(reports), 'skipped': skipped})
+
+@app.route('/recording-status', methods=['POST'])
+def recording_status():
+    """Twilio recording status callback: archive finished recordings"""
+    if not from_twilio():
+        return jsonify({'error': 'Forbidden'}), 403
+    call_sid = request.form.get('CallSid')
+    recording_url = request.form.get('RecordingUrl')
+    if request.form.get('RecordingStatus', 'completed') != 'completed' or not call_sid or not recording_url:
+        return '', 204
+    try:
+        phone_service.recording_download_url(recording_url)
+        if not CALL_SID.match(call_sid):
+            raise ValueError(f"Invalid CallSid {call_sid!r}")
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def archive():
+        try:
+            phone_service.archive_recording(call_sid, recording_url)
+        except Exception as e:
+            # Twilio keeps the recording; it can be archived again from this URL
+            print(f"Archiving recording for {call_sid} from {recording_url} failed: {e}")
+    
+    # Download and encode off the request thread; Twilio only needs a 2xx
+    threading.Thread(target=archive, name='archive-recording', daemon=True).start()
+    return '', 204
+
+@app.route('/sms-status', methods=['POST'])
+def sms_status():
+    """Twilio delivery receipts for emergency contact alerts"""
+    if alert_service is None:
+        return jsonify({'error': 'SMS alerts are disabled'}), 404
+    if not from_twilio():
+        return jsonify({'error': 'Forbidden'}), 403
+    message_sid = request.form.get('MessageSid')
+    status = request.form.get('MessageStatus')
+    if not message_sid or not status:
+        return jsonify({'error': 'MessageSid and MessageStatus are required'}), 400
+    alert_service.record_status(message_sid, status, request.form.get('ErrorCode'))
+    return '', 204
+
+@app.route('/recordings/<call_sid>', methods=['GET'])
+def get_recording(call_sid):
+    """Archived recording; ?start=&duration= (seconds) returns that range as WAV"""
+    if not profiler.is_admin(request.headers.get('X-Admin-Token')):
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    if not CALL_SID.match(call_sid):
+        return jsonify({'error': 'Invalid CallSid'}), 400
+    try:
+        start, duration = (
+            float(request.args[name]) if request.args.get(name) else None for name in ('start', 'duration')
+        )
+        if start is not None and not (math.isfinite(start) and start >= 0):
+            raise ValueError('start must be a non-negative number of seconds')
+        if duration is not None and not (math.isfinite(duration) and duration > 0):
+            raise ValueError('duration must be a positive number of seconds')
+    except ValueError as e:
+        return jsonify({'error': f'Bad range: {e}'}), 400
+    
+    archive = phone_service.audio_archive
+    record = archive.get(call_sid)
+    if record is None or not os.path.exists(record['path']):
+        return jsonify({'error': 'Recording not found'}), 404
+    
+    if start is None and duration is None:
+        # Compressed file as stored; conditional=True honours Range requests
+        mimetype = 'audio/ogg' if record['codec'] == 'opus' else 'audio/flac'
+        return send_file(record['path'], mimetype=mimetype, conditional=True)
+    
+    duration = min(duration or Config.AUDIO_MAX_RANGE_SECONDS, Config.AUDIO_MAX_RANGE_SECONDS)
+    samples = archive.read_pcm(call_sid, start or 0.0, duration)
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(archive.sample_rate)
+        wav.writeframes(samples.tobytes())
+    return Response(buffer.getvalue(), mimetype='audio/wav')
+
+@app.route('/export', methods=['GET'])
+def export_reports():
+    """Stream reports as CSV or Parquet, filtered by ?start=&end=&type=&severity="""
+    if not profiler.is_admin(request.headers.get('X-Admin-Token')):
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt not in report_export.FORMATS:
+        return jsonify({'error': 'format must be csv or parquet'}), 400
+    if fmt == 'parquet' and not report_export.parquet_available():
+        return jsonify({'error': 'Parquet export needs pyarrow installed'}), 501
+    
+    filters = {
+        'start': request.args.get('start') or None,
+        'end': request.args.get('end') or None,
+        'emergency_type': request.args.get('type') or None,
+        'severity': request.args.get('severity') or None,
+    }
+    return Response(
+        report_export.stream_export(report_store, fmt, filters),
+        mimetype=report_export.FORMATS[fmt][0],
+        headers={
+            'Content-Disposition': f'attachment; filename="{report_export.export_filename(fmt, filters)}"'
+        }
+    )
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/admin/profile', methods=['POST'])
+def start_profile():
+    """Sample every thread of this worker for ?seconds=N in the background"""
+    if not profiler.is_admin(request.headers.get('X-Admin-Token')):
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    fmt = request.args.get('format', 'collapsed')
+    if fmt not in ('collapsed', 'speedscope'):
+        return jsonify({'error': 'format must be collapsed or speedscope'}), 400
+    
+    try:
+        filename = profiler.start_capture(
+            request.args.get('seconds', 10, type=float),
+            fmt,
+            request.args.get('interval', None, type=float)
+        )
+    except profiler.ProfilerBusy as e:
+        return jsonify({'error': str(e)}), 409
+    
+    return jsonify({'profile': filename, 'pid': os.getpid(), 'url': f'/admin/profile/{filename}'}), 202
+
+@app.route('/admin/profile/<filename>', methods=['GET'])
+def download_profile(filename):
+    """Fetch a finished profile (404 while the capture is still running)"""
+    if not profiler.is_admin(request.headers.get('X-Admin-Token')):
+        return jsonify({'error': 'Forbidden'}), 403
+    return send_from_directory(os.path.abspath(Config.PROFILE_DIR), filename, as_attachment=True)
+
+# Stored for the pipeline's own use (the clusterer's MinHash signature), not for clients
+INTERNAL_REPORT_FIELDS = ('minhash',)
+
+def public_report(report):
+    if report is None:
+        return None
+    return {key: value for key, value in report.items() if key not in INTERNAL_REPORT_FIELDS}
+
 @app.route('/dashboard-data', methods=['GET'])
 def get_dashboard_data():
     """API endpoint for dashboard data"""
+    since = (datetime.now() - timedelta(minutes=Config.CLUSTER_WINDOW_MINUTES)).isoformat()
+    incidents = report_store.incidents(since=since, limit=10)
+    for incident in incidents:
+        incident['representative'] = public_report(incident['representative'])
     return jsonify({
         'summary': dashboard_service.get_dashboard_summary(),
-        'recent_emergencies': dashboard_service.emergency_data[-10:] if dashboard_service.emergency_data else []
+        'recent_emergencies': [public_report(report) for report in report_store.recent(10)],
+        'incidents': incidents
     })
 
-def run_dashboard():
-    """Run the Gradio dashboard in a separate thread"""
-    dashboard_app = create_dashboard()
-    dashboard_app.launch(
-        server_name=Config.DASHBOARD_HOST,
-        server_port=Config.DASHBOARD_PORT,
-        share=False
-    )
-
 if __name__ == '__main__':
-    # Start dashboard in separate thread
-    dashboard_thread = threading.Thread(target=run_dashboard)
-    dashboard_thread.daemon = True
-    dashboard_thread.start()
+    # Start dashboard in its own process (once, not again in the reloader child).
+    # Forking shares the already loaded models with it copy-on-write.
+    if os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        dashboard_process = multiprocessing.get_context('fork').Process(
+            target=run_dashboard, args=(dashboard_service,), daemon=True
+        )
+        dashboard_process.start()
     
     # Start Flask app for phone service
     print("Starting Emergency Response System...")
-    print(f"Phone service running on Flask")
+    print(f"Phone service running on Flask (development server)")
+    print(f"For production use: gunicorn -c gunicorn.conf.py wsgi:app")
     print(f"Dashboard available at http://localhost:{Config.DASHBOARD_PORT}")
     
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    app.run(host='0.0.0.0', port=5000, debug=Config.FLASK_DEBUG)
@@ -8,6 +8,20 @@ class Config:
     TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
     TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
     TWILIO_PHONE_NUMBER = os.getenv('TWILIO_PHONE_NUMBER')
+    TWILIO_API_BASE_URL = os.getenv('TWILIO_API_BASE_URL', 'https://api.twilio.com')  # a stub in tests
+    # Public base URL Twilio calls back on (e.g. https://hotline.example.org). Callbacks
+    # are signed over the URL Twilio used, which a proxy may rewrite before Flask sees it.
+    TWILIO_WEBHOOK_BASE_URL = os.getenv('TWILIO_WEBHOOK_BASE_URL')
+    
+    # SMS alerts to a registered caller's emergency contacts (needs CALLER_DIRECTORY_URL)
+    ALERT_SMS_ENABLED = os.getenv('ALERT_SMS_ENABLED', 'false').lower() == 'true'
+    ALERT_STATUS_CALLBACK_URL = os.getenv('ALERT_STATUS_CALLBACK_URL')  # public URL of /sms-status
+    ALERT_CONCURRENCY = int(os.getenv('ALERT_CONCURRENCY', '10'))  # messages in flight per process
+    ALERT_MAX_RETRIES = int(os.getenv('ALERT_MAX_RETRIES', '4'))
+    ALERT_BACKOFF_SECONDS = float(os.getenv('ALERT_BACKOFF_SECONDS', '0.5'))  # doubled per retry
+    ALERT_MAX_RETRY_AFTER = float(os.getenv('ALERT_MAX_RETRY_AFTER', '10'))  # cap on Twilio's Retry-After
+    ALERT_TIMEOUT = float(os.getenv('ALERT_TIMEOUT', '10'))  # seconds per request
+    ALERT_STATUS_FLUSH_SECONDS = float(os.getenv('ALERT_STATUS_FLUSH_SECONDS', '1.0'))
     
     # Emergency Response Configuration
     EMERGENCY_HOTLINE = os.getenv('EMERGENCY_HOTLINE', '+254700000000')
@@ -15,6 +29,32 @@ class Config:
     # Model Configuration
     WHISPER_MODEL = 'base'  # base model supports multilingual
     CLASSIFICATION_MODEL = 'microsoft/DialoGPT-medium'
+    SUMMARIZATION_MODEL = 'facebook/bart-large-cnn'
+    EMOTION_MODEL = 'cardiffnlp/twitter-roberta-base-emotion'
+    # Skip loading model weights and use stand-ins (load testing, development)
+    STUB_MODELS = os.getenv('STUB_MODELS', 'false').lower() == 'true'
+    STUB_MODEL_LATENCY = float(os.getenv('STUB_MODEL_LATENCY', '0'))  # seconds per call
+    
+    # Shared local inference server (inference_server.py). When set, the
+    # webhook, dashboard and workers call it instead of loading the models.
+    INFERENCE_URL = os.getenv('INFERENCE_URL')  # e.g. http://127.0.0.1:8600
+    INFERENCE_HOST = os.getenv('INFERENCE_HOST', '127.0.0.1')
+    INFERENCE_PORT = int(os.getenv('INFERENCE_PORT', '8600'))
+    INFERENCE_MAX_BATCH = int(os.getenv('INFERENCE_MAX_BATCH', '8'))
+    INFERENCE_BATCH_WAIT_MS = float(os.getenv('INFERENCE_BATCH_WAIT_MS', '10'))
+    INFERENCE_CONCURRENCY = int(os.getenv('INFERENCE_CONCURRENCY', '1'))  # model calls at once
+    INFERENCE_MAX_QUEUE = int(os.getenv('INFERENCE_MAX_QUEUE', '256'))
+    INFERENCE_TIMEOUT = float(os.getenv('INFERENCE_TIMEOUT', '120'))  # seconds
+    
+    # Shared secret between the Django backend and this service (X-Service-Token)
+    SERVICE_TOKEN = os.getenv('EVESHIELD_SERVICE_TOKEN')
+    
+    # Django backend lookup of callers' profiles and emergency contacts
+    # (disabled unless CALLER_DIRECTORY_URL is set, e.g. http://127.0.0.1:8000)
+    CALLER_DIRECTORY_URL = os.getenv('CALLER_DIRECTORY_URL')
+    CALLER_DIRECTORY_TOKEN = SERVICE_TOKEN
+    CALLER_DIRECTORY_TTL = float(os.getenv('CALLER_DIRECTORY_TTL', '60'))  # seconds, as the backend's own cache
+    CALLER_DIRECTORY_TIMEOUT = float(os.getenv('CALLER_DIRECTORY_TIMEOUT', '0.5'))  # seconds
     
     # Language Support
     SUPPORTED_LANGUAGES = ['en', 'sw']  # English and Swahili
@@ -23,6 +63,93 @@ class Config:
     DASHBOARD_PORT = 7860
     DASHBOARD_HOST = '0.0.0.0'
     
+    # Production serving (pre-fork gunicorn, see gunicorn.conf.py)
+    WEB_BIND = os.getenv('WEB_BIND', '0.0.0.0:5000')
+    WEB_WORKERS = int(os.getenv('WEB_WORKERS', str(os.cpu_count() or 1)))
+    WEB_THREADS = int(os.getenv('WEB_THREADS', '1'))
+    WEB_TIMEOUT = int(os.getenv('WEB_TIMEOUT', '120'))
+    PRELOAD_MODELS = os.getenv('PRELOAD_MODELS', 'true').lower() == 'true'
+    # 0 means split the cores evenly between workers
+    TORCH_THREADS_PER_WORKER = int(os.getenv('TORCH_THREADS_PER_WORKER', '0'))
+    FLASK_DEBUG = os.getenv('FLASK_DEBUG', 'true').lower() == 'true'
+    
+    # Prometheus metrics on /metrics
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_GAUGE_INTERVAL = float(os.getenv('METRICS_GAUGE_INTERVAL', '5'))  # seconds
+    
+    # Admin-only profiling (disabled unless ADMIN_TOKEN is set)
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+    PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+    PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', '120'))
+    PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', '0.005'))  # seconds between samples
+    
     # Database (simple file-based for this example)
     DATA_DIR = 'emergency_data'
-    AUDIO_DIR = 'audio_files'
\ No newline at end of file
+    AUDIO_DIR = 'audio_files'
+    # gunicorn workers share metric values through per-process files here
+    METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(DATA_DIR, 'metrics'))
+    
+    # Recording archive: AUDIO_DIR/YYYY/MM/DD/<call_sid>.opus, indexed by call_sid
+    AUDIO_CODEC = os.getenv('AUDIO_CODEC', 'opus')  # 'opus' or 'flac' (lossless)
+    AUDIO_BITRATE = os.getenv('AUDIO_BITRATE', '12k')  # Opus only; ample for speech
+    AUDIO_SAMPLE_RATE = int(os.getenv('AUDIO_SAMPLE_RATE', '16000'))  # what Whisper expects
+    AUDIO_RETENTION_DAYS = int(os.getenv('AUDIO_RETENTION_DAYS', '90'))
+    AUDIO_RETENTION_SWEEP_SECONDS = float(os.getenv('AUDIO_RETENTION_SWEEP_SECONDS', '3600'))  # 0 disables
+    AUDIO_PCM_CACHE_MB = int(os.getenv('AUDIO_PCM_CACHE_MB', '512'))  # decoded PCM for replays
+    AUDIO_MAX_RANGE_SECONDS = float(os.getenv('AUDIO_MAX_RANGE_SECONDS', '300'))
+    FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+
+    # Report exports (CSV, or Parquet with pyarrow installed)
+    EXPORT_DIR = os.getenv('EXPORT_DIR', 'exports')
+    EXPORT_CHUNK_ROWS = int(os.getenv('EXPORT_CHUNK_ROWS', '2000'))
+
+    # Shared report store (SQLite in WAL mode, one file for every process)
+    REPORT_DB_PATH = os.getenv('REPORT_DB_PATH', os.path.join(DATA_DIR, 'reports.sqlite3'))
+    STORE_WATCH_INTERVAL = float(os.getenv('STORE_WATCH_INTERVAL', '0.25'))  # seconds
+    DASHBOARD_REFRESH_TIMEOUT = float(os.getenv('DASHBOARD_REFRESH_TIMEOUT', '30'))  # seconds
+    
+    # Repeat calls from the same number within the window join one incident
+    COALESCE_WINDOW_MINUTES = int(os.getenv('COALESCE_WINDOW_MINUTES', '30'))
+    COALESCE_SIMILARITY = float(os.getenv('COALESCE_SIMILARITY', '0.8'))
+    
+    # Reports from different callers about the same incident (MinHash + LSH).
+    # MINHASH_PERMUTATIONS must be a multiple of LSH_BANDS; more bands catch
+    # less similar pairs as candidates.
+    MINHASH_PERMUTATIONS = int(os.getenv('MINHASH_PERMUTATIONS', '64'))
+    LSH_BANDS = int(os.getenv('LSH_BANDS', '32'))
+    CLUSTER_SIMILARITY = float(os.getenv('CLUSTER_SIMILARITY', '0.4'))
+    CLUSTER_WINDOW_MINUTES = int(os.getenv('CLUSTER_WINDOW_MINUTES', '60'))
+    CLUSTER_MAX_SIGNATURES = int(os.getenv('CLUSTER_MAX_SIGNATURES', '10'))  # kept per incident
+    # At or above this similarity a report reuses its incident's summary
+    CLUSTER_DUPLICATE_SIMILARITY = float(os.getenv('CLUSTER_DUPLICATE_SIMILARITY', '0.8'))
+    
+    # Surge mode: degrade to keyword-only analysis (level 1), then to storing the
+    # raw transcript (level 2) when the ML queue or webhook latency crosses
+    # these thresholds. Levels drop back below SURGE_RECOVERY_RATIO of them,
+    # after at least SURGE_MIN_DWELL_SECONDS, and deferred work is re-queued.
+    SURGE_ENABLED = os.getenv('SURGE_ENABLED', 'true').lower() == 'true'
+    SURGE_QUEUE_KEYWORDS = int(os.getenv('SURGE_QUEUE_KEYWORDS', '30'))
+    SURGE_QUEUE_RAW = int(os.getenv('SURGE_QUEUE_RAW', '150'))
+    SURGE_LATENCY_KEYWORDS = float(os.getenv('SURGE_LATENCY_KEYWORDS', '1.0'))  # seconds
+    SURGE_LATENCY_RAW = float(os.getenv('SURGE_LATENCY_RAW', '3.0'))
+    SURGE_RECOVERY_RATIO = float(os.getenv('SURGE_RECOVERY_RATIO', '0.5'))
+    SURGE_MIN_DWELL_SECONDS = float(os.getenv('SURGE_MIN_DWELL_SECONDS', '15'))
+    SURGE_LATENCY_ALPHA = float(os.getenv('SURGE_LATENCY_ALPHA', '0.2'))  # weight of each call
+    SURGE_LATENCY_WINDOW_SECONDS = float(os.getenv('SURGE_LATENCY_WINDOW_SECONDS', '10'))  # idle before decay
+    SURGE_RESUME_BATCH = int(os.getenv('SURGE_RESUME_BATCH', '20'))
+    SURGE_RESUME_INTERVAL_SECONDS = float(os.getenv('SURGE_RESUME_INTERVAL_SECONDS', '30'))
+    
+    # Summarization scheduling: ML_WORKERS threads shared by all severities,
+    # each class capped at its own concurrency. Keep MEDIUM + LOW below
+    # ML_WORKERS so a slot is always free for HIGH. Every ML_AGING_SECONDS
+    # spent queued lifts a job by one severity rank.
+    ML_WORKERS = int(os.getenv('ML_WORKERS', '3'))
+    ML_CONCURRENCY = {
+        'HIGH': int(os.getenv('ML_CONCURRENCY_HIGH', '3')),
+        'MEDIUM': int(os.getenv('ML_CONCURRENCY_MEDIUM', '1')),
+        'LOW': int(os.getenv('ML_CONCURRENCY_LOW', '1')),
+    }
+    ML_AGING_SECONDS = float(os.getenv('ML_AGING_SECONDS', '30'))
+    # 'inline': the webhook summarizes in its own threads;
+    # 'worker': the webhook only stores reports and ml_worker.py summarizes them
+    ML_MODE = os.getenv('ML_MODE', 'inline')
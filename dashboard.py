@@ -0,0 +1,16 @@
+"""Run the Gradio dashboard as its own process"""
+from config import Config
+from services.dashboard_service import create_dashboard
+
+
+def run_dashboard(dashboard_service=None):
+    dashboard_app = create_dashboard(dashboard_service)
+    dashboard_app.launch(
+        server_name=Config.DASHBOARD_HOST,
+        server_port=Config.DASHBOARD_PORT,
+        share=False
+    )
+
+
+if __name__ == '__main__':
+    run_dashboard()
@@ -0,0 +1,45 @@
+# Production serving for the phone webhook:
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#
+# The master imports the app (and with it every model) once, then forks the
+# workers, so model weights are shared copy-on-write instead of loaded per
+# worker. Run the dashboard separately with `python dashboard.py`.
+#
+# Preloading is only safe on CPU: CUDA contexts do not survive fork, so set
+# PRELOAD_MODELS=false on GPU nodes.
+from config import Config
+from utils import metrics
+from utils.serving import (
+    worker_thread_count, limit_native_threads, configure_torch_threads, freeze_shared_heap
+)
+
+bind = Config.WEB_BIND
+workers = Config.WEB_WORKERS
+threads = Config.WEB_THREADS
+worker_class = 'gthread' if Config.WEB_THREADS > 1 else 'sync'
+timeout = Config.WEB_TIMEOUT
+preload_app = Config.PRELOAD_MODELS
+
+# Set before the app (and torch) is imported by the master
+limit_native_threads(worker_thread_count())
+
+# Every worker writes its metrics to a file; /metrics on any of them adds them up
+if Config.METRICS_ENABLED:
+    metrics.use_directory(Config.METRICS_DIR)
+
+
+def when_ready(server):
+    """Runs in the master after the app is loaded, before workers fork"""
+    if preload_app:
+        freeze_shared_heap()
+    server.log.info(
+        "Serving with %s workers, %s torch threads each", workers, worker_thread_count()
+    )
+
+
+def post_fork(server, worker):
+    configure_torch_threads(worker_thread_count())
+
+
+def child_exit(server, worker):
+    metrics.mark_process_dead(worker.pid)
@@ -0,0 +1,30 @@
+"""Serve the models to every process on this node (INFERENCE_URL clients).
+
+Start it before the webhook, dashboard and ML worker, and point them at it:
+
+    python inference_server.py
+    INFERENCE_URL=http://127.0.0.1:8600 gunicorn -c gunicorn.conf.py wsgi:app
+"""
+from config import Config
+from models.emergency_classifier import EmergencyClassifier
+from services.inference_server import InferenceService, serve
+from services.phone_service import PhoneService
+
+
+def run_inference_server():
+    # This process owns the weights; it must not forward to itself
+    Config.INFERENCE_URL = None
+
+    classifier = EmergencyClassifier()
+    classifier.warm_up()
+    phone_service = PhoneService()
+    phone_service.warm_up()
+
+    server = serve(InferenceService(classifier.summarizer, phone_service.whisper_model))
+    host, port = server.server_address[:2]
+    print(f"Inference server listening on http://{host}:{port}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    run_inference_server()
@@ -0,0 +1,22 @@
+"""Run summarization in its own process (ML_MODE=worker).
+
+The webhook stores reports with summary_status 'pending'; this process loads
+the models once, follows the shared store and summarizes them by severity.
+"""
+from models.emergency_classifier import EmergencyClassifier
+from services.ml_scheduler import MLScheduler
+from services.phone_service import PhoneService
+from services.report_store import ReportStore
+from services.summary_pipeline import SummaryPipeline
+
+
+def run_ml_worker():
+    classifier = EmergencyClassifier()
+    classifier.warm_up()
+    pipeline = SummaryPipeline(classifier, ReportStore(), PhoneService(), MLScheduler())
+    print("ML worker following the report store...")
+    pipeline.follow_store()
+
+
+if __name__ == '__main__':
+    run_ml_worker()
@@ -1,41 +1,92 @@
-import torch
-from transformers import (
-    AutoTokenizer, AutoModelForSequenceClassification, 
-    AutoModelForCausalLM, pipeline
-)
 from typing import Dict, List, Tuple
+import hashlib
+import json
 import re
+import threading
+import time
+from config import Config
+from utils.metrics import timed, MODEL_LOAD_SECONDS
+from utils.language_utils import language_confidence
+from models.stub_models import StubSummarizer
 
 class EmergencyClassifier:
     def __init__(self):
+        # Models load on first use (or warm_up()), so keyword-only callers
+        # such as the webhook never import torch
+        self.tokenizer = None
+        self.classifier = None
+        self._summarizer = None
+        self._load_lock = threading.Lock()
+        
+        # Define emergency categories
+        self.emergency_types = {
+            'medical': ['hospital', 'doctor', 'sick', 'injured', 'ambulance', 'pain', 'bleeding',
+                       'daktari', 'mgonjwa', 'hospitali', 'ambulensi', 'umwagika', 'maumivu'],
+            'fire': ['fire', 'smoke', 'burning', 'flame', 'moto', 'moshi'],
+            'crime': ['robbery', 'theft', 'attack', 'violence', 'police', 
+                     'wizi', 'polisi', 'shambulio', 'jeuri'],
+            'accident': ['accident', 'crash', 'collision', 'vehicle', 'ajali', 'gari'],
+            'natural_disaster': ['flood', 'earthquake', 'storm', 'mafuriko', 'tetemeko']
+        }
+        
+        self.urgent_keywords = [
+            'urgent', 'emergency', 'dying', 'dead', 'serious', 'critical',
+            'haraka', 'dharura', 'mkuu', 'hatari'  # Swahili urgent terms
+        ]
+    
+    @property
+    def summarizer(self):
+        if self._summarizer is None:
+            self.warm_up()
+        return self._summarizer
+    
+    @summarizer.setter
+    def summarizer(self, summarizer):
+        self._summarizer = summarizer
+    
+    def warm_up(self):
+        """Load the models now instead of on the first summary"""
+        with self._load_lock:
+            if self._summarizer is not None:
+                return
+            if Config.INFERENCE_URL:
+                from services.inference_client import RemoteSummarizer
+                self._summarizer = RemoteSummarizer(Config.INFERENCE_URL)
+            elif Config.STUB_MODELS:
+                self._summarizer = StubSummarizer()
+            else:
+                self._load_models()
+    
+    def _load_models(self):
+        """Load the Hugging Face pipelines"""
+        import torch
+        from transformers import AutoTokenizer, pipeline
+        
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         
         # Load multilingual models that support Swahili and English
-        self.tokenizer = AutoTokenizer.from_pretrained('microsoft/DialoGPT-medium')
-        self.summarizer = pipeline(
+        start = time.perf_counter()
+        self.tokenizer = AutoTokenizer.from_pretrained(Config.CLASSIFICATION_MODEL)
+        MODEL_LOAD_SECONDS.set(time.perf_counter() - start, 'tokenizer')
+        
+        start = time.perf_counter()
+        self._summarizer = pipeline(
             'summarization', 
-            model='facebook/bart-large-cnn',
+            model=Config.SUMMARIZATION_MODEL,
             device=0 if torch.cuda.is_available() else -1
         )
+        MODEL_LOAD_SECONDS.set(time.perf_counter() - start, 'summarizer')
         
         # Classification pipeline for emergency types
+        start = time.perf_counter()
         self.classifier = pipeline(
             'text-classification',
-            model='cardiffnlp/twitter-roberta-base-emotion',
+            model=Config.EMOTION_MODEL,
             device=0 if torch.cuda.is_available() else -1
         )
+        MODEL_LOAD_SECONDS.set(time.perf_counter() - start, 'classifier')
         
-        # Define emergency categories
-        self.emergency_types = {
-            'medical': ['hospital', 'doctor', 'sick', 'injured', 'ambulance', 'pain', 'bleeding',
-                       'daktari', 'mgonjwa', 'hospitali', 'ambulensi', 'umwagika', 'maumivu'],
-            'fire': ['fire', 'smoke', 'burning', 'flame', 'moto', 'moshi'],
-            'crime': ['robbery', 'theft', 'attack', 'violence', 'police', 
-                     'wizi', 'polisi', 'shambulio', 'jeuri'],
-            'accident': ['accident', 'crash', 'collision', 'vehicle', 'ajali', 'gari'],
-            'natural_disaster': ['flood', 'earthquake', 'storm', 'mafuriko', 'tetemeko']
-        }
-        
+    @timed('classify_emergency_type')
     def classify_emergency_type(self, text: str) -> str:
         """Classify the type of emergency based on keywords"""
         text_lower = text.lower()
@@ -47,15 +98,16 @@ class EmergencyClassifier:
         
         return 'general'
     
+    @timed('extract_location')
     def extract_location(self, text: str) -> str:
         """Extract location information from text"""
         # Simple location extraction - can be improved with NER models
         location_patterns = [
-            r'at\s+([A-Za-z\s]+)',
-            r'in\s+([A-Za-z\s]+)',
-            r'near\s+([A-Za-z\s]+)',
-            r'kwa\s+([A-Za-z\s]+)',  # Swahili
-            r'karibu na\s+([A-Za-z\s]+)',  # Swahili
+            r'\bat\s+([A-Za-z\s]+)',
+            r'\bin\s+([A-Za-z\s]+)',
+            r'\bnear\s+([A-Za-z\s]+)',
+            r'\bkwa\s+([A-Za-z\s]+)',  # Swahili
+            r'\bkaribu na\s+([A-Za-z\s]+)',  # Swahili
         ]
         
         for pattern in location_patterns:
@@ -65,45 +117,74 @@ class EmergencyClassifier:
         
         return 'Location not specified'
     
-    def generate_summary(self, text: str) -> str:
+    @timed('generate_summary')
+    def generate_summary(self, text: str, language: str = None) -> str:
         """Generate a summary of the emergency report"""
         try:
             if len(text) < 50:
                 return text
             
+            # The summarization model is English-only; Swahili reports are
+            # shortened instead of being run through it
+            if (language or self.detect_language(text)[0]) == 'sw':
+                return ' '.join(text.split()[:60])
+            
             summary = self.summarizer(text, max_length=100, min_length=20, do_sample=False)
             return summary[0]['summary_text']
         except Exception as e:
             return f"Summary generation failed: {str(e)}"
     
+    @timed('analyze_severity')
     def analyze_severity(self, text: str) -> str:
         """Analyze the severity of the emergency"""
-        urgent_keywords = [
-            'urgent', 'emergency', 'dying', 'dead', 'serious', 'critical',
-            'haraka', 'dharura', 'mkuu', 'hatari'  # Swahili urgent terms
-        ]
-        
         text_lower = text.lower()
-        for keyword in urgent_keywords:
+        for keyword in self.urgent_keywords:
             if keyword in text_lower:
                 return 'HIGH'
         
         return 'MEDIUM'
     
-    def process_emergency_report(self, text: str) -> Dict:
-        """Process complete emergency report"""
+    @timed('detect_language')
+    def detect_language(self, text: str) -> Tuple[str, Dict[str, float]]:
+        """Language of the report and per-language confidence"""
+        confidence = language_confidence(text)
+        return max(confidence, key=confidence.get), confidence
+    
+    def quick_analysis(self, text: str) -> Dict:
+        """Keyword-only analysis that needs no model inference"""
+        emergency_type = self.classify_emergency_type(text)
+        severity = self.analyze_severity(text)
+        language, confidence = self.detect_language(text)
         return {
             'original_text': text,
-            'summary': self.generate_summary(text),
-            'emergency_type': self.classify_emergency_type(text),
+            'language': language,
+            'language_confidence': confidence,
+            'emergency_type': emergency_type,
             'location': self.extract_location(text),
-            'severity': self.analyze_severity(text),
-            'recommended_actions': self.get_recommended_actions(
-                self.classify_emergency_type(text),
-                self.analyze_severity(text)
-            )
+            'severity': severity,
+            'recommended_actions': self.get_recommended_actions(emergency_type, severity)
         }
     
+    def model_version(self) -> str:
+        """Short hash of everything that shapes an analysis.
+
+        Changes whenever the keyword lists or the models change, so stored
+        reports can be told apart from ones a backfill has to redo.
+        """
+        fingerprint = json.dumps({
+            'emergency_types': self.emergency_types,
+            'urgent_keywords': self.urgent_keywords,
+            'models': [Config.CLASSIFICATION_MODEL, Config.SUMMARIZATION_MODEL, Config.EMOTION_MODEL],
+            'stub': Config.STUB_MODELS,
+        }, sort_keys=True)
+        return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()[:12]
+    
+    def process_emergency_report(self, text: str) -> Dict:
+        """Process complete emergency report"""
+        analysis = self.quick_analysis(text)
+        analysis['summary'] = self.generate_summary(text, analysis['language'])
+        return analysis
+    
     def get_recommended_actions(self, emergency_type: str, severity: str) -> List[str]:
         """Get recommended actions based on emergency type and severity"""
         base_actions = {
@@ -0,0 +1,24 @@
+import time
+from config import Config
+
+
+class StubSummarizer:
+    """Stand-in for the summarization pipeline when STUB_MODELS is set.
+
+    Returns the leading words of the text after sleeping STUB_MODEL_LATENCY
+    seconds, so load tests can exercise the serving path without weights.
+    """
+
+    def __call__(self, text, max_length: int = 100, min_length: int = 20, do_sample: bool = False):
+        time.sleep(Config.STUB_MODEL_LATENCY)
+        # Like the pipeline, a list of texts is summarized as one batch
+        texts = [text] if isinstance(text, str) else text
+        return [{'summary_text': ' '.join(t.split()[:max_length])} for t in texts]
+
+
+class StubWhisper:
+    """Stand-in for the Whisper model when STUB_MODELS is set"""
+
+    def transcribe(self, audio, **kwargs):
+        time.sleep(Config.STUB_MODEL_LATENCY)
+        return {'text': '', 'language': 'en'}
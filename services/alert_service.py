@@ -0,0 +1,183 @@
+"""SMS alerts to a caller's emergency contacts.
+
+When a registered user calls the hotline, every emergency contact on their
+profile (loaded with the profile in one backend query, see
+``services/caller_directory.py``) is texted at once through Twilio's
+Messages API. Requests run concurrently on one asyncio loop thread per
+process over a pooled keep-alive aiohttp session, at most
+``ALERT_CONCURRENCY`` in flight, so ten contacts take about as long as one.
+Rate limiting (429) and server errors are retried with exponential backoff
+and jitter, honouring ``Retry-After`` up to ``ALERT_MAX_RETRY_AFTER``. Each
+alert is stored as soon as its send returns.
+
+Delivery receipts arrive on ``/sms-status`` one request per message; they
+are buffered and written to the report store in one transaction every
+``ALERT_STATUS_FLUSH_SECONDS``.
+"""
+import asyncio
+import base64
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+from config import Config
+from services.report_store import ReportStore
+from utils.metrics import Counter
+
+ALERTS_SENT = Counter('eveshield_alerts_total', 'SMS alerts to emergency contacts by outcome', ['result'])
+
+
+def compose_message(caller: Dict, report: Dict, report_id: str) -> str:
+    name = caller.get('username') or caller.get('phone_number') or 'A contact'
+    parts = [f"EveShield alert: {name} ({caller.get('phone_number', 'unknown number')}) "
+             f"called the emergency hotline at {report.get('timestamp', '')[11:16] or 'just now'}."]
+    if report.get('emergency_type'):
+        parts.append(f"Type: {report['emergency_type']}.")
+    if report.get('location'):
+        parts.append(f"Location: {report['location']}.")
+    parts.append(f"Ref {report_id[:8]}.")
+    return ' '.join(parts)
+
+
+class AlertService:
+    def __init__(self, store: ReportStore, account_sid: str = None, auth_token: str = None,
+                 from_number: str = None, base_url: str = None, status_callback: str = None,
+                 concurrency: int = None, max_retries: int = None, backoff: float = None,
+                 timeout: float = None, max_retry_after: float = None):
+        self.store = store
+        self.account_sid = account_sid or Config.TWILIO_ACCOUNT_SID
+        self.auth_token = auth_token or Config.TWILIO_AUTH_TOKEN
+        self.from_number = from_number or Config.TWILIO_PHONE_NUMBER
+        base_url = (base_url or Config.TWILIO_API_BASE_URL).rstrip('/')
+        self.messages_url = f'{base_url}/2010-04-01/Accounts/{self.account_sid}/Messages.json'
+        self.status_callback = status_callback or Config.ALERT_STATUS_CALLBACK_URL
+        self.concurrency = concurrency or Config.ALERT_CONCURRENCY
+        self.max_retries = max_retries if max_retries is not None else Config.ALERT_MAX_RETRIES
+        self.backoff = backoff if backoff is not None else Config.ALERT_BACKOFF_SECONDS
+        self.max_retry_after = max_retry_after if max_retry_after is not None else Config.ALERT_MAX_RETRY_AFTER
+        self.timeout = timeout or Config.ALERT_TIMEOUT
+
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self._loop = None
+        self._session = None
+        self._semaphore = None
+        self._statuses: List[tuple] = []
+        self._status_lock = threading.Lock()
+
+    def _ensure_started(self):
+        """Start this process's event loop and status flusher (again after a fork)"""
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._loop = asyncio.new_event_loop()
+            self._session = None
+            threading.Thread(target=self._loop.run_forever, name='alert-loop', daemon=True).start()
+            threading.Thread(target=self._flush_loop, name='alert-status-flush', daemon=True).start()
+
+    async def _get_session(self):
+        if self._session is None:
+            import aiohttp
+            credentials = base64.b64encode(f'{self.account_sid}:{self.auth_token}'.encode()).decode()
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60),
+                headers={'Authorization': f'Basic {credentials}'},
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._session
+
+    def notify(self, report_id: str, caller: Dict, message: str) -> Optional[Future]:
+        """Text every contact of the caller without blocking; the future resolves to the results"""
+        contacts = [contact for contact in caller.get('contacts') or [] if contact.get('phone_number')]
+        if not contacts:
+            return None
+        self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(self._fan_out(report_id, contacts, message), self._loop)
+
+    async def _fan_out(self, report_id: str, contacts: List[Dict], message: str) -> List[Dict]:
+        session = await self._get_session()
+        start = time.perf_counter()
+
+        async def send(contact):
+            result = await self._send(session, contact, message)
+            # Stored right away, before Twilio's delivery receipts for it can arrive
+            await asyncio.get_running_loop().run_in_executor(None, self.store.add_alerts, report_id, [result])
+            return result
+
+        results = await asyncio.gather(*(send(contact) for contact in contacts))
+        sent = sum(1 for result in results if result['sid'])
+        print(f"Alerted {sent}/{len(results)} contacts for report {report_id[:8]} "
+              f"in {time.perf_counter() - start:.2f}s")
+        return results
+
+    async def _send(self, session, contact: Dict, body: str) -> Dict:
+        import aiohttp
+        data = {'To': contact['phone_number'], 'From': self.from_number or '', 'Body': body}
+        if self.status_callback:
+            data['StatusCallback'] = self.status_callback
+        result = {'to': contact['phone_number'], 'name': contact.get('name'), 'sid': None,
+                  'status': 'failed_to_send', 'error_code': None, 'attempts': 0}
+
+        for attempt in range(self.max_retries + 1):
+            result['attempts'] = attempt + 1
+            retry_after = None
+            try:
+                async with self._semaphore:
+                    async with session.post(self.messages_url, data=data) as response:
+                        try:
+                            payload = await response.json(content_type=None)
+                        except ValueError:
+                            payload = {}
+                        if response.status in (200, 201):
+                            result['sid'] = payload.get('sid')
+                            result['status'] = payload.get('status', 'queued')
+                            ALERTS_SENT.inc('sent')
+                            return result
+                        result['error_code'] = str(payload.get('code') or response.status)
+                        if response.status != 429 and response.status < 500:
+                            break  # invalid number, unverified recipient: retrying will not help
+                        retry_after = response.headers.get('Retry-After')
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                result['error_code'] = type(e).__name__
+
+            if attempt < self.max_retries:
+                if retry_after and retry_after.isdigit():
+                    delay = min(float(retry_after), self.max_retry_after)
+                else:
+                    delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.0)
+                await asyncio.sleep(delay)
+
+        ALERTS_SENT.inc('failed')
+        print(f"SMS alert to {result['to']} failed after {result['attempts']} attempts: {result['error_code']}")
+        return result
+
+    def record_status(self, message_sid: str, status: str, error_code: str = None):
+        """Buffer a delivery receipt from the /sms-status callback"""
+        self._ensure_started()
+        with self._status_lock:
+            self._statuses.append((message_sid, status, error_code or None))
+
+    def flush_statuses(self) -> int:
+        with self._status_lock:
+            statuses, self._statuses = self._statuses, []
+        if not statuses:
+            return 0
+        try:
+            return self.store.update_alert_statuses(statuses)
+        except Exception:
+            # Keep the receipts for the next flush, ahead of any that arrived meanwhile
+            with self._status_lock:
+                self._statuses = statuses + self._statuses
+            raise
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(Config.ALERT_STATUS_FLUSH_SECONDS)
+            try:
+                self.flush_statuses()
+            except Exception as e:
+                print(f"Failed to store SMS delivery statuses: {e}")
@@ -0,0 +1,310 @@
+"""Compressed, date-partitioned archive of call recordings.
+
+Recordings are re-encoded with ffmpeg to mono 16 kHz Opus (or FLAC when
+lossless copies are required) under ``AUDIO_DIR/YYYY/MM/DD/<call_sid>``,
+which is about a tenth of the size of the WAV files Twilio delivers. A
+SQLite index maps each ``call_sid`` to its file and expiry time, so lookups
+and retention sweeps never walk the directory tree.
+
+Expired recordings are removed by a sweeper thread in every process that
+opens the archive (every ``AUDIO_RETENTION_SWEEP_SECONDS``). Nodes that may
+sit idle should also run the sweep from cron:
+
+    python -m services.audio_archive --enforce-retention
+
+Replays never load a whole recording: ``read_pcm`` asks ffmpeg to decode
+only the requested range, and ``pcm_memmap`` decodes a recording once into
+a raw PCM cache file that is then memory-mapped, so repeated random access
+(re-transcription, waveform views) only pages in what is touched.
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import subprocess
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import numpy as np
+from config import Config
+from utils.metrics import timed
+
+CODECS = {
+    'opus': ('.opus', ['-c:a', 'libopus', '-b:a', Config.AUDIO_BITRATE, '-application', 'voip']),
+    'flac': ('.flac', ['-c:a', 'flac', '-compression_level', '8']),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    call_sid TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    codec TEXT NOT NULL,
+    sample_rate INTEGER NOT NULL,
+    duration REAL,
+    bytes INTEGER NOT NULL,
+    source_bytes INTEGER,
+    created_at TEXT NOT NULL,
+    expires_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_recordings_expires ON recordings (expires_at);
+"""
+
+_DURATION = re.compile(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)')
+# call_sid names files, so only Twilio's own format is accepted
+CALL_SID = re.compile(r'^CA[0-9a-f]{32}$')
+
+
+class AudioArchiveError(Exception):
+    pass
+
+
+class AudioArchive:
+    def __init__(self, root: str = None, index_path: str = None, codec: str = None,
+                 retention_days: int = None, sweep_interval: float = None):
+        self.root = root or Config.AUDIO_DIR
+        self.index_path = index_path or os.path.join(self.root, 'index.sqlite3')
+        self.codec = codec or Config.AUDIO_CODEC
+        if self.codec not in CODECS:
+            raise ValueError(f"Unsupported audio codec {self.codec!r}; use one of {sorted(CODECS)}")
+        self.retention = timedelta(days=retention_days if retention_days is not None else Config.AUDIO_RETENTION_DAYS)
+        self.sample_rate = Config.AUDIO_SAMPLE_RATE
+        self.cache_dir = os.path.join(self.root, 'pcm_cache')
+        self.sweep_interval = sweep_interval if sweep_interval is not None else Config.AUDIO_RETENTION_SWEEP_SECONDS
+        self._local = threading.local()
+        self._sweeper_lock = threading.Lock()
+        self._sweeper_pid = None
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            self._ensure_sweeper()
+        return conn
+
+    def _ensure_sweeper(self):
+        """Start this process's retention sweeper (again after a fork)"""
+        if not self.sweep_interval:
+            return
+        with self._sweeper_lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+
+        def sweep():
+            while True:
+                time.sleep(self.sweep_interval)
+                try:
+                    removed = self.enforce_retention()
+                    if removed:
+                        print(f"Removed {removed} expired recordings")
+                except Exception as e:
+                    print(f"Recording retention sweep failed: {e}")
+
+        threading.Thread(target=sweep, name='audio-retention', daemon=True).start()
+
+    @staticmethod
+    def _ffmpeg(args: List[str], **kwargs) -> subprocess.CompletedProcess:
+        try:
+            return subprocess.run(
+                [Config.FFMPEG_BINARY, '-hide_banner', '-nostdin', '-y'] + args,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True, **kwargs
+            )
+        except FileNotFoundError:
+            raise AudioArchiveError(f"{Config.FFMPEG_BINARY} not found; install ffmpeg")
+        except subprocess.CalledProcessError as e:
+            raise AudioArchiveError(e.stderr.decode('utf-8', 'replace').strip().splitlines()[-1])
+
+    @timed('archive_recording')
+    def store(self, call_sid: str, source_path: str, delete_source: bool = True) -> Dict:
+        """Encode a recording into the archive and index it by call_sid"""
+        if not CALL_SID.match(call_sid):
+            raise ValueError(f"Invalid CallSid {call_sid!r}")
+        if self.get(call_sid) is not None:
+            raise AudioArchiveError(f"A recording of {call_sid} is already archived")
+        created = datetime.now()
+        extension, codec_args = CODECS[self.codec]
+        directory = os.path.join(self.root, created.strftime('%Y'), created.strftime('%m'), created.strftime('%d'))
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{call_sid}{extension}')
+        relative_path = os.path.relpath(path, self.root)
+
+        tmp = f'{path}.{os.getpid()}.tmp'
+        try:
+            result = self._ffmpeg(
+                ['-i', source_path, '-vn', '-ac', '1', '-ar', str(self.sample_rate)]
+                + codec_args + ['-f', 'ogg' if self.codec == 'opus' else 'flac', tmp]
+            )
+            os.replace(tmp, path)
+        except AudioArchiveError as e:
+            if delete_source and os.path.exists(source_path):
+                os.remove(source_path)
+            raise AudioArchiveError(
+                f"Encoding {source_path} ({'removed' if delete_source else 'kept'}) failed: {e}"
+            ) from e
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        match = _DURATION.search(result.stderr.decode('utf-8', 'replace'))
+        duration = None
+        if match:
+            hours, minutes, seconds = match.groups()
+            duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+        record = {
+            'call_sid': call_sid,
+            'path': relative_path,
+            'codec': self.codec,
+            'sample_rate': self.sample_rate,
+            'duration': duration,
+            'bytes': os.path.getsize(path),
+            'source_bytes': os.path.getsize(source_path),
+            'created_at': created.isoformat(),
+            'expires_at': (created + self.retention).isoformat(),
+        }
+        self._connection().execute(
+            'INSERT INTO recordings (call_sid, path, codec, sample_rate, duration, bytes, '
+            'source_bytes, created_at, expires_at) VALUES (:call_sid, :path, :codec, :sample_rate, '
+            ':duration, :bytes, :source_bytes, :created_at, :expires_at)',
+            record
+        )
+        if delete_source:
+            os.remove(source_path)
+        record['path'] = self._resolve(relative_path)
+        return record
+
+    def _resolve(self, relative_path: str) -> str:
+        """Paths are indexed relative to the archive root so it can be moved"""
+        return os.path.abspath(os.path.join(self.root, relative_path))
+
+    def get(self, call_sid: str) -> Optional[Dict]:
+        row = self._connection().execute(
+            'SELECT * FROM recordings WHERE call_sid = ?', (call_sid,)
+        ).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        record['path'] = self._resolve(record['path'])
+        return record
+
+    def path(self, call_sid: str) -> Optional[str]:
+        record = self.get(call_sid)
+        return record['path'] if record else None
+
+    def _require(self, call_sid: str) -> Dict:
+        record = self.get(call_sid)
+        if record is None or not os.path.exists(record['path']):
+            raise KeyError(call_sid)
+        return record
+
+    @timed('read_pcm')
+    def read_pcm(self, call_sid: str, start: float = 0.0, duration: Optional[float] = None) -> np.ndarray:
+        """Decode only [start, start + duration) seconds as int16 mono PCM"""
+        record = self._require(call_sid)
+        args = ['-ss', f'{max(0.0, start):.3f}']
+        if duration is not None:
+            args += ['-t', f'{duration:.3f}']
+        result = self._ffmpeg(
+            args + ['-i', record['path'], '-f', 's16le', '-ac', '1', '-ar', str(self.sample_rate), '-']
+        )
+        return np.frombuffer(result.stdout, dtype=np.int16)
+
+    def pcm_memmap(self, call_sid: str) -> np.memmap:
+        """Memory-mapped int16 PCM of the whole recording, decoded once into the cache"""
+        record = self._require(call_sid)
+        cache_path = os.path.join(self.cache_dir, f'{call_sid}.s16le')
+        if not os.path.exists(cache_path):
+            tmp = f'{cache_path}.{os.getpid()}.tmp'
+            self._ffmpeg(['-i', record['path'], '-f', 's16le', '-ac', '1', '-ar', str(record['sample_rate']), tmp])
+            os.replace(tmp, cache_path)
+            self._trim_cache(keep=cache_path)
+        else:
+            os.utime(cache_path)  # most recently used
+        if os.path.getsize(cache_path) == 0:
+            return np.zeros(0, dtype=np.int16)
+        return np.memmap(cache_path, dtype=np.int16, mode='r')
+
+    def _trim_cache(self, keep: str = None):
+        """Evict least recently used PCM files beyond AUDIO_PCM_CACHE_MB"""
+        limit = Config.AUDIO_PCM_CACHE_MB * 1024 * 1024
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith('.s16le') and entry.path != keep:
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= limit:
+                break
+            try:
+                os.remove(path)  # open memmaps keep their pages until closed
+            except OSError:
+                continue
+            total -= size
+
+    def enforce_retention(self, now: datetime = None, batch_size: int = 500) -> int:
+        """Delete recordings past their expiry; returns how many were removed"""
+        now = (now or datetime.now()).isoformat()
+        conn = self._connection()
+        removed = 0
+        while True:
+            rows = conn.execute(
+                'SELECT call_sid, path FROM recordings WHERE expires_at < ? LIMIT ?', (now, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            for row in rows:
+                recording = self._resolve(row['path'])
+                for path in (recording, os.path.join(self.cache_dir, f"{row['call_sid']}.s16le")):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                self._remove_empty_dirs(os.path.dirname(recording))
+            conn.executemany('DELETE FROM recordings WHERE call_sid = ?', [(row['call_sid'],) for row in rows])
+            removed += len(rows)
+        return removed
+
+    def _remove_empty_dirs(self, directory: str):
+        root = os.path.abspath(self.root)
+        directory = os.path.abspath(directory)
+        while directory.startswith(root) and directory != root:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                return
+            directory = os.path.dirname(directory)
+
+    def usage(self) -> Dict:
+        row = self._connection().execute(
+            'SELECT COUNT(*) AS recordings, COALESCE(SUM(bytes), 0) AS bytes, '
+            'COALESCE(SUM(source_bytes), 0) AS source_bytes FROM recordings'
+        ).fetchone()
+        return dict(row)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Maintain the recording archive')
+    parser.add_argument('--enforce-retention', action='store_true', help='Delete expired recordings')
+    args = parser.parse_args(argv)
+
+    archive = AudioArchive(sweep_interval=0)
+    result = {}
+    if args.enforce_retention:
+        result['removed'] = archive.enforce_retention()
+    result.update(archive.usage())
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
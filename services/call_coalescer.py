@@ -0,0 +1,91 @@
+import re
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from config import Config
+from services.report_store import ReportStore
+from utils.metrics import timed
+
+SEVERITY_RANK = {'LOW': 0, 'MEDIUM': 1, 'HIGH': 2}
+
+
+class CallCoalescer:
+    """Fold repeat calls from the same number into one incident.
+
+    The lookup is a time-windowed query on the store's (caller_number,
+    timestamp) index, so it works the same across worker processes.
+    """
+
+    def __init__(self, store: ReportStore, window_minutes: int = None, similarity: float = None):
+        self.store = store
+        self.window = timedelta(
+            minutes=window_minutes if window_minutes is not None else Config.COALESCE_WINDOW_MINUTES
+        )
+        self.similarity_threshold = (
+            similarity if similarity is not None else Config.COALESCE_SIMILARITY
+        )
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Lowercase, drop punctuation and collapse whitespace"""
+        return ' '.join(re.sub(r'[^\w\s]', ' ', text.lower()).split())
+
+    @classmethod
+    def similarity(cls, a: str, b: str) -> float:
+        """Token overlap of b against a, so a shorter retelling still matches"""
+        tokens_a = set(cls.normalize(a).split())
+        tokens_b = set(cls.normalize(b).split())
+        if not tokens_a or not tokens_b:
+            return 0.0
+        return len(tokens_a & tokens_b) / min(len(tokens_a), len(tokens_b))
+
+    @timed('find_incident')
+    def find_incident(self, caller_number: str) -> Optional[Dict]:
+        """Most recent report from this caller inside the coalescing window"""
+        if not caller_number or caller_number == 'Unknown':
+            return None
+
+        since = (datetime.now() - self.window).isoformat()
+        matches = self.store.query(caller_number=caller_number, start=since, limit=1)
+        return matches[0] if matches else None
+
+    def is_repeat(self, incident: Dict, text: str) -> bool:
+        """Whether the new transcript says nothing the incident does not already"""
+        transcripts = incident.get('transcripts') or [incident.get('original_text', '')]
+        return any(
+            self.similarity(previous, text) >= self.similarity_threshold
+            for previous in transcripts
+        )
+
+    @timed('coalesce')
+    def coalesce(self, incident: Dict, text: str, call_sid: str, classifier,
+                 defer_summary: bool = False) -> Dict:
+        """Append a repeat call to an incident, re-analysing only new content.
+
+        When the call adds something new the returned report has
+        ``summary_status`` set to ``'pending'`` (``'deferred'`` under surge)
+        and still needs summarizing.
+        """
+        transcripts = incident.get('transcripts') or [incident.get('original_text', '')]
+        call_sids = incident.get('call_sids') or [incident.get('call_sid')]
+
+        fields = {
+            'transcripts': transcripts + [text],
+            'call_sids': call_sids + [call_sid],
+            'call_count': incident.get('call_count', 1) + 1,
+            'last_call_at': datetime.now().isoformat(),
+        }
+
+        if not self.is_repeat(incident, text):
+            # Summarizing the combined text is left to the ML scheduler
+            combined = ' '.join(fields['transcripts'])
+            analysis = classifier.quick_analysis(combined)
+            analysis['summary_status'] = 'deferred' if defer_summary else 'pending'
+            # A callback never downgrades an incident
+            if SEVERITY_RANK.get(incident.get('severity'), 1) > SEVERITY_RANK.get(analysis['severity'], 1):
+                analysis['severity'] = incident['severity']
+                analysis['recommended_actions'] = classifier.get_recommended_actions(
+                    analysis['emergency_type'], analysis['severity']
+                )
+            fields.update(analysis)
+
+        return self.store.update_report(incident['report_id'], fields)
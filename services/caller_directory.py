@@ -0,0 +1,88 @@
+import http.client
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from urllib.parse import urlencode, urlparse
+from config import Config
+from utils.metrics import CACHE_REQUESTS
+
+
+class CallerDirectory:
+    """Matches caller numbers to registered users via the Django backend.
+
+    Answers (including "not registered") are cached per process for
+    ``CALLER_DIRECTORY_TTL`` seconds, so repeat calls cost a dict lookup. A
+    miss costs one keep-alive HTTP request; if the backend is slow or down
+    the call goes on without a profile rather than waiting on it.
+    """
+
+    def __init__(self, url: str, token: str = None, ttl: float = None, timeout: float = None,
+                 max_entries: int = 10000):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        self.https = parsed.scheme == 'https'
+        self.path = parsed.path.rstrip('/') + '/api/users/callers/lookup/'
+        self.token = token or Config.CALLER_DIRECTORY_TOKEN
+        self.ttl = ttl or Config.CALLER_DIRECTORY_TTL
+        self.timeout = timeout or Config.CALLER_DIRECTORY_TIMEOUT
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            connection_class = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = connection_class(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _fetch(self, number: str) -> Optional[Dict]:
+        conn = self._connection()
+        try:
+            conn.request('GET', f"{self.path}?{urlencode({'phone': number})}",
+                         headers={'X-Service-Token': self.token or ''})
+            response = conn.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self._local.conn = None
+            raise
+        if response.status == 404:
+            return None
+        if response.status != 200:
+            raise RuntimeError(f"Caller lookup returned {response.status}")
+        return json.loads(body)
+
+    def lookup(self, number: str) -> Optional[Dict]:
+        """The caller's profile and emergency contacts, or None"""
+        if not number or number == 'Unknown':
+            return None
+        with self._lock:
+            entry = self._entries.get(number)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(number)
+                CACHE_REQUESTS.inc('caller_directory', 'hit')
+                return entry[0]
+        CACHE_REQUESTS.inc('caller_directory', 'miss')
+
+        ttl = self.ttl
+        try:
+            profile = self._fetch(number)
+        except Exception as e:
+            print(f"Caller lookup failed for {number}: {e}")
+            # Retry soon, but do not make every call wait on a backend that is down
+            profile, ttl = None, min(self.ttl, 10.0)
+
+        with self._lock:
+            self._entries[number] = (profile, time.monotonic() + ttl)
+            self._entries.move_to_end(number)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return profile
@@ -1,51 +1,42 @@
-import gradio as gr
-import pandas as pd
-import json
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import List, Dict
 from config import Config
 from models.emergency_classifier import EmergencyClassifier
-import matplotlib.pyplot as plt
-import seaborn as sns
+from services.report_store import ReportStore
+from utils.metrics import timed
+from utils import profiler
+
+# gradio, pandas and matplotlib are imported inside the functions that use
+# them so that importing this module (e.g. from the webhook) stays cheap
 
 class DashboardService:
-    def __init__(self):
-        self.classifier = EmergencyClassifier()
-        self.emergency_data = []
+    def __init__(self, classifier: EmergencyClassifier = None, store: ReportStore = None):
+        self.classifier = classifier or EmergencyClassifier()
+        self.store = store or ReportStore()
         self.load_existing_data()
     
     def load_existing_data(self):
-        """Load existing emergency data from files"""
-        if not os.path.exists(Config.DATA_DIR):
-            return
-        
-        for filename in os.listdir(Config.DATA_DIR):
-            if filename.endswith('.json'):
-                try:
-                    with open(f"{Config.DATA_DIR}/{filename}", 'r') as f:
-                        data = json.load(f)
-                        self.emergency_data.append(data)
-                except Exception as e:
-                    print(f"Error loading {filename}: {e}")
+        """Import emergency data saved as JSON files into the shared store"""
+        imported = self.store.import_json_dir(Config.DATA_DIR)
+        if imported:
+            print(f"Imported {imported} emergency reports from {Config.DATA_DIR}")
     
-    def add_emergency_report(self, report_data: Dict):
-        """Add new emergency report to dashboard data"""
+    @timed('add_emergency_report')
+    def add_emergency_report(self, report_data: Dict, report_id: str = None) -> str:
+        """Add new emergency report to the shared store and return its id"""
         report_data['timestamp'] = datetime.now().isoformat()
-        self.emergency_data.append(report_data)
+        return self.store.add_report(report_data, report_id=report_id)
     
     def get_dashboard_summary(self) -> str:
         """Get summary statistics for dashboard"""
-        if not self.emergency_data:
+        stats = self.store.stats()
+        if not stats['total']:
             return "No emergency reports available."
         
-        total_reports = len(self.emergency_data)
-        high_severity = len([r for r in self.emergency_data if r.get('severity') == 'HIGH'])
-        
-        emergency_types = {}
-        for report in self.emergency_data:
-            etype = report.get('emergency_type', 'unknown')
-            emergency_types[etype] = emergency_types.get(etype, 0) + 1
+        total_reports = stats['total']
+        high_severity = stats['by_severity'].get('HIGH', 0)
+        emergency_types = stats['by_type']
         
         summary = f"""
         ## Emergency Response Dashboard Summary
@@ -60,19 +51,20 @@ class DashboardService:
         
         return summary
     
-    def get_recent_emergencies(self, limit: int = 10) -> pd.DataFrame:
+    def get_recent_emergencies(self, limit: int = 10) -> 'pd.DataFrame':
         """Get recent emergency reports as DataFrame"""
-        if not self.emergency_data:
-            return pd.DataFrame()
+        import pandas as pd
         
-        recent = sorted(
-            self.emergency_data, 
-            key=lambda x: x.get('timestamp', ''), 
-            reverse=True
-        )[:limit]
+        recent = self.store.recent(limit)
+        if not recent:
+            return pd.DataFrame()
         
         df_data = []
         for report in recent:
+            if report.get('summary_status') == 'pending' and 'summary' not in report:
+                report['summary'] = 'Summary pending'
+            elif report.get('summary_status') == 'deferred' and 'summary' not in report:
+                report['summary'] = 'Summary deferred (surge)'
             df_data.append({
                 'Time': report.get('timestamp', 'Unknown'),
                 'Type': report.get('emergency_type', 'Unknown'),
@@ -83,6 +75,44 @@ class DashboardService:
         
         return pd.DataFrame(df_data)
     
+    def get_incidents(self, limit: int = 10) -> 'pd.DataFrame':
+        """Get active incidents (reports clustered across callers) as DataFrame"""
+        import pandas as pd
+        
+        # Only incidents still open for clustering; older ones are history
+        since = (datetime.now() - timedelta(minutes=Config.CLUSTER_WINDOW_MINUTES)).isoformat()
+        rows = []
+        for incident in self.store.incidents(since=since, limit=limit):
+            report = incident['representative'] or {}
+            rows.append({
+                'Last Report': incident['last_seen'],
+                'Type': report.get('emergency_type', 'Unknown'),
+                'Severity': report.get('severity', 'Unknown'),
+                'Location': report.get('location', 'Unknown'),
+                'Callers': incident['caller_count'],
+                'Reports': incident['report_count']
+            })
+        
+        return pd.DataFrame(rows)
+    
+    def export_reports(self, fmt: str = 'csv', start: str = None, end: str = None,
+                       emergency_type: str = None, severity: str = None) -> str:
+        """Write a filtered export under EXPORT_DIR and return its path"""
+        from services import report_export
+        
+        filters = {
+            'start': start or None,
+            'end': end or None,
+            'emergency_type': None if emergency_type in (None, '', 'all') else emergency_type,
+            'severity': None if severity in (None, '', 'all') else severity,
+        }
+        os.makedirs(Config.EXPORT_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        filename = report_export.export_filename(fmt, filters).replace('emergency_reports', f'emergency_reports_{stamp}', 1)
+        path = os.path.join(Config.EXPORT_DIR, filename)
+        report_export.write_export(self.store, path, fmt, filters)
+        return path
+    
     def process_new_report(self, audio_text: str) -> Dict:
         """Process new emergency report from audio text"""
         if not audio_text.strip():
@@ -98,20 +128,19 @@ class DashboardService:
     
     def create_visualizations(self):
         """Create visualizations for emergency data"""
-        if not self.emergency_data:
+        import matplotlib.pyplot as plt
+        
+        stats = self.store.stats()
+        if not stats['total']:
             return None, None
         
         # Emergency types pie chart
-        emergency_types = {}
+        emergency_types = stats['by_type']
         severity_counts = {'HIGH': 0, 'MEDIUM': 0, 'LOW': 0}
         
-        for report in self.emergency_data:
-            etype = report.get('emergency_type', 'unknown')
-            emergency_types[etype] = emergency_types.get(etype, 0) + 1
-            
-            severity = report.get('severity', 'MEDIUM')
+        for severity, count in stats['by_severity'].items():
             if severity in severity_counts:
-                severity_counts[severity] += 1
+                severity_counts[severity] += count
         
         # Create plots
         fig1, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
@@ -131,9 +160,11 @@ class DashboardService:
         plt.tight_layout()
         return fig1
 
-def create_dashboard():
+def create_dashboard(dashboard: DashboardService = None):
     """Create and launch the Gradio dashboard"""
-    dashboard = DashboardService()
+    import gradio as gr
+    
+    dashboard = dashboard or DashboardService()
     
     with gr.Blocks(title="Emergency Response Dashboard", theme=gr.themes.Soft()) as app:
         gr.Markdown("# 🚨 Emergency Response Dashboard")
@@ -150,6 +181,13 @@ def create_dashboard():
                     value=dashboard.get_recent_emergencies(),
                     headers=['Time', 'Type', 'Severity', 'Location', 'Summary']
                 )
+                
+                # Reports from many callers about the same incident
+                gr.Markdown("## Active Incidents")
+                incidents_table = gr.Dataframe(
+                    value=dashboard.get_incidents(),
+                    headers=['Last Report', 'Type', 'Severity', 'Location', 'Callers', 'Reports']
+                )
             
             with gr.Column(scale=1):
                 # Control panel
@@ -169,14 +207,82 @@ def create_dashboard():
         with gr.Row():
             plot_display = gr.Plot(label="Emergency Statistics")
         
+        # Filtered export, streamed to a file in bounded chunks
+        with gr.Accordion("Export reports", open=False):
+            with gr.Row():
+                export_start = gr.Textbox(label="From (ISO date)", placeholder="2024-01-01")
+                export_end = gr.Textbox(label="To (ISO date, exclusive)", placeholder="2024-04-01")
+                export_type = gr.Dropdown(
+                    ['all'] + list(dashboard.classifier.emergency_types) + ['general'],
+                    value='all', label="Type"
+                )
+                export_severity = gr.Dropdown(['all', 'HIGH', 'MEDIUM', 'LOW'], value='all', label="Severity")
+                export_format = gr.Radio(['csv', 'parquet'], value='csv', label="Format")
+            export_btn = gr.Button("Export")
+            export_file = gr.File(label="Export")
+        
+        def export_reports(start, end, emergency_type, severity, fmt):
+            try:
+                return dashboard.export_reports(fmt, start, end, emergency_type, severity)
+            except RuntimeError as e:
+                raise gr.Error(str(e))
+        
+        export_btn.click(
+            fn=export_reports,
+            inputs=[export_start, export_end, export_type, export_severity, export_format],
+            outputs=[export_file],
+            concurrency_limit=1
+        )
+        
+        # Admin-only profiling of the dashboard process
+        if Config.ADMIN_TOKEN:
+            with gr.Accordion("Admin: capture profile", open=False):
+                admin_token = gr.Textbox(label="Admin token", type="password")
+                profile_seconds = gr.Slider(1, Config.PROFILE_MAX_SECONDS, value=10, step=1, label="Seconds")
+                profile_format = gr.Dropdown(['collapsed', 'speedscope'], value='collapsed', label="Format")
+                profile_btn = gr.Button("Capture profile")
+                profile_file = gr.File(label="Profile")
+            
+            def capture_profile(token, seconds, fmt):
+                if not profiler.is_admin(token):
+                    raise gr.Error("Invalid admin token")
+                try:
+                    body, filename = profiler.capture(seconds, fmt)
+                except profiler.ProfilerBusy as e:
+                    raise gr.Error(str(e))
+                os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+                path = os.path.join(Config.PROFILE_DIR, filename)
+                with open(path, 'w') as f:
+                    f.write(body)
+                return path
+            
+            profile_btn.click(
+                fn=capture_profile,
+                inputs=[admin_token, profile_seconds, profile_format],
+                outputs=[profile_file],
+                concurrency_limit=1
+            )
+        
         # Auto-refresh functionality
         def refresh_dashboard():
             return (
                 dashboard.get_dashboard_summary(),
                 dashboard.get_recent_emergencies(),
+                dashboard.get_incidents(),
                 dashboard.create_visualizations()
             )
         
+        def watch_dashboard():
+            """Push a refresh whenever the shared store changes"""
+            revision = -1
+            while True:
+                current = dashboard.store.wait_for_change(
+                    revision, timeout=Config.DASHBOARD_REFRESH_TIMEOUT
+                )
+                if current != revision:
+                    revision = current
+                    yield refresh_dashboard()
+        
         def process_test_report(text):
             result = dashboard.process_new_report(text)
             # Refresh displays
@@ -192,12 +298,12 @@ def create_dashboard():
             outputs=[result_display, summary_display, recent_table, plot_display]
         )
         
-        # Auto-refresh every 30 seconds
+        # Refresh on store change notifications instead of polling
         app.load(
-            fn=refresh_dashboard,
+            fn=watch_dashboard,
             inputs=[],
-            outputs=[summary_display, recent_table, plot_display],
-            every=30
+            outputs=[summary_display, recent_table, incidents_table, plot_display],
+            concurrency_limit=None
         )
     
     return app
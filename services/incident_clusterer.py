@@ -0,0 +1,240 @@
+import re
+import threading
+import zlib
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from config import Config
+from services.report_store import ReportStore
+from utils.metrics import timed, Counter
+
+INCIDENT_MATCHES = Counter(
+    'eveshield_incident_matches_total', 'Reports joining an open incident or starting a new one', ['result']
+)
+
+_PRIME = np.uint64(4294967311)  # smallest prime above 2**32
+_UNSPECIFIED_LOCATION = 'location not specified'
+
+# extract_location keeps everything after "at"/"in"/"near", so a place name
+# runs until the first word that starts a new clause ...
+_CLAUSE_WORDS = frozenset('''
+    and but or there is are was were has have had where which who that because so with
+    please help now very
+    na lakini kuna ni iko wako yuko tafadhali saidia sasa
+'''.split())
+# ... and words that say nothing about which place it is are ignored
+_PLACE_STOP_WORDS = frozenset('''
+    the a an of to at in on near by my our your this his her their
+    kwa karibu ya wa la za katika
+'''.split())
+# Kinds of place only decide a match when a location has no name in it
+_PLACE_KINDS = frozenset('''
+    road street avenue area estate town city village place market stage station school
+    hospital church mosque mall junction bridge
+    barabara mtaa soko shule hospitali kanisa
+'''.split())
+
+
+def shingles(text: str, size: int = 4) -> np.ndarray:
+    """crc32 hashes of the character shingles of the normalized text"""
+    normalized = ' '.join(re.sub(r'[^\w\s]', ' ', text.lower()).split())
+    if len(normalized) < size:
+        normalized = normalized.ljust(size)
+    grams = {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+    return np.fromiter((zlib.crc32(g.encode('utf-8')) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+class MinHasher:
+    """MinHash signatures with universal hashes (a*x + b) mod p, vectorized"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, 2 ** 31 - 1, size=num_perm).astype(np.uint64)
+        self.b = rng.randint(0, 2 ** 31 - 1, size=num_perm).astype(np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        x = shingles(text)
+        # a < 2**31 and x < 2**32, so a * x + b stays below 2**64
+        return ((self.a[:, None] * x[None, :] + self.b[:, None]) % _PRIME).min(axis=1)
+
+    @staticmethod
+    def similarity(a: np.ndarray, b: np.ndarray) -> float:
+        """Estimated Jaccard similarity of the two shingle sets"""
+        return float(np.mean(a == b))
+
+
+class _Incident:
+    __slots__ = ('incident_id', 'signatures', 'location', 'last_seen', 'keys')
+
+    def __init__(self, incident_id: str, signature: np.ndarray, location: str, seen: datetime):
+        self.incident_id = incident_id
+        self.signatures = [signature]
+        self.location = location
+        self.last_seen = seen
+        self.keys = set()
+
+
+class IncidentClusterer:
+    """Incremental near-duplicate clustering of reports into incidents.
+
+    Each report's MinHash signature is split into ``bands`` bands and each
+    band is hashed into a bucket, so a new report is only compared with the
+    incidents it shares a bucket with instead of every open incident. A
+    candidate is merged when its estimated text similarity, time window and
+    location all match. The incident id is the id of its first report.
+
+    Signatures travel with the reports through the shared store, so every
+    worker process catches up on the others' reports before assigning.
+    """
+
+    def __init__(self, store: ReportStore, num_perm: int = None, bands: int = None,
+                 similarity: float = None, window_minutes: int = None):
+        num_perm = num_perm or Config.MINHASH_PERMUTATIONS
+        self.bands = bands or Config.LSH_BANDS
+        if num_perm % self.bands:
+            raise ValueError("MINHASH_PERMUTATIONS must be a multiple of LSH_BANDS")
+        self.rows = num_perm // self.bands
+        self.store = store
+        self.hasher = MinHasher(num_perm)
+        self.similarity_threshold = similarity if similarity is not None else Config.CLUSTER_SIMILARITY
+        self.window = timedelta(
+            minutes=window_minutes if window_minutes is not None else Config.CLUSTER_WINDOW_MINUTES
+        )
+
+        self._buckets: Dict[Tuple[int, bytes], set] = {}
+        self._incidents: Dict[str, _Incident] = {}
+        self._indexed_reports = set()
+        self._expiry = deque()  # (seen, report_id, incident_id)
+        self._revision = 0
+        self._lock = threading.Lock()
+
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [
+            (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    @staticmethod
+    def place_tokens(location: Optional[str]) -> set:
+        """The words naming the place, e.g. {'gikomba', 'market'} for 'Gikomba market and it is burning'"""
+        words = re.sub(r'[^\w\s]', ' ', (location or '').lower()).split()
+        if ' '.join(words) == _UNSPECIFIED_LOCATION:
+            return set()
+        tokens = set()
+        for word in words:
+            if word in _CLAUSE_WORDS:
+                break
+            if word not in _PLACE_STOP_WORDS:
+                tokens.add(word)
+        return tokens
+
+    @classmethod
+    def locations_match(cls, a: str, b: str) -> bool:
+        """Unspecified matches anything; otherwise the place names must share a word"""
+        a, b = cls.place_tokens(a), cls.place_tokens(b)
+        if not a or not b:
+            return True
+        names_a, names_b = a - _PLACE_KINDS, b - _PLACE_KINDS
+        if names_a and names_b:
+            return bool(names_a & names_b)  # 'Gikomba market' is not 'Toi market'
+        return bool(a & b)
+
+    def _index(self, report_id: str, incident_id: str, signature: np.ndarray,
+               location: str, seen: datetime):
+        """Add a report's bands to the buckets, under its incident"""
+        incident = self._incidents.get(incident_id)
+        if incident is None:
+            incident = self._incidents[incident_id] = _Incident(incident_id, signature, location, seen)
+        elif len(incident.signatures) < Config.CLUSTER_MAX_SIGNATURES:
+            incident.signatures.append(signature)
+        incident.last_seen = max(incident.last_seen, seen)
+
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, set()).add(incident_id)
+            incident.keys.add(key)
+        self._indexed_reports.add(report_id)
+        self._expiry.append((seen, report_id, incident_id))
+
+    def _evict(self, now: datetime):
+        """Drop reports (and emptied incidents) that fell out of the window"""
+        cutoff = now - self.window
+        while self._expiry and self._expiry[0][0] < cutoff:
+            _, report_id, incident_id = self._expiry.popleft()
+            self._indexed_reports.discard(report_id)
+            incident = self._incidents.get(incident_id)
+            if incident is None or incident.last_seen >= cutoff:
+                continue
+            for key in incident.keys:
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(incident_id)
+                    if not bucket:
+                        del self._buckets[key]
+            del self._incidents[incident_id]
+
+    def _sync(self):
+        """Index reports other processes added since we last looked"""
+        if self._revision == 0:
+            since = (datetime.now() - self.window).isoformat()
+            reports = reversed(self.store.query(start=since))
+            self._revision = self.store.current_revision()
+        else:
+            current = self.store.current_revision()
+            if current == self._revision:
+                return
+            reports = self.store.changes_since(self._revision)
+            self._revision = current
+
+        for report in reports:
+            if report['report_id'] in self._indexed_reports or not report.get('minhash'):
+                continue
+            self._index(
+                report['report_id'],
+                report.get('incident_id') or report['report_id'],
+                np.array(report['minhash'], dtype=np.uint64),
+                report.get('location'),
+                datetime.fromisoformat(report.get('timestamp') or datetime.now().isoformat()),
+            )
+
+    @timed('cluster_assign')
+    def assign(self, report_id: str, report: Dict) -> Dict:
+        """Attach the report to a matching open incident or start a new one.
+
+        Sets ``incident_id`` and ``minhash`` on the report and returns
+        ``{'incident_id', 'similarity', 'representative'}``, where
+        representative is the best matching report id (None when new).
+        """
+        now = datetime.now()
+        signature = self.hasher.signature(report.get('original_text', ''))
+
+        with self._lock:
+            self._sync()
+            self._evict(now)
+
+            candidates = set()
+            for key in self._band_keys(signature):
+                candidates |= self._buckets.get(key, set())
+
+            best, best_similarity = None, 0.0
+            for incident_id in candidates:
+                incident = self._incidents.get(incident_id)
+                if incident is None or now - incident.last_seen > self.window:
+                    continue
+                if not self.locations_match(incident.location, report.get('location')):
+                    continue
+                similarity = max(self.hasher.similarity(signature, s) for s in incident.signatures)
+                if similarity >= self.similarity_threshold and similarity > best_similarity:
+                    best, best_similarity = incident, similarity
+
+            incident_id = best.incident_id if best else report_id
+            self._index(report_id, incident_id, signature, report.get('location'), now)
+
+        INCIDENT_MATCHES.inc('matched' if best else 'new')
+        report['incident_id'] = incident_id
+        report['minhash'] = signature.tolist()
+        return {
+            'incident_id': incident_id,
+            'similarity': best_similarity,
+            'representative': best.incident_id if best else None,
+        }
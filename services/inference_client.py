@@ -0,0 +1,72 @@
+import http.client
+import json
+import os
+import threading
+from typing import Dict
+from urllib.parse import urlparse
+from config import Config
+
+
+class InferenceError(Exception):
+    pass
+
+
+class InferenceClient:
+    """Keep-alive JSON client for the local inference server, one connection per thread"""
+
+    def __init__(self, url: str, timeout: float = None):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or 80
+        self.timeout = timeout or Config.INFERENCE_TIMEOUT
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def post(self, path: str, payload: Dict) -> Dict:
+        body = json.dumps(payload)
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request('POST', path, body, {'Content-Type': 'application/json'})
+                response = conn.getresponse()
+                data = json.loads(response.read() or b'{}')
+                break
+            except (ConnectionError, http.client.RemoteDisconnected, http.client.CannotSendRequest):
+                # The server closed an idle keep-alive connection; reconnect once
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+        if response.status != 200:
+            raise InferenceError(f"Inference server returned {response.status}: {data.get('error')}")
+        return data
+
+
+class RemoteSummarizer:
+    """Drop-in for the summarization pipeline backed by the inference server"""
+
+    def __init__(self, url: str):
+        self.client = InferenceClient(url)
+
+    def __call__(self, text, **kwargs):
+        texts = [text] if isinstance(text, str) else list(text)
+        return self.client.post('/summarize', {'texts': texts, 'kwargs': kwargs})['results']
+
+
+class RemoteWhisper:
+    """Drop-in for the Whisper model; the audio file must be on this node"""
+
+    def __init__(self, url: str):
+        self.client = InferenceClient(url)
+
+    def transcribe(self, audio: str, **kwargs) -> Dict:
+        if not isinstance(audio, str):
+            raise TypeError("The inference server transcribes files; pass a path, not samples")
+        return self.client.post('/transcribe', {'path': os.path.abspath(audio), 'kwargs': kwargs})
@@ -0,0 +1,196 @@
+"""Local inference service holding the one copy of the models on a node.
+
+The webhook workers, the dashboard and the ML worker talk to it over
+localhost HTTP (see ``services/inference_client.py``) instead of each
+loading Whisper and the summarization pipeline. Summaries requested by
+different clients within ``INFERENCE_BATCH_WAIT_MS`` of each other run as
+one pipeline batch; Whisper transcribes one file per call. At most
+``INFERENCE_CONCURRENCY`` model calls run at once, and requests beyond
+``INFERENCE_MAX_QUEUE`` waiting are refused with 503 instead of piling up.
+"""
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List
+from config import Config
+from utils import metrics
+from utils.metrics import timed, Histogram
+
+BATCH_SIZE = Histogram(
+    'eveshield_inference_batch_size', 'Requests served by one model call', ['model'],
+    buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+
+
+class Overloaded(Exception):
+    pass
+
+
+class _Request:
+    __slots__ = ('item', 'kwargs', 'done', 'result', 'error')
+
+    def __init__(self, item, kwargs: Dict):
+        self.item = item
+        self.kwargs = kwargs
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Batcher:
+    """Collects requests from many client threads into batched model calls"""
+
+    def __init__(self, name: str, fn: Callable[[List, Dict], List], slots: threading.Semaphore,
+                 max_batch: int = None, max_wait: float = None, max_queue: int = None):
+        self.name = name
+        self.fn = fn
+        self.slots = slots
+        self.max_batch = max_batch or Config.INFERENCE_MAX_BATCH
+        self.max_wait = max_wait if max_wait is not None else Config.INFERENCE_BATCH_WAIT_MS / 1000
+        self._queue = queue.Queue(maxsize=max_queue or Config.INFERENCE_MAX_QUEUE)
+        threading.Thread(target=self._run, name=f'batcher-{name}', daemon=True).start()
+
+    def submit(self, item, kwargs: Dict = None) -> _Request:
+        request = _Request(item, kwargs or {})
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            raise Overloaded(f"{self.name} queue is full")
+        return request
+
+    def wait(self, request: _Request, timeout: float = None):
+        if not request.done.wait(timeout or Config.INFERENCE_TIMEOUT):
+            raise TimeoutError(f"{self.name} request timed out")
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def __call__(self, item, kwargs: Dict = None, timeout: float = None):
+        return self.wait(self.submit(item, kwargs), timeout)
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def _collect(self) -> List[_Request]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Only requests with the same generation settings share a call
+            groups: Dict[str, List[_Request]] = {}
+            for request in batch:
+                groups.setdefault(json.dumps(request.kwargs, sort_keys=True), []).append(request)
+
+            for requests in groups.values():
+                with self.slots:
+                    try:
+                        results = self.fn([r.item for r in requests], requests[0].kwargs)
+                        BATCH_SIZE.observe(len(requests), self.name)
+                        for request, result in zip(requests, results):
+                            request.result = result
+                    except Exception as e:
+                        for request in requests:
+                            request.error = e
+                for request in requests:
+                    request.done.set()
+
+
+class InferenceService:
+    """The models behind the HTTP handler; interface mirrors in-process calls"""
+
+    def __init__(self, summarizer, whisper_model, concurrency: int = None):
+        self.summarizer = summarizer
+        self.whisper_model = whisper_model
+        self.slots = threading.BoundedSemaphore(concurrency or Config.INFERENCE_CONCURRENCY)
+        self.summaries = Batcher('summarizer', self._summarize_batch, self.slots)
+        self.transcriptions = Batcher('whisper', self._transcribe_batch, self.slots, max_batch=1)
+        metrics.QUEUE_DEPTH.set_function(lambda: {
+            ('inference', 'summarizer'): self.summaries.depth(),
+            ('inference', 'whisper'): self.transcriptions.depth(),
+        })
+
+    @timed('inference_summarize')
+    def _summarize_batch(self, texts: List[str], kwargs: Dict) -> List[Dict]:
+        return self.summarizer(texts, **kwargs)
+
+    @timed('inference_transcribe')
+    def _transcribe_batch(self, paths: List[str], kwargs: Dict) -> List[Dict]:
+        return [self.whisper_model.transcribe(path, **kwargs) for path in paths]
+
+    def summarize(self, texts: List[str], kwargs: Dict) -> List[Dict]:
+        requests = [self.summaries.submit(text, kwargs) for text in texts]
+        return [self.summaries.wait(request) for request in requests]
+
+    def transcribe(self, path: str, kwargs: Dict) -> Dict:
+        result = self.transcriptions(path, kwargs)
+        # Whisper's segments carry numpy values; the text and language are what callers use
+        return {key: result[key] for key in ('text', 'language') if key in result}
+
+
+def make_handler(service: InferenceService):
+    class InferenceHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive for the clients' persistent connections
+
+        def _send(self, status: int, body: str, content_type: str = 'application/json'):
+            data = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._send(200, json.dumps({'status': 'ok'}))
+            elif self.path == '/metrics':
+                self._send(200, metrics.render(), metrics.CONTENT_TYPE)
+            else:
+                self._send(404, json.dumps({'error': 'Not found'}))
+
+        def do_POST(self):
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                kwargs = payload.get('kwargs', {})
+                if self.path == '/summarize':
+                    result = {'results': service.summarize(payload['texts'], kwargs)}
+                elif self.path == '/transcribe':
+                    result = service.transcribe(payload['path'], kwargs)
+                else:
+                    self._send(404, json.dumps({'error': 'Not found'}))
+                    return
+            except Overloaded as e:
+                self._send(503, json.dumps({'error': str(e)}))
+                return
+            except (KeyError, ValueError) as e:
+                self._send(400, json.dumps({'error': f'Bad request: {e}'}))
+                return
+            except Exception as e:
+                self._send(500, json.dumps({'error': str(e)}))
+                return
+            self._send(200, json.dumps(result))
+
+        def log_message(self, format, *args):
+            pass  # one line per request would drown the logs
+
+    return InferenceHandler
+
+
+def serve(service: InferenceService, host: str = None, port: int = None) -> ThreadingHTTPServer:
+    """Create the HTTP server; call serve_forever() on the result"""
+    server = ThreadingHTTPServer((host or Config.INFERENCE_HOST, port or Config.INFERENCE_PORT),
+                                 make_handler(service))
+    server.daemon_threads = True
+    return server
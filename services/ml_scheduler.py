@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict
+from config import Config
+from utils.metrics import STAGE_SECONDS
+
+# Lower rank runs first
+SEVERITY_RANK = {'HIGH': 0, 'MEDIUM': 1, 'LOW': 2}
+
+
+class MLScheduler:
+    """Runs expensive ML work (summarization) by severity.
+
+    Each severity class has its own FIFO and its own concurrency limit on a
+    shared pool of worker threads. A free worker takes the queue head with
+    the best rank, so HIGH goes first, and as long as the lower classes'
+    limits add up to less than the pool a slot is always left for HIGH.
+    Waiting jobs age: every ``aging_seconds`` spent queued lifts a job by one
+    severity rank, so a steady stream of HIGH reports cannot starve MEDIUM.
+    """
+
+    def __init__(self, workers: int = None, concurrency: Dict[str, int] = None,
+                 aging_seconds: float = None):
+        self.workers = workers or Config.ML_WORKERS
+        self.concurrency = dict(concurrency or Config.ML_CONCURRENCY)
+        self.aging_seconds = aging_seconds if aging_seconds is not None else Config.ML_AGING_SECONDS
+        self._queues = {severity: deque() for severity in self.concurrency}
+        self._running = {severity: 0 for severity in self.concurrency}
+        self._lock = threading.Condition()
+        self._workers = []
+        self._pid = None
+        self._stopped = False
+
+    def _ensure_workers(self):
+        """Start the pool lazily so pre-forked workers each get their own threads"""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._workers = [
+            threading.Thread(target=self._work, name=f'ml-scheduler-{i}', daemon=True)
+            for i in range(self.workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def _severity_class(self, severity: str) -> str:
+        return severity if severity in self._queues else 'MEDIUM'
+
+    def submit(self, severity: str, fn: Callable, *args, **kwargs) -> Future:
+        """Queue fn(*args, **kwargs) under the given severity"""
+        future = Future()
+        with self._lock:
+            self._ensure_workers()
+            self._queues[self._severity_class(severity)].append(
+                (time.monotonic(), future, fn, args, kwargs)
+            )
+            self._lock.notify()
+        return future
+
+    def _next_job(self):
+        """Pick the eligible queue head with the best aged rank; call with lock held"""
+        now = time.monotonic()
+        best, best_score = None, None
+        for severity, queue in self._queues.items():
+            if not queue or self._running[severity] >= self.concurrency[severity]:
+                continue
+            waited = now - queue[0][0]
+            score = SEVERITY_RANK.get(severity, 1) - waited / self.aging_seconds
+            if best_score is None or score < best_score:
+                best, best_score = severity, score
+        return best
+
+    def _work(self):
+        while True:
+            with self._lock:
+                severity = self._next_job()
+                while severity is None and not self._stopped:
+                    self._lock.wait()
+                    severity = self._next_job()
+                if self._stopped:
+                    return
+                queued_at, future, fn, args, kwargs = self._queues[severity].popleft()
+                self._running[severity] += 1
+            STAGE_SECONDS.observe(time.monotonic() - queued_at, f'ml_queue_wait_{severity.lower()}')
+
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(*args, **kwargs))
+                    except Exception as e:
+                        future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._running[severity] -= 1
+                    self._lock.notify_all()
+
+    def queue_depth(self) -> Dict[str, int]:
+        with self._lock:
+            return {severity: len(queue) for severity, queue in self._queues.items()}
+
+    def running(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._running)
+
+    def shutdown(self):
+        with self._lock:
+            self._stopped = True
+            self._lock.notify_all()
@@ -0,0 +1,126 @@
+import math
+import os
+import threading
+import time
+from typing import Callable, List
+from config import Config
+from utils.metrics import Gauge
+
+# Degradation levels, from full service to answering the caller only
+FULL = 0        # keyword analysis now, summary scheduled
+KEYWORDS = 1    # keyword type and severity only; summary deferred
+RAW = 2         # store the raw transcript and answer; analysis deferred
+
+LEVEL_NAMES = {FULL: 'full', KEYWORDS: 'keywords', RAW: 'raw'}
+
+DEGRADATION_LEVEL = Gauge(
+    'eveshield_degradation_level', 'Current surge degradation level (0 full, 1 keywords, 2 raw)'
+)
+
+
+class OverloadController:
+    """Picks a degradation level from ML queue depth and webhook latency.
+
+    Load moves the level up as soon as either signal crosses a level's
+    threshold. It only comes back down once both signals are below
+    ``recovery_ratio`` of the thresholds and the current level has been
+    held for ``min_dwell`` seconds, so the level does not flap around a
+    threshold. Latency is an exponentially weighted moving average of
+    webhook calls (weight ``latency_alpha`` per call) that decays once no
+    call has arrived for ``latency_window`` seconds.
+    Callbacks registered with ``on_recover`` run whenever the level returns
+    to FULL, and every ``resume_interval`` seconds while it stays there, to
+    pick up deferred work; they must return quickly.
+    """
+
+    def __init__(self, queue_depth: Callable[[], int], depth_thresholds=None, latency_thresholds=None,
+                 recovery_ratio: float = None, min_dwell: float = None, latency_alpha: float = None,
+                 latency_window: float = None, resume_interval: float = None):
+        self.queue_depth = queue_depth
+        self.depth_thresholds = depth_thresholds or (Config.SURGE_QUEUE_KEYWORDS, Config.SURGE_QUEUE_RAW)
+        self.latency_thresholds = latency_thresholds or (Config.SURGE_LATENCY_KEYWORDS, Config.SURGE_LATENCY_RAW)
+        self.recovery_ratio = recovery_ratio if recovery_ratio is not None else Config.SURGE_RECOVERY_RATIO
+        self.min_dwell = min_dwell if min_dwell is not None else Config.SURGE_MIN_DWELL_SECONDS
+        self.latency_alpha = latency_alpha or Config.SURGE_LATENCY_ALPHA
+        self.latency_window = latency_window or Config.SURGE_LATENCY_WINDOW_SECONDS
+        self.resume_interval = resume_interval or Config.SURGE_RESUME_INTERVAL_SECONDS
+
+        self.level = FULL
+        self._changed_at = time.monotonic()
+        self._latency = 0.0
+        self._latency_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._recover_callbacks: List[Callable[[], None]] = []
+        self._recovered_at = 0.0
+        self._pid = None
+
+    def observe_latency(self, seconds: float):
+        with self._lock:
+            self._latency += self.latency_alpha * (seconds - self._latency)
+            self._latency_at = time.monotonic()
+        self.update()
+
+    def latency(self) -> float:
+        with self._lock:
+            idle = time.monotonic() - self._latency_at
+            return self._latency * math.exp(-max(0.0, idle - self.latency_window) / self.latency_window)
+
+    def _target(self, depth: int, latency: float, scale: float = 1.0) -> int:
+        for level in (RAW, KEYWORDS):
+            index = level - 1
+            if depth >= self.depth_thresholds[index] * scale or latency >= self.latency_thresholds[index] * scale:
+                return level
+        return FULL
+
+    def update(self) -> int:
+        """Re-evaluate the level; returns it"""
+        self._ensure_ticker()
+        depth, latency = self.queue_depth(), self.latency()
+        now = time.monotonic()
+        recovered = False
+        with self._lock:
+            target = self._target(depth, latency)
+            if target > self.level:
+                new_level = target
+            elif target < self.level and now - self._changed_at >= self.min_dwell:
+                new_level = min(self.level, self._target(depth, latency, self.recovery_ratio))
+            else:
+                new_level = self.level
+
+            if new_level != self.level:
+                print(f"Surge level {LEVEL_NAMES[self.level]} -> {LEVEL_NAMES[new_level]} "
+                      f"(queue {depth}, latency {latency:.2f}s)")
+                recovered = new_level == FULL
+                self.level = new_level
+                self._changed_at = now
+                DEGRADATION_LEVEL.set(new_level)
+
+            # Deferred reports can also be left over from other workers or a restart
+            if self.level == FULL and now - self._recovered_at >= self.resume_interval:
+                recovered = True
+            if recovered:
+                self._recovered_at = now
+
+        if recovered:
+            for callback in self._recover_callbacks:
+                callback()
+        return self.level
+
+    def on_recover(self, callback: Callable[[], None]):
+        self._recover_callbacks.append(callback)
+
+    def _ensure_ticker(self):
+        """Re-evaluate once a second so the level also falls while no calls arrive"""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+
+        def tick():
+            while True:
+                time.sleep(1.0)
+                try:
+                    self.update()
+                except Exception as e:
+                    print(f"Overload controller update failed: {e}")
+
+        threading.Thread(target=tick, name='overload-controller', daemon=True).start()
@@ -1,24 +1,88 @@
-from twilio.rest import Client
 from twilio.twiml.voice_response import VoiceResponse, Gather
-import speech_recognition as sr
-import whisper
-from pydub import AudioSegment
 import os
+import re
 import uuid
 from datetime import datetime
 from config import Config
-from typing import Dict
+from services.audio_archive import CALL_SID
+from models.stub_models import StubWhisper
+from utils.metrics import timed, MODEL_LOAD_SECONDS
+import time
+from typing import Dict, Mapping
+
+RECORDING_PATH = re.compile(r'^/2010-04-01/Accounts/(AC[0-9a-f]{32})/Recordings/RE[0-9a-f]{32}$')
 
 class PhoneService:
     def __init__(self):
-        self.client = Client(Config.TWILIO_ACCOUNT_SID, Config.TWILIO_AUTH_TOKEN)
-        self.whisper_model = whisper.load_model(Config.WHISPER_MODEL)
-        self.recognizer = sr.Recognizer()
+        # The Twilio REST client, Whisper and speech_recognition are created on
+        # first use; answering a call with TwiML needs none of them
+        self._client = None
+        self._whisper_model = None
+        self._recognizer = None
+        self._audio_archive = None
         
         # Ensure directories exist
         os.makedirs(Config.DATA_DIR, exist_ok=True)
         os.makedirs(Config.AUDIO_DIR, exist_ok=True)
     
+    @property
+    def client(self):
+        if self._client is None:
+            from twilio.rest import Client
+            self._client = Client(Config.TWILIO_ACCOUNT_SID, Config.TWILIO_AUTH_TOKEN)
+        return self._client
+    
+    @property
+    def whisper_model(self):
+        if self._whisper_model is None:
+            self.warm_up()
+        return self._whisper_model
+    
+    @property
+    def audio_archive(self):
+        if self._audio_archive is None:
+            from services.audio_archive import AudioArchive
+            self._audio_archive = AudioArchive()
+        return self._audio_archive
+    
+    @property
+    def recognizer(self):
+        if self._recognizer is None:
+            import speech_recognition as sr
+            self._recognizer = sr.Recognizer()
+        return self._recognizer
+    
+    def warm_up(self):
+        """Load Whisper now instead of on the first transcription"""
+        if self._whisper_model is not None:
+            return
+        start = time.perf_counter()
+        if Config.INFERENCE_URL:
+            from services.inference_client import RemoteWhisper
+            self._whisper_model = RemoteWhisper(Config.INFERENCE_URL)
+        elif Config.STUB_MODELS:
+            self._whisper_model = StubWhisper()
+        else:
+            import whisper
+            self._whisper_model = whisper.load_model(Config.WHISPER_MODEL)
+        MODEL_LOAD_SECONDS.set(time.perf_counter() - start, 'whisper')
+    
+    def is_twilio_request(self, url: str, params: Mapping, signature: str) -> bool:
+        """Whether a callback carries a valid X-Twilio-Signature for our auth token"""
+        if not Config.TWILIO_AUTH_TOKEN or not signature:
+            return False
+        from twilio.request_validator import RequestValidator
+        return RequestValidator(Config.TWILIO_AUTH_TOKEN).validate(url, params, signature)
+    
+    def recording_download_url(self, recording_url: str) -> str:
+        """The WAV URL of one of our account's recordings; ValueError for anything else"""
+        base = Config.TWILIO_API_BASE_URL.rstrip('/')
+        path = recording_url[len(base):] if recording_url.startswith(base + '/') else ''
+        match = RECORDING_PATH.match(path)
+        if not match or (Config.TWILIO_ACCOUNT_SID and match.group(1) != Config.TWILIO_ACCOUNT_SID):
+            raise ValueError(f"Not a recording of this Twilio account: {recording_url!r}")
+        return f"{recording_url}.wav"
+    
     def create_voice_response(self) -> VoiceResponse:
         """Create TwiML response for emergency calls"""
         response = VoiceResponse()
@@ -45,6 +109,7 @@ class PhoneService:
         
         return response
     
+    @timed('transcribe_audio')
     def transcribe_audio(self, audio_url: str) -> Dict[str, str]:
         """Transcribe audio from Twilio recording"""
         try:
@@ -69,9 +134,53 @@ class PhoneService:
                 'confidence': 0.0
             }
     
-    def save_emergency_call(self, call_data: Dict) -> str:
+    def archive_recording(self, call_sid: str, recording_url: str) -> Dict:
+        """Download a Twilio recording and add it to the compressed archive"""
+        import requests
+        
+        if not CALL_SID.match(call_sid):
+            raise ValueError(f"Invalid CallSid {call_sid!r}")
+        download_url = self.recording_download_url(recording_url)
+        existing = self.audio_archive.get(call_sid)
+        if existing is not None:
+            return existing  # Twilio retried the callback; keep the recording we have
+        
+        source = os.path.join(Config.AUDIO_DIR, f"{call_sid}-{uuid.uuid4()}.wav")
+        auth = (Config.TWILIO_ACCOUNT_SID, Config.TWILIO_AUTH_TOKEN) if Config.TWILIO_ACCOUNT_SID else None
+        try:
+            with requests.get(download_url, auth=auth, stream=True, timeout=60) as response:
+                response.raise_for_status()
+                with open(source, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        f.write(chunk)
+        except Exception:
+            if os.path.exists(source):
+                os.remove(source)
+            raise
+        return self.audio_archive.store(call_sid, source)
+    
+    @timed('retranscribe_recording')
+    def retranscribe(self, call_sid: str, start: float = 0.0, duration: float = None) -> Dict[str, str]:
+        """Transcribe an archived recording, or only a range of it"""
+        if start or duration:
+            # Decode just the range; Whisper takes float samples at 16 kHz
+            audio = self.audio_archive.read_pcm(call_sid, start, duration).astype('float32') / 32768.0
+        else:
+            path = self.audio_archive.path(call_sid)
+            if path is None:
+                raise KeyError(call_sid)
+            audio = path
+        result = self.whisper_model.transcribe(audio)
+        return {
+            'text': result['text'],
+            'language': result.get('language', 'unknown'),
+            'confidence': 0.95
+        }
+    
+    @timed('save_emergency_call')
+    def save_emergency_call(self, call_data: Dict, call_id: str = None) -> str:
         """Save emergency call data to file"""
-        call_id = str(uuid.uuid4())
+        call_id = call_id or str(uuid.uuid4())
         filename = f"{Config.DATA_DIR}/emergency_{call_id}.json"
         
         import json
@@ -0,0 +1,148 @@
+"""Streaming CSV and Parquet export of stored reports.
+
+Reports are read from the store ``EXPORT_CHUNK_ROWS`` at a time and each
+chunk is encoded and handed on (to an HTTP response or a file) before the
+next is read, so memory use is bounded by one chunk whatever the date
+range. Parquet needs pyarrow, which is imported only when it is asked for.
+"""
+import csv
+import importlib.util
+import io
+import os
+from typing import Dict, Iterator, List, Optional
+from config import Config
+from services.report_store import ReportStore
+from utils.metrics import timed
+
+COLUMNS = [
+    'report_id', 'timestamp', 'caller_number', 'call_sid', 'emergency_type', 'severity',
+    'location', 'language', 'summary', 'summary_status', 'incident_id', 'call_count',
+    'degradation_level', 'recommended_actions', 'original_text',
+]
+
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', '.csv'),
+    'parquet': ('application/vnd.apache.parquet', '.parquet'),
+}
+
+
+def _row(report: Dict) -> List:
+    row = [report.get(column) for column in COLUMNS]
+    actions = report.get('recommended_actions')
+    if isinstance(actions, list):
+        row[COLUMNS.index('recommended_actions')] = '; '.join(actions)
+    return row
+
+
+def _chunks(store: ReportStore, filters: Dict, chunk_rows: Optional[int]) -> Iterator[List[Dict]]:
+    return store.iter_chunks(chunk_size=chunk_rows or Config.EXPORT_CHUNK_ROWS, **filters)
+
+
+def iter_csv(store: ReportStore, filters: Dict, chunk_rows: int = None) -> Iterator[bytes]:
+    """CSV bytes, one piece per chunk of reports, header first"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for reports in _chunks(store, filters, chunk_rows):
+        writer.writerows(_row(report) for report in reports)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands out what was written since the last drain"""
+
+    def __init__(self):
+        self._pieces = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._pieces.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b''.join(self._pieces)
+        self._pieces = []
+        return data
+
+
+def _arrow_schema(pa):
+    fields = []
+    for column in COLUMNS:
+        if column in ('call_count', 'degradation_level'):
+            fields.append(pa.field(column, pa.int64()))
+        else:
+            fields.append(pa.field(column, pa.string()))
+    return pa.schema(fields)
+
+
+def parquet_available() -> bool:
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def iter_parquet(store: ReportStore, filters: Dict, chunk_rows: int = None) -> Iterator[bytes]:
+    """Parquet bytes, one row group per chunk of reports; the footer comes last"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+
+    schema = _arrow_schema(pa)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    try:
+        for reports in _chunks(store, filters, chunk_rows):
+            rows = [_row(report) for report in reports]
+            columns = []
+            for index, field in enumerate(schema):
+                values = [row[index] for row in rows]
+                if pa.types.is_string(field.type):
+                    values = [None if value is None else str(value) for value in values]
+                columns.append(pa.array(values, type=field.type))
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+@timed('export_reports')
+def write_export(store: ReportStore, path: str, fmt: str = 'csv', filters: Dict = None,
+                 chunk_rows: int = None) -> int:
+    """Export to a file, written atomically; returns its size in bytes"""
+    encode = iter_parquet if fmt == 'parquet' else iter_csv
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp, 'wb') as f:
+            for piece in encode(store, filters or {}, chunk_rows):
+                f.write(piece)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return os.path.getsize(path)
+
+
+def stream_export(store: ReportStore, fmt: str = 'csv', filters: Dict = None,
+                  chunk_rows: int = None) -> Iterator[bytes]:
+    encode = iter_parquet if fmt == 'parquet' else iter_csv
+    return encode(store, filters or {}, chunk_rows)
+
+
+def export_filename(fmt: str, filters: Dict) -> str:
+    parts = ['emergency_reports']
+    for key in ('start', 'end', 'emergency_type', 'severity'):
+        if filters.get(key):
+            parts.append(str(filters[key])[:10] if key in ('start', 'end') else str(filters[key]))
+    return '_'.join(parts).replace(':', '-') + FORMATS[fmt][1]
@@ -0,0 +1,508 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+from config import Config
+from utils.metrics import timed
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    report_id TEXT NOT NULL UNIQUE,
+    revision INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    caller_number TEXT,
+    call_sid TEXT,
+    emergency_type TEXT,
+    severity TEXT,
+    location TEXT,
+    incident_id TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_reports_timestamp ON reports (timestamp);
+CREATE INDEX IF NOT EXISTS idx_reports_type ON reports (emergency_type, timestamp);
+CREATE INDEX IF NOT EXISTS idx_reports_severity ON reports (severity, timestamp);
+CREATE INDEX IF NOT EXISTS idx_reports_caller ON reports (caller_number, timestamp);
+CREATE INDEX IF NOT EXISTS idx_reports_revision ON reports (revision);
+CREATE TABLE IF NOT EXISTS alerts (
+    message_sid TEXT PRIMARY KEY,
+    report_id TEXT NOT NULL,
+    to_number TEXT NOT NULL,
+    contact_name TEXT,
+    status TEXT NOT NULL,
+    status_rank INTEGER NOT NULL DEFAULT 0,
+    error_code TEXT,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_report ON alerts (report_id);
+"""
+
+# Twilio status callbacks can arrive out of order; a status never replaces a later one
+ALERT_STATUS_RANK = {
+    'failed_to_send': 0, 'accepted': 1, 'queued': 1, 'sending': 2, 'sent': 3,
+    'failed': 4, 'undelivered': 4, 'delivered': 5, 'read': 6,
+}
+
+# Columns added after the first release, created on open for older databases
+MIGRATIONS = {
+    'incident_id': 'ALTER TABLE reports ADD COLUMN incident_id TEXT',
+}
+POST_MIGRATION_SCHEMA = """
+CREATE INDEX IF NOT EXISTS idx_reports_incident ON reports (incident_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_reports_summary_status ON reports (json_extract(data, '$.summary_status'));
+"""
+
+class ReportStore:
+    """Durable emergency report store shared by the webhook and the dashboard.
+
+    Every process (Flask workers, the Gradio dashboard) opens the same SQLite
+    database in WAL mode, so readers never block the webhook's writes. Each
+    write bumps a global revision number which readers use to pick up only
+    what changed since they last looked.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or Config.REPORT_DB_PATH
+        self._local = threading.local()
+        self._changed = threading.Condition()
+
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        self._migrate(conn)
+        conn.executescript(POST_MIGRATION_SCHEMA)
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection):
+        columns = {row['name'] for row in conn.execute('PRAGMA table_info(reports)')}
+        for column, sql in MIGRATIONS.items():
+            if column not in columns:
+                try:
+                    conn.execute(sql)
+                except sqlite3.OperationalError:
+                    pass  # another process added it first
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, reopening it after a fork"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _write(self, statements: List[tuple]) -> int:
+        """Run statements in one write transaction and return the new revision"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            revision = conn.execute(
+                'SELECT COALESCE(MAX(revision), 0) + 1 FROM reports'
+            ).fetchone()[0]
+            for sql, params in statements:
+                conn.execute(sql, params(revision) if callable(params) else params)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        with self._changed:
+            self._changed.notify_all()
+        return revision
+
+    @staticmethod
+    def _row_values(report_id: str, report: Dict) -> tuple:
+        return (
+            report_id,
+            report.get('timestamp') or datetime.now().isoformat(),
+            report.get('caller_number'),
+            report.get('call_sid'),
+            report.get('emergency_type'),
+            report.get('severity'),
+            report.get('location'),
+            report.get('incident_id'),
+            json.dumps(report),
+        )
+
+    @staticmethod
+    def _row_to_report(row: sqlite3.Row) -> Dict:
+        report = json.loads(row['data'])
+        report['report_id'] = row['report_id']
+        return report
+
+    @timed('store_add_report')
+    def add_report(self, report: Dict, report_id: Optional[str] = None) -> str:
+        """Insert a report and return its id"""
+        report_id = report_id or str(uuid.uuid4())
+        values = self._row_values(report_id, report)
+        self._write([(
+            'INSERT INTO reports (revision, report_id, timestamp, caller_number, call_sid, '
+            'emergency_type, severity, location, incident_id, data) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            lambda revision: (revision,) + values
+        )])
+        return report_id
+
+    @timed('store_update_report')
+    def update_report(self, report_id: str, fields: Dict, expect: Optional[Dict] = None) -> Optional[Dict]:
+        """Merge fields into an existing report; returns the updated report.
+
+        The report is read and written back in one write transaction, so
+        concurrent updates of different fields do not undo each other. With
+        ``expect`` the update only applies while the stored report still has
+        those values; otherwise nothing is written and None is returned.
+        """
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT report_id, data FROM reports WHERE report_id = ?', (report_id,)
+            ).fetchone()
+            report = self._row_to_report(row) if row else None
+            if report is None or any(report.get(key) != value for key, value in (expect or {}).items()):
+                conn.execute('ROLLBACK')
+                return None
+
+            report.update(fields)
+            report.pop('report_id', None)
+            revision = conn.execute(
+                'SELECT COALESCE(MAX(revision), 0) + 1 FROM reports'
+            ).fetchone()[0]
+            conn.execute(
+                'UPDATE reports SET revision = ?, timestamp = ?, caller_number = ?, call_sid = ?, '
+                'emergency_type = ?, severity = ?, location = ?, incident_id = ?, data = ? '
+                'WHERE report_id = ?',
+                (revision,) + self._row_values(report_id, report)[1:] + (report_id,)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        with self._changed:
+            self._changed.notify_all()
+        report['report_id'] = report_id
+        return report
+
+    @timed('store_add_reports')
+    def add_reports(self, reports: Dict[str, Dict]) -> int:
+        """Insert many reports in one transaction, leaving existing ones as they are"""
+        statements = []
+        for report_id, report in reports.items():
+            report = dict(report)
+            report.pop('report_id', None)
+            values = self._row_values(report_id, report)
+            statements.append((
+                'INSERT INTO reports (revision, report_id, timestamp, caller_number, call_sid, '
+                'emergency_type, severity, location, incident_id, data) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(report_id) DO NOTHING',
+                lambda revision, values=values: (revision,) + values
+            ))
+        return self._write(statements) if statements else self.current_revision()
+
+    @timed('store_upsert_reports')
+    def upsert_reports(self, reports: Dict[str, Dict]) -> int:
+        """Insert or replace many reports in one transaction; returns the revision"""
+        statements = []
+        for report_id, report in reports.items():
+            report = dict(report)
+            report.pop('report_id', None)
+            values = self._row_values(report_id, report)
+            statements.append((
+                'INSERT INTO reports (revision, report_id, timestamp, caller_number, call_sid, '
+                'emergency_type, severity, location, incident_id, data) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(report_id) DO UPDATE SET revision = excluded.revision, '
+                'timestamp = excluded.timestamp, caller_number = excluded.caller_number, '
+                'call_sid = excluded.call_sid, emergency_type = excluded.emergency_type, '
+                'severity = excluded.severity, location = excluded.location, '
+                'incident_id = excluded.incident_id, data = excluded.data',
+                lambda revision, values=values: (revision,) + values
+            ))
+        return self._write(statements) if statements else self.current_revision()
+
+    def get_report(self, report_id: str) -> Optional[Dict]:
+        row = self._connection().execute(
+            'SELECT report_id, data FROM reports WHERE report_id = ?', (report_id,)
+        ).fetchone()
+        return self._row_to_report(row) if row else None
+
+    def recent(self, limit: int = 10) -> List[Dict]:
+        """Most recent reports, newest first"""
+        rows = self._connection().execute(
+            'SELECT report_id, data FROM reports ORDER BY timestamp DESC LIMIT ?', (limit,)
+        ).fetchall()
+        return [self._row_to_report(row) for row in rows]
+
+    @staticmethod
+    def _filters(start: Optional[str], end: Optional[str], emergency_type: Optional[str],
+                 severity: Optional[str], caller_number: Optional[str]) -> tuple:
+        clauses, params = [], []
+        for column, op, value in (
+            ('timestamp', '>=', start), ('timestamp', '<', end),
+            ('emergency_type', '=', emergency_type), ('severity', '=', severity),
+            ('caller_number', '=', caller_number),
+        ):
+            if value is not None:
+                clauses.append(f'{column} {op} ?')
+                params.append(value)
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+    def query(self, start: Optional[str] = None, end: Optional[str] = None,
+              emergency_type: Optional[str] = None, severity: Optional[str] = None,
+              caller_number: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Filter reports by time range (ISO timestamps), type, severity and caller"""
+        where, params = self._filters(start, end, emergency_type, severity, caller_number)
+        sql = 'SELECT report_id, data FROM reports' + where + ' ORDER BY timestamp DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+
+        rows = self._connection().execute(sql, params).fetchall()
+        return [self._row_to_report(row) for row in rows]
+
+    def iter_chunks(self, start: Optional[str] = None, end: Optional[str] = None,
+                    emergency_type: Optional[str] = None, severity: Optional[str] = None,
+                    caller_number: Optional[str] = None, chunk_size: int = 1000) -> Iterator[List[Dict]]:
+        """Matching reports oldest first, ``chunk_size`` at a time.
+
+        Rows are pulled with ``fetchmany`` from one cursor on a dedicated
+        connection, so memory stays bounded by the chunk size however many
+        reports match, and the export reads one consistent WAL snapshot.
+        """
+        where, params = self._filters(start, end, emergency_type, severity, caller_number)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            cursor = conn.execute('SELECT report_id, data FROM reports' + where + ' ORDER BY timestamp', params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [self._row_to_report(row) for row in rows]
+        finally:
+            conn.close()
+
+    def pending_summaries(self) -> List[Dict]:
+        """Reports still waiting for a summary, oldest first"""
+        rows = self._connection().execute(
+            "SELECT report_id, data FROM reports "
+            "WHERE json_extract(data, '$.summary_status') = 'pending' ORDER BY timestamp"
+        ).fetchall()
+        return [self._row_to_report(row) for row in rows]
+
+    def count_summary_status(self, status: str) -> int:
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM reports WHERE json_extract(data, '$.summary_status') = ?", (status,)
+        ).fetchone()[0]
+
+    def claim_deferred(self, limit: int = 50) -> List[Dict]:
+        """Atomically move up to ``limit`` deferred reports back to pending.
+
+        Runs in one write transaction so that when several webhook workers
+        recover at once each deferred report is claimed by exactly one.
+        """
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(
+                "SELECT report_id, data FROM reports "
+                "WHERE json_extract(data, '$.summary_status') = 'deferred' ORDER BY timestamp LIMIT ?",
+                (limit,)
+            ).fetchall()
+            reports = [self._row_to_report(row) for row in rows]
+            if reports:
+                revision = conn.execute(
+                    'SELECT COALESCE(MAX(revision), 0) + 1 FROM reports'
+                ).fetchone()[0]
+                conn.executemany(
+                    "UPDATE reports SET revision = ?, "
+                    "data = json_set(data, '$.summary_status', 'pending') WHERE report_id = ?",
+                    [(revision, report['report_id']) for report in reports]
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        if reports:
+            with self._changed:
+                self._changed.notify_all()
+        for report in reports:
+            report['summary_status'] = 'pending'
+        return reports
+
+    def stats(self) -> Dict:
+        """Aggregate counts computed in SQL rather than over loaded reports"""
+        conn = self._connection()
+        total = conn.execute('SELECT COUNT(*) FROM reports').fetchone()[0]
+        by_type = dict(conn.execute(
+            "SELECT COALESCE(emergency_type, 'unknown'), COUNT(*) FROM reports GROUP BY emergency_type"
+        ).fetchall())
+        by_severity = dict(conn.execute(
+            "SELECT COALESCE(severity, 'MEDIUM'), COUNT(*) FROM reports GROUP BY severity"
+        ).fetchall())
+        return {'total': total, 'by_type': by_type, 'by_severity': by_severity}
+
+    def incidents(self, since: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """Clustered incidents, most recently active first.
+
+        Each entry has the representative (first) report plus how many
+        reports and distinct callers joined it.
+        """
+        sql = (
+            'SELECT incident_id, COUNT(*) AS report_count, '
+            'COUNT(DISTINCT caller_number) AS caller_count, '
+            'MIN(timestamp) AS first_seen, MAX(timestamp) AS last_seen '
+            'FROM reports WHERE incident_id IS NOT NULL'
+        )
+        params = []
+        if since is not None:
+            sql += ' AND timestamp >= ?'
+            params.append(since)
+        sql += ' GROUP BY incident_id ORDER BY last_seen DESC LIMIT ?'
+        params.append(limit)
+
+        incidents = []
+        for row in self._connection().execute(sql, params).fetchall():
+            incident = dict(row)
+            incident['representative'] = self.get_report(row['incident_id'])
+            incidents.append(incident)
+        return incidents
+
+    def add_alerts(self, report_id: str, alerts: List[Dict]):
+        """Record the SMS alerts sent for a report, in one transaction"""
+        now = datetime.now().isoformat()
+        rows = [
+            (alert.get('sid') or f"unsent-{report_id}-{alert['to']}", report_id, alert['to'], alert.get('name'),
+             alert['status'], ALERT_STATUS_RANK.get(alert['status'], 0), alert.get('error_code'),
+             alert.get('attempts', 1), now)
+            for alert in alerts
+        ]
+        # A delivery receipt may have been stored first; keep its later status
+        self._write_alerts(
+            'INSERT INTO alerts (message_sid, report_id, to_number, contact_name, status, '
+            'status_rank, error_code, attempts, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (message_sid) DO UPDATE SET report_id = excluded.report_id, '
+            'to_number = excluded.to_number, contact_name = excluded.contact_name, '
+            'attempts = excluded.attempts, error_code = COALESCE(alerts.error_code, excluded.error_code), '
+            'status = CASE WHEN excluded.status_rank > alerts.status_rank THEN excluded.status ELSE alerts.status END, '
+            'status_rank = MAX(alerts.status_rank, excluded.status_rank)',
+            rows
+        )
+
+    def update_alert_statuses(self, statuses: List[tuple]) -> int:
+        """Apply many (message_sid, status, error_code) callbacks in one transaction"""
+        now = datetime.now().isoformat()
+        rows = [
+            (sid, status, ALERT_STATUS_RANK.get(status, 0), error_code, now)
+            for sid, status, error_code in statuses
+        ]
+        # Upserted: a receipt can be flushed before its alert row is added
+        return self._write_alerts(
+            "INSERT INTO alerts (message_sid, report_id, to_number, status, status_rank, error_code, updated_at) "
+            "VALUES (?, '', '', ?, ?, ?, ?) ON CONFLICT (message_sid) DO UPDATE SET status = excluded.status, "
+            "status_rank = excluded.status_rank, error_code = COALESCE(excluded.error_code, alerts.error_code), "
+            "updated_at = excluded.updated_at WHERE excluded.status_rank >= alerts.status_rank",
+            rows
+        )
+
+    def _write_alerts(self, sql: str, rows: List[tuple]) -> int:
+        # Alerts are not reports: no revision bump, so dashboards are not woken
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            changed = conn.executemany(sql, rows).rowcount
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return changed
+
+    def alerts_for(self, report_id: str) -> List[Dict]:
+        rows = self._connection().execute(
+            'SELECT message_sid, to_number, contact_name, status, error_code, attempts, updated_at '
+            'FROM alerts WHERE report_id = ? ORDER BY contact_name', (report_id,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def current_revision(self) -> int:
+        return self._connection().execute(
+            'SELECT COALESCE(MAX(revision), 0) FROM reports'
+        ).fetchone()[0]
+
+    def changes_since(self, revision: int) -> List[Dict]:
+        """Reports inserted or updated after the given revision"""
+        rows = self._connection().execute(
+            'SELECT report_id, data FROM reports WHERE revision > ? ORDER BY revision', (revision,)
+        ).fetchall()
+        return [self._row_to_report(row) for row in rows]
+
+    def wait_for_change(self, revision: int, timeout: float = 30.0) -> int:
+        """Block until the store moves past ``revision`` or the timeout expires.
+
+        Writes from this process wake waiters immediately. Writes from other
+        processes are detected through ``PRAGMA data_version``, which SQLite
+        bumps whenever another connection commits, so the reports table is
+        not touched while nothing changes.
+        """
+        deadline = time.monotonic() + timeout
+        conn = self._connection()
+        data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+
+        current = self.current_revision()
+        while current <= revision:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            with self._changed:
+                self._changed.wait(min(remaining, Config.STORE_WATCH_INTERVAL))
+
+            new_version = conn.execute('PRAGMA data_version').fetchone()[0]
+            if new_version != data_version:
+                data_version = new_version
+                current = self.current_revision()
+        return current
+
+    def import_json_dir(self, directory: str) -> int:
+        """Import legacy per-call JSON files that are not in the store yet"""
+        if not os.path.exists(directory):
+            return 0
+
+        known = {row[0] for row in self._connection().execute('SELECT report_id FROM reports')}
+        statements = []
+        for filename in os.listdir(directory):
+            if not filename.endswith('.json'):
+                continue
+            report_id = filename[:-len('.json')].replace('emergency_', '', 1)
+            if report_id in known:
+                continue
+            try:
+                with open(os.path.join(directory, filename), 'r') as f:
+                    report = json.load(f)
+            except Exception as e:
+                print(f"Error loading {filename}: {e}")
+                continue
+            values = self._row_values(report_id, report)
+            statements.append((
+                'INSERT OR IGNORE INTO reports (revision, report_id, timestamp, caller_number, '
+                'call_sid, emergency_type, severity, location, incident_id, data) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                lambda revision, values=values: (revision,) + values
+            ))
+
+        if statements:
+            self._write(statements)
+        return len(statements)
@@ -0,0 +1,102 @@
+import threading
+from concurrent.futures import Future
+from typing import Dict, Optional
+from models.emergency_classifier import EmergencyClassifier
+from services.ml_scheduler import MLScheduler
+from services.phone_service import PhoneService
+from services.report_store import ReportStore
+from services.incident_clusterer import IncidentClusterer
+from utils.metrics import timed
+
+
+class SummaryPipeline:
+    """Fills in the summaries of pending reports through the ML scheduler.
+
+    With ``ML_MODE=inline`` the webhook submits its own reports; with
+    ``ML_MODE=worker`` the webhook only stores them and ``ml_worker.py``
+    runs ``follow_store()`` to pick pending reports up from the shared store.
+    """
+
+    def __init__(self, classifier: EmergencyClassifier, store: ReportStore,
+                 phone_service: PhoneService, scheduler: MLScheduler,
+                 clusterer: Optional[IncidentClusterer] = None):
+        self.classifier = classifier
+        self.store = store
+        self.phone_service = phone_service
+        self.scheduler = scheduler
+        self.clusterer = clusterer
+        # report_id -> (transcript, future) queued, so only new content requeues
+        self._queued: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, report_id: str, severity: str, text: str, language: str = None) -> Future:
+        """Queue a summary; the same report and transcript is only queued once"""
+        with self._lock:
+            queued = self._queued.get(report_id)
+            if queued is not None and queued[0] == text:
+                return queued[1]
+            future = self.scheduler.submit(severity, self._summarize, report_id, text, language)
+            self._queued[report_id] = (text, future)
+        return future
+
+    @timed('summarize_report')
+    def _summarize(self, report_id: str, text: str, language: str = None):
+        """Summarize a stored report and save the result.
+
+        The summary is only stored while the report's transcript is still
+        ``text``; a call coalesced in meanwhile queued its own summary.
+        """
+        try:
+            report = self.store.update_report(report_id, {
+                'summary': self.classifier.generate_summary(text, language),
+                'summary_status': 'done'
+            }, expect={'original_text': text})
+        finally:
+            with self._lock:
+                queued = self._queued.get(report_id)
+                if queued is not None and queued[0] == text:
+                    del self._queued[report_id]
+        if report:
+            report.pop('report_id')
+            self.phone_service.save_emergency_call(report, call_id=report_id)
+        return report
+
+    def _submit_if_pending(self, report: Dict):
+        if report.get('summary_status') != 'pending':
+            return
+        self.submit(report['report_id'], report.get('severity', 'MEDIUM'),
+                    report.get('original_text', ''), report.get('language'))
+
+    def resume_deferred(self, limit: int = 20, submit: bool = True) -> int:
+        """Re-queue reports deferred during a surge; returns how many were claimed.
+
+        Reports stored raw get their keyword analysis (and incident) first.
+        With ``submit=False`` they are only marked pending for ``ml_worker.py``.
+        """
+        reports = self.store.claim_deferred(limit)
+        for report in reports:
+            report_id = report['report_id']
+            if 'emergency_type' not in report:
+                fields = self.classifier.quick_analysis(report.get('original_text', ''))
+                if self.clusterer is not None:
+                    self.clusterer.assign(report_id, fields)
+                self.store.update_report(report_id, fields)
+                report.update(fields)
+            if submit:
+                self.submit(report_id, report.get('severity', 'MEDIUM'),
+                            report.get('original_text', ''), report.get('language'))
+        return len(reports)
+
+    def follow_store(self, timeout: float = 30.0):
+        """Queue pending reports as they appear in the store (runs forever)"""
+        for report in self.store.pending_summaries():
+            self._submit_if_pending(report)
+
+        revision = self.store.current_revision()
+        while True:
+            current = self.store.wait_for_change(revision, timeout=timeout)
+            if current == revision:
+                continue
+            for report in self.store.changes_since(revision):
+                self._submit_if_pending(report)
+            revision = current
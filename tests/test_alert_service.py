@@ -0,0 +1,155 @@
+"""Emergency contact SMS fan-out against a local stand-in for Twilio.
+
+The stub answers the Messages API like Twilio does, slowly, so the tests
+show that contacts are texted concurrently, that rate-limited sends are
+retried (without waiting out an hour-long Retry-After) and that rejected
+numbers are not.
+"""
+import json
+import sqlite3
+import threading
+import time
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+from services.alert_service import AlertService
+from services.report_store import ReportStore
+
+LATENCY = 0.3
+RATE_LIMITED = '+254700000429'
+REJECTED = '+254700000400'
+
+
+class TwilioStub(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    requests = []
+    lock = threading.Lock()
+
+    def do_POST(self):
+        form = parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode())
+        to = form['To'][0]
+        with self.lock:
+            self.requests.append((self.path, to, self.headers.get('Authorization')))
+            attempts = sum(1 for _, number, _ in self.requests if number == to)
+            sid = f'SM{len(self.requests):032d}'
+        time.sleep(LATENCY)
+
+        if to == RATE_LIMITED and attempts == 1:
+            status, body = 429, {'code': 20429, 'message': 'Too Many Requests'}
+        elif to == REJECTED:
+            status, body = 400, {'code': 21211, 'message': "The 'To' number is not a valid phone number."}
+        else:
+            status, body = 201, {'sid': sid, 'status': 'queued', 'to': to}
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', '3600')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    request_queue_size = 64  # the default backlog of 5 drops simultaneous connects
+    daemon_threads = True
+
+
+@pytest.fixture
+def twilio():
+    TwilioStub.requests = []
+    server = StubServer(('127.0.0.1', 0), TwilioStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ReportStore(str(tmp_path / 'reports.sqlite3'))
+
+
+def make_service(store, base_url):
+    return AlertService(store, account_sid='AC123', auth_token='secret', from_number='+15005550006',
+                        base_url=base_url, concurrency=10, max_retries=2, backoff=0.01,
+                        max_retry_after=0.01)
+
+
+def caller(*numbers):
+    return {'username': 'Amina', 'phone_number': '+254712345678',
+            'contacts': [{'name': f'Contact {i}', 'phone_number': n} for i, n in enumerate(numbers)]}
+
+
+def test_contacts_are_texted_concurrently(store, twilio):
+    service = make_service(store, twilio)
+    numbers = [f'+2547000001{i:02d}' for i in range(10)]
+
+    start = time.perf_counter()
+    results = service.notify('report-1', caller(*numbers), 'Help').result(timeout=10)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < LATENCY * 3  # one round trip, not ten
+    assert [result['status'] for result in results] == ['queued'] * 10
+    assert all(path == '/2010-04-01/Accounts/AC123/Messages.json' for path, _, _ in TwilioStub.requests)
+    assert all(auth.startswith('Basic ') for _, _, auth in TwilioStub.requests)
+    assert len(store.alerts_for('report-1')) == 10
+
+
+def test_rate_limited_sends_are_retried_and_rejected_ones_are_not(store, twilio):
+    service = make_service(store, twilio)
+
+    results = service.notify('report-2', caller(RATE_LIMITED, REJECTED), 'Help').result(timeout=10)
+    by_number = {result['to']: result for result in results}
+
+    assert by_number[RATE_LIMITED]['status'] == 'queued'
+    assert by_number[RATE_LIMITED]['attempts'] == 2
+    assert by_number[REJECTED]['status'] == 'failed_to_send'
+    assert by_number[REJECTED]['attempts'] == 1
+    assert by_number[REJECTED]['error_code'] == '21211'
+
+
+def test_delivery_statuses_are_stored_in_bulk(store, twilio):
+    service = make_service(store, twilio)
+    results = service.notify('report-3', caller('+254700000201', '+254700000202'), 'Help').result(timeout=10)
+    first, second = (result['sid'] for result in results)
+
+    service.record_status(first, 'sent')
+    service.record_status(first, 'delivered')
+    service.record_status(first, 'sent')  # late, out of order
+    service.record_status(second, 'undelivered', '30003')
+    service.flush_statuses()
+
+    statuses = {alert['message_sid']: alert for alert in store.alerts_for('report-3')}
+    assert statuses[first]['status'] == 'delivered'
+    assert statuses[second]['status'] == 'undelivered'
+    assert statuses[second]['error_code'] == '30003'
+
+
+def test_receipts_flushed_before_their_alert_row_are_kept(store):
+    store.update_alert_statuses([('SM1', 'delivered', None)])
+    store.add_alerts('report-4', [{'sid': 'SM1', 'to': '+254700000301', 'name': 'Contact 0',
+                                   'status': 'queued', 'error_code': None, 'attempts': 1}])
+
+    alert, = store.alerts_for('report-4')
+    assert alert['status'] == 'delivered'
+    assert alert['to_number'] == '+254700000301'
+
+
+def test_receipts_are_kept_when_the_store_is_locked(store):
+    service = make_service(store, 'http://127.0.0.1:9')
+    service.record_status('SM1', 'delivered')
+
+    with mock.patch.object(store, 'update_alert_statuses', side_effect=sqlite3.OperationalError('database is locked')):
+        with pytest.raises(sqlite3.OperationalError):
+            service.flush_statuses()
+    service.record_status('SM2', 'sent')
+
+    assert service.flush_statuses() == 2
+    assert service.flush_statuses() == 0
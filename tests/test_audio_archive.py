@@ -0,0 +1,133 @@
+"""Recording archive: encoding, lookups, retention and the PCM cache.
+
+A small script stands in for ffmpeg (``FFMPEG_BINARY``): it copies its
+input to the output file, reports a duration, emits silence when asked for
+PCM on stdout, and fails on inputs named ``corrupt``.
+"""
+import os
+import stat
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from config import Config
+from services.audio_archive import AudioArchive, AudioArchiveError
+
+CALL_SID = 'CA' + '0' * 32
+OTHER_SID = 'CA' + '1' * 32
+
+FAKE_FFMPEG = """#!{python}
+import shutil, sys
+args = sys.argv[1:]
+source, output = args[args.index('-i') + 1], args[-1]
+sys.stderr.write('Input #0, wav\\n  Duration: 00:00:02.50, bitrate: 256 kb/s\\n')
+if output != '-':
+    open(output, 'wb').write(b'partial')
+if 'corrupt' in source:
+    sys.stderr.write(source + ': Invalid data found when processing input\\n')
+    sys.exit(1)
+if output == '-':
+    sys.stdout.buffer.write(bytes(3200))
+else:
+    shutil.copyfile(source, output)
+"""
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    ffmpeg = tmp_path / 'ffmpeg'
+    ffmpeg.write_text(FAKE_FFMPEG.format(python=sys.executable))
+    ffmpeg.chmod(ffmpeg.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setattr(Config, 'FFMPEG_BINARY', str(ffmpeg))
+    return AudioArchive(root=str(tmp_path / 'audio'), codec='opus', retention_days=90, sweep_interval=0)
+
+
+def recording(tmp_path, name='call.wav', size=1000):
+    path = tmp_path / name
+    path.write_bytes(b'\x01' * size)
+    return str(path)
+
+
+def files_under(root):
+    return sorted(os.path.relpath(os.path.join(d, f), root) for d, _, fs in os.walk(root) for f in fs
+                  if not f.startswith('index.sqlite3'))
+
+
+def test_store_indexes_the_encoded_recording(archive, tmp_path):
+    source = recording(tmp_path)
+    record = archive.store(CALL_SID, source)
+
+    assert not os.path.exists(source)
+    assert record['duration'] == 2.5
+    assert (record['bytes'], record['source_bytes']) == (1000, 1000)
+    assert record['path'].endswith(f'{CALL_SID}.opus')
+    assert archive.get(CALL_SID) == record
+    assert archive.path(OTHER_SID) is None
+    assert archive.usage() == {'recordings': 1, 'bytes': 1000, 'source_bytes': 1000}
+
+    with pytest.raises(AudioArchiveError):
+        archive.store(CALL_SID, recording(tmp_path))
+    with pytest.raises(ValueError):
+        archive.store('../../etc/passwd', recording(tmp_path))
+
+
+def test_a_failed_encode_leaves_no_files_behind(archive, tmp_path):
+    source = recording(tmp_path, 'corrupt.wav')
+    with pytest.raises(AudioArchiveError, match='corrupt.wav.*removed.*Invalid data'):
+        archive.store(CALL_SID, source)
+
+    assert not os.path.exists(source)
+    assert files_under(archive.root) == []
+    assert archive.get(CALL_SID) is None
+
+    kept = recording(tmp_path, 'corrupt-kept.wav')
+    with pytest.raises(AudioArchiveError, match='kept'):
+        archive.store(CALL_SID, kept, delete_source=False)
+    assert os.path.exists(kept)
+
+
+def test_ranges_are_decoded_as_pcm(archive, tmp_path):
+    archive.store(CALL_SID, recording(tmp_path))
+    assert len(archive.read_pcm(CALL_SID, start=1.0, duration=0.1)) == 1600
+    with pytest.raises(KeyError):
+        archive.read_pcm(OTHER_SID)
+
+
+def test_retention_removes_expired_recordings_and_their_cache(archive, tmp_path):
+    archive.store(CALL_SID, recording(tmp_path))
+    archive.store(OTHER_SID, recording(tmp_path))
+    archive.pcm_memmap(CALL_SID)
+
+    assert archive.enforce_retention() == 0
+    assert archive.enforce_retention(now=datetime.now() + timedelta(days=91)) == 2
+    assert archive.get(CALL_SID) is None
+    assert files_under(archive.root) == []  # date directories are pruned too
+    assert os.path.isdir(archive.cache_dir)
+
+
+def test_the_sweeper_expires_recordings_without_new_writes(archive, tmp_path):
+    archive.store(CALL_SID, recording(tmp_path))
+    swept = AudioArchive(root=archive.root, codec='opus', retention_days=0, sweep_interval=0.05)
+    swept._connection().execute("UPDATE recordings SET expires_at = '2000-01-01T00:00:00'")
+
+    deadline = time.monotonic() + 5
+    while swept.get(CALL_SID) is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert swept.get(CALL_SID) is None
+
+
+def test_the_pcm_cache_evicts_least_recently_used(archive, monkeypatch):
+    monkeypatch.setattr(Config, 'AUDIO_PCM_CACHE_MB', 1500 / (1024 * 1024))
+    paths = []
+    for i in range(4):
+        path = os.path.join(archive.cache_dir, f'CA{i}.s16le')
+        with open(path, 'wb') as f:
+            f.write(bytes(600))
+        os.utime(path, (1000 + i, 1000 + i))
+        paths.append(path)
+
+    # The file just decoded is kept whatever its age; the oldest others go first
+    archive._trim_cache(keep=paths[0])
+    assert [os.path.exists(path) for path in paths] == [True, False, True, True]
@@ -0,0 +1,94 @@
+"""Resumable re-analysis of the report archive.
+
+Runs the real process pool over a small synthetic archive with the stub
+summarizer, so a run takes a fraction of a second.
+"""
+import argparse
+import json
+import os
+
+import pytest
+
+from config import Config
+from models.emergency_classifier import EmergencyClassifier
+from tools import backfill
+
+TEXTS = [
+    "There is a fire at Gikomba market",
+    "Accident on Thika road, two cars",
+    "Kuna moto sokoni tafadhali saidia",
+    "My neighbour collapsed and is not breathing",
+    "Robbery at the Kencom bus stage",
+]
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'STUB_MODELS', True)
+    monkeypatch.setattr(Config, 'INFERENCE_URL', None)
+    for i, text in enumerate(TEXTS):
+        with open(tmp_path / f'emergency_report-{i}.json', 'w') as f:
+            json.dump({'original_text': text, 'caller_number': f'+25471200000{i}'}, f)
+    return tmp_path
+
+
+def run(archive, **options):
+    args = dict(data_dir=str(archive), workers=2, batch_size=2, checkpoint=None, restart=False,
+                force=False, no_store=True, progress_interval=60)
+    return backfill.run(argparse.Namespace(**dict(args, **options)))
+
+
+def load(archive, i):
+    with open(archive / f'emergency_report-{i}.json') as f:
+        return json.load(f)
+
+
+def test_reports_are_reanalysed_and_tagged(archive):
+    result = run(archive)
+
+    assert (result['processed'], result['failed']) == (len(TEXTS), 0)
+    version = EmergencyClassifier().model_version()
+    for i in range(len(TEXTS)):
+        report = load(archive, i)
+        assert report['model_version'] == version
+        assert report['summary_status'] == 'done'
+        assert report['caller_number'] == f'+25471200000{i}'  # fields outside the analysis are kept
+    assert load(archive, 0)['emergency_type'] == 'fire'
+    assert not [name for name in os.listdir(archive) if name.endswith('.tmp')]
+
+
+def test_a_second_run_resumes_from_the_checkpoint(archive):
+    result = run(archive)
+    # An interrupted run: two reports were recorded before the process died
+    with open(result['checkpoint'], 'w') as f:
+        f.write('report-0\nreport-1\n')
+    for i in range(len(TEXTS)):
+        report = load(archive, i)
+        del report['model_version']
+        with open(archive / f'emergency_report-{i}.json', 'w') as f:
+            json.dump(report, f)
+
+    assert run(archive)['processed'] == len(TEXTS) - 2
+    assert 'model_version' not in load(archive, 0)
+    assert 'model_version' in load(archive, 4)
+
+
+def test_reports_at_the_current_version_are_skipped(archive):
+    run(archive)
+    # Even without the checkpoint, tagged reports are not redone
+    assert run(archive, restart=True)['processed'] == 0
+    assert run(archive, restart=True, force=True)['processed'] == len(TEXTS)
+
+
+def test_a_failed_write_leaves_the_original_intact(tmp_path):
+    path = tmp_path / 'emergency_report-0.json'
+    path.write_text('{"original_text": "fire"}')
+
+    with pytest.raises(TypeError):
+        backfill.write_atomic(str(path), {'original_text': 'fire', 'unserializable': object()})
+    assert json.loads(path.read_text()) == {'original_text': 'fire'}
+    assert os.listdir(tmp_path) == ['emergency_report-0.json']
+
+    backfill.write_atomic(str(path), {'original_text': 'fire', 'summary': 'Fire'})
+    assert json.loads(path.read_text())['summary'] == 'Fire'
+    assert os.listdir(tmp_path) == ['emergency_report-0.json']
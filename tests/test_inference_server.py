@@ -0,0 +1,126 @@
+"""Batch assembly in the local inference server.
+
+The model slot is held while requests queue, so everything that arrives
+before it frees up must be served by as few model calls as the batch size
+and generation settings allow.
+"""
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from services.inference_client import InferenceError, RemoteSummarizer
+from services.inference_server import Batcher, InferenceService, Overloaded, make_handler
+
+
+class Model:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, items, kwargs):
+        self.calls.append((list(items), kwargs))
+        if 'boom' in items:
+            raise RuntimeError('model failed')
+        return [f'{item}!' for item in items]
+
+
+@pytest.fixture
+def slots():
+    return threading.BoundedSemaphore(1)
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_requests_waiting_for_the_model_share_one_call(slots):
+    model = Model()
+    batcher = Batcher('test', model, slots, max_batch=8, max_wait=0.2)
+    with slots:
+        requests = [batcher.submit(text) for text in ('fire', 'flood', 'crash')]
+    assert [batcher.wait(request, timeout=5) for request in requests] == ['fire!', 'flood!', 'crash!']
+    assert model.calls == [(['fire', 'flood', 'crash'], {})]
+
+
+def test_batches_are_split_at_max_batch(slots):
+    model = Model()
+    batcher = Batcher('test', model, slots, max_batch=2, max_wait=0.2)
+    with slots:
+        requests = [batcher.submit(text) for text in ('a', 'b', 'c')]
+    assert [batcher.wait(request, timeout=5) for request in requests] == ['a!', 'b!', 'c!']
+    assert [items for items, _ in model.calls] == [['a', 'b'], ['c']]
+
+
+def test_only_matching_generation_settings_share_a_call(slots):
+    model = Model()
+    batcher = Batcher('test', model, slots, max_batch=8, max_wait=0.2)
+    with slots:
+        short = [batcher.submit(text, {'max_length': 50}) for text in ('a', 'b')]
+        long = batcher.submit('c', {'max_length': 100})
+    for request in short + [long]:
+        batcher.wait(request, timeout=5)
+    assert sorted(model.calls) == [(['a', 'b'], {'max_length': 50}), (['c'], {'max_length': 100})]
+
+
+def test_a_failed_call_fails_every_request_in_it(slots):
+    model = Model()
+    batcher = Batcher('test', model, slots, max_batch=8, max_wait=0.2)
+    with slots:
+        requests = [batcher.submit(text) for text in ('fire', 'boom')]
+    for request in requests:
+        with pytest.raises(RuntimeError):
+            batcher.wait(request, timeout=5)
+
+
+def test_a_full_queue_is_refused(slots):
+    batcher = Batcher('test', Model(), slots, max_batch=1, max_wait=0, max_queue=1)
+    with slots:
+        first = batcher.submit('a')
+        wait_until(lambda: batcher.depth() == 0)  # taken, waiting for the slot
+        second = batcher.submit('b')
+        with pytest.raises(Overloaded):
+            batcher.submit('c')
+    assert batcher.wait(first, timeout=5) == 'a!'
+    assert batcher.wait(second, timeout=5) == 'b!'
+
+
+@pytest.fixture
+def server():
+    summarizer = Model()
+    service = InferenceService(lambda texts, **kwargs: summarizer(texts, kwargs), whisper_model=None, concurrency=1)
+    service.summaries.max_wait = 0.2
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(service))
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield service, summarizer, f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_clients_of_the_http_server_are_batched_together(server):
+    service, summarizer, url = server
+    results = {}
+
+    def summarize(text):
+        results[text] = RemoteSummarizer(url)(text)
+
+    with service.slots:
+        clients = [threading.Thread(target=summarize, args=(text,)) for text in ('fire', 'flood')]
+        for client in clients:
+            client.start()
+        time.sleep(0.5)  # both requests arrive and wait for the model slot
+    for client in clients:
+        client.join(5)
+
+    assert results == {'fire': ['fire!'], 'flood': ['flood!']}
+    assert [sorted(items) for items, _ in summarizer.calls] == [['fire', 'flood']]
+
+
+def test_model_errors_reach_the_client(server):
+    _, _, url = server
+    with pytest.raises(InferenceError, match='500'):
+        RemoteSummarizer(url)('boom')
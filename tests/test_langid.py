@@ -0,0 +1,78 @@
+"""Character n-gram language identification.
+
+Callers speak English, Swahili or a mix of both; the detected language
+picks the language of the spoken reply and of the summary.
+"""
+import numpy as np
+import pytest
+
+from utils.langid import LanguageIdentifier, featurize
+from utils.language_utils import detect_language, detect_languages, language_confidence
+
+ENGLISH = [
+    "There is a fire at the market and people are trapped inside",
+    "please help",
+]
+SWAHILI = [
+    "Kuna moto sokoni na watu wamekwama ndani tafadhali tuma msaada",
+    "saidia",
+]
+SHENG = [
+    "Msee kuna accident kwa stage, manze watu wameumia sana",
+    "Niko na shida bro, mtu ameni-attack na knife hapa town",
+    "Mathree imegonga mtu pale stage, ako down, tumeita cops lakini hawajakuja",
+]
+
+
+@pytest.fixture(scope='module')
+def identifier():
+    return LanguageIdentifier()
+
+
+@pytest.mark.parametrize('text', ENGLISH)
+def test_english(text):
+    assert detect_language(text) == 'en'
+
+
+@pytest.mark.parametrize('text', SWAHILI)
+def test_swahili(text):
+    assert detect_language(text) == 'sw'
+
+
+@pytest.mark.parametrize('text', SHENG)
+def test_sheng_is_detected_as_swahili(text):
+    assert detect_language(text) == 'sw'
+
+
+def test_mostly_english_code_switching_is_english():
+    assert detect_language("My friend amepigwa na gari on Thika road, please send an ambulance") == 'en'
+
+
+def test_batch_matches_single_detection():
+    texts = ENGLISH + SWAHILI + SHENG
+    assert detect_languages(texts) == [detect_language(text) for text in texts]
+    assert detect_languages([]) == []
+
+
+def test_batch_rows_do_not_leak_into_each_other():
+    # n-grams spanning the separator between two texts are dropped
+    together = featurize(['fire', 'moto'])
+    assert np.allclose(together, np.vstack([featurize(['fire']), featurize(['moto'])]))
+
+
+def test_confidences_are_probabilities(identifier):
+    for confidence in identifier.confidences(ENGLISH + SWAHILI + SHENG):
+        assert set(confidence) == {'en', 'sw'}
+        assert all(0.0 <= p <= 1.0 for p in confidence.values())
+        assert sum(confidence.values()) == pytest.approx(1.0, abs=1e-5)
+
+    assert language_confidence(ENGLISH[0])['en'] > 0.9
+    assert language_confidence(SWAHILI[0])['sw'] > 0.9
+    assert identifier.predict_proba([]).shape == (0, 2)
+
+
+@pytest.mark.parametrize('text', ['', '   ', '123 !!!'])
+def test_texts_without_letters_fall_back_to_the_default(identifier, text):
+    assert identifier.detect([text]) == ['en']
+    assert identifier.detect([text], default='sw') == ['sw']
+    assert identifier.detect([text, SWAHILI[0]], default='en') == ['en', 'sw']
@@ -0,0 +1,67 @@
+"""Metrics of pre-forked workers add up in one scrape.
+
+Each test forks workers the way gunicorn does, after the parent has
+already counted something, and scrapes from the parent.
+"""
+import multiprocessing
+
+import pytest
+
+from utils.metrics import Counter, Gauge, Histogram, Registry, mark_process_dead
+
+
+@pytest.fixture
+def registry(tmp_path):
+    registry = Registry()
+    registry.use_directory(str(tmp_path))
+    return registry
+
+
+def run_workers(count, target):
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=target, args=(i,)) for i in range(count)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(10)
+        assert worker.exitcode == 0
+    return workers
+
+
+def test_counters_and_histograms_are_summed_across_workers(registry):
+    requests = Counter('test_requests_total', 'Requests', ['endpoint'], registry=registry)
+    latency = Histogram('test_latency_seconds', 'Latency', buckets=(0.1, 1.0), registry=registry)
+    requests.inc('startup')  # counted by the master before forking
+
+    def serve(i):
+        for _ in range(10):
+            requests.inc('process_emergency')
+        latency.observe(0.05 if i == 0 else 0.5)
+
+    run_workers(3, serve)
+    text = registry.render()
+
+    assert 'test_requests_total{endpoint="process_emergency"} 30' in text
+    assert 'test_requests_total{endpoint="startup"} 1' in text
+    assert 'test_latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{le="1.0"} 3' in text
+    assert 'test_latency_seconds_count 3' in text
+
+
+def test_gauges_of_exited_workers_are_dropped(registry):
+    depth = Gauge('test_queue_depth', 'Queued', registry=registry, aggregate='sum')
+    loaded = Gauge('test_model_load_seconds', 'Load time', registry=registry)
+
+    def serve(i):
+        depth.set(i + 1)
+        loaded.set(2.0 + i)
+
+    workers = run_workers(2, serve)
+    text = registry.render()
+    assert 'test_queue_depth 3' in text
+    assert 'test_model_load_seconds 3.0' in text
+
+    mark_process_dead(workers[1].pid, registry.directory)
+    text = registry.render()
+    assert 'test_queue_depth 1' in text
+    assert 'test_model_load_seconds 2.0' in text
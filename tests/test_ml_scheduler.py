@@ -0,0 +1,87 @@
+"""Severity scheduling of summarization jobs.
+
+A single worker is held busy while jobs queue up behind it, so the order
+in which they run afterwards is the scheduler's choice alone.
+"""
+import threading
+import time
+
+import pytest
+
+from services.ml_scheduler import MLScheduler
+
+
+@pytest.fixture
+def make_scheduler():
+    schedulers = []
+
+    def make(workers=1, concurrency=None, aging_seconds=30):
+        scheduler = MLScheduler(workers=workers, concurrency=concurrency or {'HIGH': 3, 'MEDIUM': 1, 'LOW': 1},
+                                aging_seconds=aging_seconds)
+        schedulers.append(scheduler)
+        return scheduler
+    yield make
+    for scheduler in schedulers:
+        scheduler.shutdown()
+
+
+def hold(scheduler, severity='HIGH'):
+    """Occupy a worker until the returned event is set"""
+    release, started = threading.Event(), threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+    future = scheduler.submit(severity, block)
+    assert started.wait(5)
+    return release, future
+
+
+def test_higher_severity_runs_first(make_scheduler):
+    scheduler = make_scheduler()
+    release, _ = hold(scheduler)
+    ran = []
+    futures = [scheduler.submit(severity, ran.append, severity) for severity in ('LOW', 'MEDIUM', 'HIGH', 'HIGH')]
+    assert scheduler.queue_depth() == {'HIGH': 2, 'MEDIUM': 1, 'LOW': 1}
+
+    release.set()
+    for future in futures:
+        future.result(timeout=5)
+    assert ran == ['HIGH', 'HIGH', 'MEDIUM', 'LOW']
+
+
+def test_waiting_jobs_age_past_newer_high_ones(make_scheduler):
+    scheduler = make_scheduler(aging_seconds=0.05)
+    release, _ = hold(scheduler)
+    ran = []
+    low = scheduler.submit('LOW', ran.append, 'LOW')
+    time.sleep(0.2)  # four aging periods: LOW now outranks a fresh HIGH
+    high = scheduler.submit('HIGH', ran.append, 'HIGH')
+
+    release.set()
+    low.result(timeout=5)
+    high.result(timeout=5)
+    assert ran == ['LOW', 'HIGH']
+
+
+def test_each_class_is_capped_at_its_concurrency(make_scheduler):
+    scheduler = make_scheduler(workers=3)
+    release = threading.Event()
+    lows = [scheduler.submit('LOW', release.wait, 5) for _ in range(3)]
+    time.sleep(0.2)
+    assert scheduler.running()['LOW'] == 1
+    assert scheduler.queue_depth()['LOW'] == 2
+
+    # The slots LOW may not use stay free for HIGH
+    assert scheduler.submit('HIGH', lambda: 'done').result(timeout=1) == 'done'
+    release.set()
+    for future in lows:
+        future.result(timeout=5)
+
+
+def test_unknown_severity_is_scheduled_as_medium(make_scheduler):
+    scheduler = make_scheduler()
+    release, _ = hold(scheduler)
+    scheduler.submit('CRITICAL?', lambda: None)
+    assert scheduler.queue_depth()['MEDIUM'] == 1
+    release.set()
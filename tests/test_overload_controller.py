@@ -0,0 +1,121 @@
+"""Surge degradation levels and the resumption of deferred work.
+
+Load raises the level at once; it only falls again once the signals are
+well below the thresholds and the level has been held for a while, and the
+reports deferred meanwhile are picked up when service is back to FULL.
+"""
+import time
+
+import pytest
+
+from models.emergency_classifier import EmergencyClassifier
+from services.overload_controller import FULL, KEYWORDS, RAW, OverloadController
+from services.report_store import ReportStore
+from services.summary_pipeline import SummaryPipeline
+
+
+class Backlog:
+    def __init__(self):
+        self.depth = 0
+
+    def __call__(self):
+        return self.depth
+
+
+@pytest.fixture
+def backlog():
+    return Backlog()
+
+
+def controller(backlog, **options):
+    options = dict({'depth_thresholds': (10, 50), 'latency_thresholds': (2.0, 5.0), 'recovery_ratio': 0.5,
+                    'min_dwell': 0.2, 'latency_alpha': 0.5, 'latency_window': 60,
+                    'resume_interval': 3600}, **options)
+    return OverloadController(backlog, **options)
+
+
+def test_load_raises_the_level_at_once(backlog):
+    surge = controller(backlog, min_dwell=3600)
+    assert surge.update() == FULL
+    backlog.depth = 10
+    assert surge.update() == KEYWORDS
+    backlog.depth = 50
+    assert surge.update() == RAW
+
+
+def test_slow_calls_raise_the_level(backlog):
+    surge = controller(backlog)
+    surge.observe_latency(4.0)
+    assert surge.latency() == pytest.approx(2.0)
+    assert surge.level == KEYWORDS
+    surge.observe_latency(8.0)
+    assert surge.level == RAW
+
+
+def test_the_level_holds_for_the_dwell_time(backlog):
+    surge = controller(backlog)
+    backlog.depth = 60
+    assert surge.update() == RAW
+    backlog.depth = 0
+    assert surge.update() == RAW
+    time.sleep(0.25)
+    assert surge.update() == FULL
+
+
+def test_recovery_waits_for_load_well_below_the_thresholds(backlog):
+    surge = controller(backlog, min_dwell=0)
+    backlog.depth = 60
+    assert surge.update() == RAW
+    backlog.depth = 40  # under RAW's 50 but not under half of it
+    assert surge.update() == RAW
+    backlog.depth = 20
+    assert surge.update() == KEYWORDS
+    backlog.depth = 8  # under KEYWORDS' 10 but not under 5
+    assert surge.update() == KEYWORDS
+    backlog.depth = 4
+    assert surge.update() == FULL
+
+
+def test_recover_callbacks_run_on_return_to_full(backlog):
+    surge = controller(backlog, min_dwell=0)
+    recovered = []
+    surge.on_recover(lambda: recovered.append(surge.level))
+    surge.update()  # the first check at FULL also looks for leftover work
+    assert recovered == [FULL]
+
+    backlog.depth = 20
+    surge.update()
+    backlog.depth = 0
+    surge.update()
+    surge.update()  # staying at FULL waits for resume_interval
+    assert recovered == [FULL, FULL]
+
+
+class Archive:
+    def save_emergency_call(self, call_data, call_id=None):
+        return call_id
+
+
+def test_deferred_reports_are_resumed_after_recovery(tmp_path, backlog):
+    store = ReportStore(str(tmp_path / 'reports.sqlite3'))
+    pipeline = SummaryPipeline(EmergencyClassifier(), store, Archive(), scheduler=None)
+    raw = store.add_report({'original_text': 'There is a fire at Gikomba market', 'summary_status': 'deferred',
+                            'timestamp': '2026-10-19T10:00:00'})
+    analysed = store.add_report({'original_text': 'Accident on Thika road', 'emergency_type': 'accident',
+                                 'severity': 'MEDIUM', 'summary_status': 'deferred',
+                                 'timestamp': '2026-10-19T10:01:00'})
+
+    surge = controller(backlog, min_dwell=0)
+    backlog.depth = 60
+    surge.update()
+    resumed = []
+    surge.on_recover(lambda: resumed.append(pipeline.resume_deferred(submit=False)))
+    backlog.depth = 0
+    assert surge.update() == FULL
+
+    assert resumed == [2]
+    assert store.get_report(raw)['summary_status'] == 'pending'
+    assert store.get_report(raw)['emergency_type'] == 'fire'
+    assert store.get_report(analysed)['summary_status'] == 'pending'
+    # Claimed once: a second recovery finds nothing left
+    assert pipeline.resume_deferred(submit=False) == 0
@@ -0,0 +1,119 @@
+"""Streaming export of stored reports.
+
+Exports are produced a chunk of reports at a time; these tests use chunks
+much smaller than the data so the streaming path is what gets exercised.
+"""
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from services import report_export
+from services.report_store import ReportStore
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ReportStore(str(tmp_path / 'reports.sqlite3'))
+    for day in range(1, 11):
+        store.add_report({
+            'timestamp': f'2026-10-{day:02d}T12:00:00',
+            'emergency_type': 'fire' if day % 2 else 'medical',
+            'severity': 'HIGH' if day <= 3 else 'LOW',
+            'original_text': f'Report, "quoted", day {day}\nsecond line',
+            'recommended_actions': ['Alert fire department', 'Evacuate surrounding areas'],
+            'call_count': day,
+        }, report_id=f'report-{day}')
+    return store
+
+
+def read_csv(pieces):
+    return list(csv.DictReader(io.StringIO(b''.join(pieces).decode('utf-8'))))
+
+
+def test_csv_is_streamed_one_piece_per_chunk(store):
+    pieces = list(report_export.iter_csv(store, {}, chunk_rows=3))
+
+    assert len(pieces) == 4  # 10 reports in chunks of 3
+    assert pieces[0].startswith(b'report_id,timestamp,')
+    rows = read_csv(pieces)
+    assert [row['report_id'] for row in rows] == [f'report-{day}' for day in range(1, 11)]
+    assert rows[0]['original_text'] == 'Report, "quoted", day 1\nsecond line'
+    assert rows[0]['recommended_actions'] == 'Alert fire department; Evacuate surrounding areas'
+
+
+def test_an_empty_export_is_just_the_header(store):
+    rows = read_csv(report_export.iter_csv(store, {'start': '2027-01-01'}, chunk_rows=3))
+    assert rows == []
+
+
+def test_filters_select_by_date_type_and_severity(store):
+    def ids(**filters):
+        return [row['report_id'] for row in read_csv(report_export.iter_csv(store, filters, chunk_rows=2))]
+
+    assert ids(start='2026-10-03', end='2026-10-06') == ['report-3', 'report-4', 'report-5']
+    assert ids(emergency_type='medical', severity='LOW') == ['report-4', 'report-6', 'report-8', 'report-10']
+    assert ids(severity='HIGH', emergency_type='fire') == ['report-1', 'report-3']
+
+
+def test_files_are_written_atomically(store, tmp_path):
+    path = tmp_path / 'export.csv'
+    size = report_export.write_export(store, str(path), 'csv', {'severity': 'HIGH'}, chunk_rows=2)
+
+    assert size == path.stat().st_size
+    assert len(read_csv([path.read_bytes()])) == 3
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+def test_parquet_has_one_row_group_per_chunk(store):
+    pq = pytest.importorskip('pyarrow.parquet')
+    data = b''.join(report_export.iter_parquet(store, {}, chunk_rows=4))
+
+    parquet = pq.ParquetFile(io.BytesIO(data))
+    assert parquet.metadata.num_row_groups == 3
+    table = parquet.read()
+    assert table.column('report_id').to_pylist() == [f'report-{day}' for day in range(1, 11)]
+    assert table.column('call_count').to_pylist() == list(range(1, 11))
+
+
+def test_export_filename_names_the_filters():
+    assert report_export.export_filename('csv', {'start': '2026-10-01T00:00:00', 'severity': 'HIGH'}) == \
+        'emergency_reports_2026-10-01_HIGH.csv'
+
+
+PROBE = """
+import json
+import app
+app.report_store.add_report({'timestamp': '2026-10-01T12:00:00', 'severity': 'HIGH'}, report_id='report-1')
+client = app.app.test_client()
+responses = {
+    'no_token': client.get('/export'),
+    'wrong_token': client.get('/export', headers={'X-Admin-Token': 'wrong'}),
+    'bad_format': client.get('/export?format=xml', headers={'X-Admin-Token': 'secret'}),
+    'csv': client.get('/export?severity=HIGH', headers={'X-Admin-Token': 'secret'}),
+}
+print(json.dumps({name: [r.status_code, r.headers.get('Content-Disposition'), r.get_data(as_text=True)]
+                  for name, r in responses.items()}))
+"""
+
+
+def test_the_endpoint_requires_the_admin_token(tmp_path):
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT, ADMIN_TOKEN='secret',
+               REPORT_DB_PATH=str(tmp_path / 'reports.sqlite3'))
+    result = subprocess.run([sys.executable, '-c', PROBE], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, check=True)
+    responses = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert responses['no_token'][0] == 403
+    assert responses['wrong_token'][0] == 403
+    assert responses['bad_format'][0] == 400
+    status, disposition, body = responses['csv']
+    assert status == 200
+    assert disposition == 'attachment; filename="emergency_reports_HIGH.csv"'
+    assert body.splitlines()[1].startswith('report-1,2026-10-01T12:00:00')
@@ -0,0 +1,93 @@
+"""Revisions and change notification of the shared report store.
+
+Readers (the dashboard, ml_worker.py) poll nothing: they remember the last
+revision they saw, block in ``wait_for_change`` and then read only
+``changes_since`` it, whether the write came from their own process or
+another one.
+"""
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from services.report_store import ReportStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ReportStore(str(tmp_path / 'reports.sqlite3'))
+
+
+def report(text, **fields):
+    return dict({'original_text': text, 'timestamp': '2026-10-19T10:00:00', 'severity': 'HIGH'}, **fields)
+
+
+def test_every_write_bumps_the_revision(store):
+    assert store.current_revision() == 0
+    first = store.add_report(report('fire'))
+    store.add_report(report('flood'))
+    assert store.current_revision() == 2
+
+    store.update_report(first, {'summary': 'Fire', 'summary_status': 'done'})
+    assert store.current_revision() == 3
+    assert [r['report_id'] for r in store.changes_since(2)] == [first]
+    assert store.changes_since(2)[0]['summary'] == 'Fire'
+    assert store.changes_since(3) == []
+
+
+def test_wait_for_change_times_out_without_writes(store):
+    store.add_report(report('fire'))
+    start = time.monotonic()
+    assert store.wait_for_change(1, timeout=0.3) == 1
+    assert time.monotonic() - start >= 0.3
+
+
+def test_writes_from_another_thread_wake_waiters(store):
+    writer = threading.Timer(0.2, store.add_report, args=(report('fire'),))
+    writer.start()
+    start = time.monotonic()
+    assert store.wait_for_change(0, timeout=10) == 1
+    assert time.monotonic() - start < 2
+    writer.join()
+
+
+def test_writes_from_another_process_are_seen(store):
+    def write():
+        time.sleep(0.2)
+        ReportStore(store.db_path).add_report(report('flood'))
+
+    writer = multiprocessing.get_context('fork').Process(target=write)
+    writer.start()
+    assert store.wait_for_change(0, timeout=10) == 1
+    writer.join(10)
+    assert store.changes_since(0)[0]['original_text'] == 'flood'
+
+
+def test_concurrent_updates_of_different_fields_are_both_kept(store):
+    report_id = store.add_report(report('fire'))
+    start = threading.Barrier(2)
+
+    def update(field):
+        start.wait()
+        for i in range(50):
+            store.update_report(report_id, {field: i})
+
+    writers = [threading.Thread(target=update, args=(field,)) for field in ('summary', 'incident_size')]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join(30)
+
+    stored = store.get_report(report_id)
+    assert (stored['summary'], stored['incident_size']) == (49, 49)
+    assert stored['original_text'] == 'fire'
+
+
+def test_adding_reports_again_keeps_later_changes(store):
+    store.add_reports({'sos-1': report('SOS button pressed (app)', summary='SOS')})
+    store.update_report('sos-1', {'transcripts': ['SOS', 'my house is on fire'], 'summary': 'House fire'})
+
+    store.add_reports({'sos-1': report('SOS button pressed (app)', summary='SOS'), 'sos-2': report('SOS')})
+    assert store.get_report('sos-1')['summary'] == 'House fire'
+    assert store.get_report('sos-2')['original_text'] == 'SOS'
@@ -0,0 +1,56 @@
+"""Import-time budget for the webhook entry point.
+
+The TwiML greeting must come up without loading any model or dashboard
+dependency. These tests run a fresh interpreter so earlier imports in the
+test session cannot hide a regression.
+"""
+import json
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STARTUP_BUDGET_SECONDS = 1.0
+
+HEAVY_MODULES = [
+    'torch', 'transformers', 'whisper', 'speech_recognition', 'pydub',
+    'gradio', 'pandas', 'matplotlib', 'seaborn', 'twilio.rest',
+]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+response = app.app.test_client().post('/emergency-call')
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    'elapsed': elapsed,
+    'status': response.status_code,
+    'body': response.get_data(as_text=True),
+    'heavy': sorted(m for m in %r if m in sys.modules),
+}))
+""" % (HEAVY_MODULES,)
+
+
+def run_probe(tmp_path):
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE], cwd=tmp_path, env=env,
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_webhook_import_loads_no_heavy_dependencies(tmp_path):
+    probe = run_probe(tmp_path)
+    assert probe['heavy'] == []
+
+
+def test_greeting_is_served_within_budget(tmp_path):
+    probe = run_probe(tmp_path)
+    assert probe['status'] == 200
+    assert '<Gather' in probe['body']
+    assert probe['elapsed'] < STARTUP_BUDGET_SECONDS, (
+        f"webhook startup took {probe['elapsed']:.2f}s, budget is {STARTUP_BUDGET_SECONDS}s"
+    )
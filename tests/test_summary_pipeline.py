@@ -0,0 +1,123 @@
+"""Summaries are queued once per report and transcript.
+
+A repeat call that adds nothing new leaves its incident ``pending`` and the
+webhook submits it again; the pipeline must hand back the summary already
+queued instead of running the model twice.
+"""
+import threading
+
+import pytest
+
+from services.ml_scheduler import MLScheduler
+from services.report_store import ReportStore
+from services.summary_pipeline import SummaryPipeline
+
+
+class SlowClassifier:
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = []
+
+    def generate_summary(self, text, language=None):
+        self.calls.append(text)
+        self.release.wait(5)
+        return f'Summary of {text}'
+
+
+class Archive:
+    def save_emergency_call(self, call_data, call_id=None):
+        return call_id
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    store = ReportStore(str(tmp_path / 'reports.sqlite3'))
+    scheduler = MLScheduler(workers=1, concurrency={'HIGH': 1, 'MEDIUM': 1, 'LOW': 1}, aging_seconds=30)
+    pipeline = SummaryPipeline(SlowClassifier(), store, Archive(), scheduler)
+    yield pipeline
+    pipeline.classifier.release.set()
+    scheduler.shutdown()
+
+
+def test_resubmitting_the_same_transcript_reuses_the_queued_summary(pipeline):
+    report_id = pipeline.store.add_report({'original_text': 'fire', 'summary_status': 'pending'})
+
+    first = pipeline.submit(report_id, 'HIGH', 'fire')
+    assert pipeline.submit(report_id, 'HIGH', 'fire') is first
+    pipeline.classifier.release.set()
+    first.result(timeout=5)
+
+    assert pipeline.classifier.calls == ['fire']
+    assert pipeline.store.get_report(report_id)['summary'] == 'Summary of fire'
+
+
+def test_new_content_is_queued_again(pipeline):
+    report_id = pipeline.store.add_report({'original_text': 'fire', 'summary_status': 'pending'})
+
+    first = pipeline.submit(report_id, 'HIGH', 'fire')
+    second = pipeline.submit(report_id, 'HIGH', 'fire spreading to the school')
+    assert second is not first
+    pipeline.classifier.release.set()
+    second.result(timeout=5)
+
+    assert pipeline.classifier.calls == ['fire', 'fire spreading to the school']
+
+
+class GatedClassifier:
+    """Each transcript's summary finishes when its own gate opens"""
+
+    def __init__(self, *texts):
+        self.gates = {text: threading.Event() for text in texts}
+
+    def generate_summary(self, text, language=None):
+        self.gates[text].wait(5)
+        return f'Summary of {text}'
+
+
+def test_a_stale_summary_leaves_the_report_pending(tmp_path):
+    store = ReportStore(str(tmp_path / 'reports.sqlite3'))
+    scheduler = MLScheduler(workers=2, concurrency={'HIGH': 2, 'MEDIUM': 1, 'LOW': 1}, aging_seconds=30)
+    classifier = GatedClassifier('fire', 'fire spreading to the school')
+    pipeline = SummaryPipeline(classifier, store, Archive(), scheduler)
+    try:
+        report_id = store.add_report({'original_text': 'fire', 'summary_status': 'pending'})
+        older = pipeline.submit(report_id, 'HIGH', 'fire')
+        # A repeat call is coalesced into the report while the first summary runs
+        store.update_report(report_id, {'original_text': 'fire spreading to the school'})
+        newer = pipeline.submit(report_id, 'HIGH', 'fire spreading to the school')
+
+        classifier.gates['fire'].set()
+        assert older.result(timeout=5) is None
+        assert store.get_report(report_id)['summary_status'] == 'pending'
+
+        classifier.gates['fire spreading to the school'].set()
+        newer.result(timeout=5)
+        stored = store.get_report(report_id)
+        assert stored['summary'] == 'Summary of fire spreading to the school'
+        assert stored['summary_status'] == 'done'
+    finally:
+        for gate in classifier.gates.values():
+            gate.set()
+        scheduler.shutdown()
+
+
+def test_a_stale_summary_finishing_last_does_not_overwrite_the_newer_one(tmp_path):
+    store = ReportStore(str(tmp_path / 'reports.sqlite3'))
+    scheduler = MLScheduler(workers=2, concurrency={'HIGH': 2, 'MEDIUM': 1, 'LOW': 1}, aging_seconds=30)
+    classifier = GatedClassifier('fire', 'fire spreading to the school')
+    pipeline = SummaryPipeline(classifier, store, Archive(), scheduler)
+    try:
+        report_id = store.add_report({'original_text': 'fire', 'summary_status': 'pending'})
+        older = pipeline.submit(report_id, 'HIGH', 'fire')
+        store.update_report(report_id, {'original_text': 'fire spreading to the school'})
+        newer = pipeline.submit(report_id, 'HIGH', 'fire spreading to the school')
+
+        classifier.gates['fire spreading to the school'].set()
+        newer.result(timeout=5)
+        classifier.gates['fire'].set()
+        older.result(timeout=5)
+        assert store.get_report(report_id)['summary'] == 'Summary of fire spreading to the school'
+    finally:
+        for gate in classifier.gates.values():
+            gate.set()
+        scheduler.shutdown()
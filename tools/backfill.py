@@ -0,0 +1,244 @@
+"""Re-run the classifier over archived reports after the models or keywords change.
+
+Streams ``emergency_<id>.json`` files from the archive, reprocesses them in
+batches across a process pool (one classifier per process) and rewrites each
+file atomically with the current ``model_version`` tag. Reports already
+carrying that tag are skipped, and every finished batch is appended to a
+checkpoint file, so an interrupted run resumes where it stopped:
+
+    python -m tools.backfill --workers 8 --batch-size 32
+
+Results are also written to the shared report store unless ``--no-store``
+is given.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from config import Config
+
+# Fields produced by the analysis; everything else (caller, call sid,
+# coalesced transcripts, incident) is kept as stored
+ANALYSIS_FIELDS = (
+    'language', 'language_confidence', 'emergency_type', 'location',
+    'severity', 'recommended_actions', 'summary',
+)
+
+_classifier = None
+
+
+def _init_worker(threads: int):
+    """Load one classifier per pool process, sized to its share of the cores"""
+    global _classifier
+    from utils.serving import limit_native_threads, configure_torch_threads
+    limit_native_threads(threads)
+    from models.emergency_classifier import EmergencyClassifier
+    _classifier = EmergencyClassifier()
+    _classifier.warm_up()
+    configure_torch_threads(threads)
+
+
+def write_atomic(path: str, report: Dict):
+    """Write to a temporary file and rename it over the original"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        # The original stays as it was; do not leave a half-written copy beside it
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def process_batch(paths: List[str], version: str) -> List[Tuple[str, Optional[Dict], Optional[str]]]:
+    """Reprocess a batch of report files; returns (report_id, report, error) per file"""
+    results = []
+    for path in paths:
+        report_id = report_id_from_path(path)
+        try:
+            with open(path, 'r') as f:
+                report = json.load(f)
+            analysis = _classifier.process_emergency_report(report.get('original_text', ''))
+            report.update({field: analysis[field] for field in ANALYSIS_FIELDS})
+            report.update({
+                'summary_status': 'done',
+                'model_version': version,
+                'reprocessed_at': datetime.now().isoformat(),
+            })
+            write_atomic(path, report)
+            results.append((report_id, report, None))
+        except Exception as e:
+            results.append((report_id, None, str(e)))
+    return results
+
+
+def report_id_from_path(path: str) -> str:
+    return os.path.basename(path)[:-len('.json')].replace('emergency_', '', 1)
+
+
+def iter_archive(data_dir: str) -> Iterator[str]:
+    """Report file paths, streamed without listing the whole directory up front"""
+    with os.scandir(data_dir) as entries:
+        for entry in entries:
+            if entry.name.startswith('emergency_') and entry.name.endswith('.json') and entry.is_file():
+                yield entry.path
+
+
+def needs_backfill(path: str, version: str) -> bool:
+    """Cheap check of the stored tag without a full parse of the report"""
+    try:
+        with open(path, 'r') as f:
+            return f'"model_version": "{version}"' not in f.read()
+    except OSError:
+        return False
+
+
+def batches(paths: Iterator[str], size: int) -> Iterator[List[str]]:
+    batch = []
+    for path in paths:
+        batch.append(path)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Checkpoint:
+    """Append-only list of finished report ids for one model version"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Set[str] = set()
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.done = {line.strip() for line in f if line.strip()}
+        self._file = open(path, 'a')
+
+    def record(self, report_ids: List[str]):
+        self._file.write(''.join(f'{report_id}\n' for report_id in report_ids))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.done.update(report_ids)
+
+    def close(self):
+        self._file.close()
+
+
+class Progress:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.started = time.perf_counter()
+        self.last_report = self.started
+        self.processed = 0
+        self.failed = 0
+
+    def update(self, processed: int, failed: int, force: bool = False):
+        self.processed += processed
+        self.failed += failed
+        now = time.perf_counter()
+        if force or now - self.last_report >= self.interval:
+            self.last_report = now
+            elapsed = now - self.started
+            print(
+                f"{self.processed} reprocessed, {self.failed} failed in {elapsed:.1f}s "
+                f"({self.processed / max(elapsed, 1e-9):.1f} reports/s)",
+                file=sys.stderr
+            )
+
+
+def run(args) -> Dict:
+    from models.emergency_classifier import EmergencyClassifier
+    version = EmergencyClassifier().model_version()
+
+    checkpoint_path = args.checkpoint or os.path.join(args.data_dir, f'.backfill-{version}.checkpoint')
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    checkpoint = Checkpoint(checkpoint_path)
+
+    store = None
+    if not args.no_store:
+        from services.report_store import ReportStore
+        store = ReportStore()
+
+    workers = args.workers or os.cpu_count() or 1
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    pending_paths = (
+        path for path in iter_archive(args.data_dir)
+        if report_id_from_path(path) not in checkpoint.done
+        and (args.force or needs_backfill(path, version))
+    )
+
+    print(f"Backfilling {args.data_dir} to model version {version} with {workers} processes",
+          file=sys.stderr)
+    progress = Progress(args.progress_interval)
+    errors = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(threads,)) as pool:
+            in_flight = set()
+            batch_iter = batches(pending_paths, args.batch_size)
+            exhausted = False
+            while in_flight or not exhausted:
+                # Keep a couple of batches queued per process, never the whole archive
+                while not exhausted and len(in_flight) < workers * 2:
+                    batch = next(batch_iter, None)
+                    if batch is None:
+                        exhausted = True
+                    else:
+                        in_flight.add(pool.submit(process_batch, batch, version))
+                if not in_flight:
+                    break
+
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    results = future.result()
+                    succeeded = {report_id: report for report_id, report, error in results if report}
+                    errors.extend((report_id, error) for report_id, _, error in results if error)
+                    if store is not None and succeeded:
+                        store.upsert_reports(succeeded)
+                    checkpoint.record(list(succeeded))
+                    progress.update(len(succeeded), len(results) - len(succeeded))
+    finally:
+        checkpoint.close()
+        progress.update(0, 0, force=True)
+
+    for report_id, error in errors[:20]:
+        print(f"Failed {report_id}: {error}", file=sys.stderr)
+
+    elapsed = time.perf_counter() - progress.started
+    return {
+        'model_version': version,
+        'processed': progress.processed,
+        'failed': progress.failed,
+        'seconds': round(elapsed, 2),
+        'reports_per_second': round(progress.processed / max(elapsed, 1e-9), 2),
+        'checkpoint': checkpoint_path,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-dir', default=Config.DATA_DIR, help='Archive of emergency_<id>.json files')
+    parser.add_argument('--workers', type=int, default=0, help='Processes (default: one per core)')
+    parser.add_argument('--batch-size', type=int, default=32, help='Reports per task')
+    parser.add_argument('--checkpoint', help='Checkpoint file (default: inside the data dir, per model version)')
+    parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+    parser.add_argument('--force', action='store_true', help='Reprocess reports already at this model version')
+    parser.add_argument('--no-store', action='store_true', help='Only rewrite the files, not the report store')
+    parser.add_argument('--progress-interval', type=float, default=5.0, help='Seconds between progress lines')
+    args = parser.parse_args(argv)
+
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == '__main__':
+    main()
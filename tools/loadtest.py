@@ -0,0 +1,264 @@
+"""Replay Twilio webhook traffic against the phone service and report latency.
+
+The harness plays Twilio's part of a call: it posts the greeting webhook
+(``/emergency-call``) and then the speech result (``/process-emergency``)
+with the same form fields Twilio sends. Calls arrive open-loop at the
+requested rate, and latency is measured from each call's scheduled start,
+so a backed-up server shows up as latency instead of a lower send rate.
+
+Against a running server (start it with STUB_MODELS=true to leave the
+models out of the measurement):
+
+    python -m tools.loadtest --url http://localhost:5000 --rate 50 --duration 60
+
+In-process through the Flask test client:
+
+    STUB_MODELS=true python -m tools.loadtest --in-process --rate 20
+
+Compare with a previous release:
+
+    python -m tools.loadtest --url ... --output new.json --baseline old.json
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, List
+
+STAGES = [
+    ('emergency-call', '/emergency-call'),
+    ('process-emergency', '/process-emergency'),
+]
+
+SYNTHETIC_TRANSCRIPTS = [
+    "There is a fire at Kibera market, the smoke is everywhere, please send help",
+    "My neighbour is bleeding badly after an attack near Gikomba, he is dying",
+    "Ajali mbaya ya gari karibu na Thika road, watu wameumia sana, haraka",
+    "Kuna moto kwa nyumba yetu Mathare, tafadhali tuma msaada",
+    "Someone broke into the shop at Westlands and the police are not here yet",
+    "Mama yangu ni mgonjwa sana, anahitaji ambulensi hapa Kawangware",
+    "The river has flooded in Budalangi and families are trapped on rooftops",
+    "Car crash in Mombasa road, two vehicles, one person is not moving, emergency",
+    "Nimeshambuliwa na watu wawili karibu na stage ya matatu, polisi tafadhali",
+    "I need a doctor, my child is sick with high fever in Kisumu",
+]
+
+
+def synthetic_calls(callers: int, repeat_ratio: float) -> Iterator[Dict[str, str]]:
+    """Endless stream of Twilio-like form posts with some repeat callers"""
+    numbers = [f"+2547{random.randint(10000000, 99999999)}" for _ in range(callers)]
+    recent = []
+    while True:
+        if recent and random.random() < repeat_ratio:
+            number = random.choice(recent)
+        else:
+            number = random.choice(numbers)
+            recent = (recent + [number])[-20:]
+        yield {
+            'SpeechResult': random.choice(SYNTHETIC_TRANSCRIPTS),
+            'From': number,
+            'CallSid': 'CA' + uuid.uuid4().hex,
+        }
+
+
+def recorded_calls(path: str) -> Iterator[Dict[str, str]]:
+    """Replay form posts recorded one JSON object per line, looping forever"""
+    with open(path, 'r') as f:
+        posts = [json.loads(line) for line in f if line.strip()]
+    if not posts:
+        raise SystemExit(f"No recorded posts in {path}")
+    while True:
+        for post in posts:
+            yield dict(post, CallSid='CA' + uuid.uuid4().hex)
+
+
+class HttpTarget:
+    """Posts to a running server, one pooled session per thread"""
+
+    def __init__(self, base_url: str, timeout: float):
+        import requests
+        self._requests = requests
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def post(self, path: str, form: Dict[str, str]):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        response = session.post(self.base_url + path, data=form, timeout=self.timeout)
+        return response.status_code, response.text
+
+
+class InProcessTarget:
+    """Posts through the Flask test client of the imported app"""
+
+    def __init__(self):
+        from app import app
+        self.app = app
+
+    def post(self, path: str, form: Dict[str, str]):
+        with self.app.test_client() as client:
+            response = client.post(path, data=form)
+            return response.status_code, response.get_data(as_text=True)
+
+
+class StageStats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.error_kinds: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, error: str = None):
+        with self._lock:
+            self.latencies.append(latency)
+            if error:
+                self.errors += 1
+                self.error_kinds[error] = self.error_kinds.get(error, 0) + 1
+
+    def report(self, elapsed: float) -> Dict:
+        ordered = sorted(self.latencies)
+        count = len(ordered)
+
+        def percentile(p):
+            if not ordered:
+                return None
+            index = min(count - 1, max(0, int(round(p / 100 * count)) - 1))
+            return round(ordered[index] * 1000, 3)
+
+        return {
+            'count': count,
+            'errors': self.errors,
+            'error_rate': round(self.errors / count, 6) if count else 0.0,
+            'error_kinds': dict(sorted(self.error_kinds.items())),
+            'throughput_rps': round((count - self.errors) / elapsed, 3) if elapsed else 0.0,
+            'latency_ms': {
+                'p50': percentile(50),
+                'p95': percentile(95),
+                'p99': percentile(99),
+                'max': round(ordered[-1] * 1000, 3) if ordered else None,
+                'mean': round(sum(ordered) / count * 1000, 3) if ordered else None,
+            },
+        }
+
+
+def run_call(target, form: Dict[str, str], scheduled: float, stats: Dict[str, StageStats]):
+    """One simulated call: greeting, then the speech result"""
+    start = scheduled
+    for stage, path in STAGES:
+        fields = {'From': form['From'], 'CallSid': form['CallSid']}
+        if stage == 'process-emergency':
+            fields['SpeechResult'] = form.get('SpeechResult', '')
+
+        error = None
+        try:
+            status, body = target.post(path, fields)
+            if status >= 400:
+                error = f'http_{status}'
+            elif '<Response>' not in body:
+                error = 'invalid_twiml'
+        except Exception as e:
+            error = type(e).__name__
+
+        end = time.perf_counter()
+        stats[stage].record(end - start, error)
+        if error:
+            return
+        start = end
+
+
+def run(args) -> Dict:
+    target = InProcessTarget() if args.in_process else HttpTarget(args.url, args.timeout)
+    calls = recorded_calls(args.replay) if args.replay else synthetic_calls(
+        args.callers, args.repeat_ratio
+    )
+    stats = {stage: StageStats() for stage, _ in STAGES}
+
+    total = int(args.rate * args.duration)
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        scheduled = began
+        for _ in range(total):
+            if args.arrival == 'poisson':
+                scheduled += random.expovariate(args.rate)
+            else:
+                scheduled += 1.0 / args.rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(run_call, target, next(calls), scheduled, stats)
+    elapsed = time.perf_counter() - began
+
+    return {
+        'generated_at': datetime.now().isoformat(),
+        'config': {
+            'target': 'in-process' if args.in_process else args.url,
+            'rate': args.rate,
+            'duration': args.duration,
+            'arrival': args.arrival,
+            'concurrency': args.concurrency,
+            'source': args.replay or 'synthetic',
+        },
+        'elapsed_s': round(elapsed, 3),
+        'stages': {stage: stats[stage].report(elapsed) for stage, _ in STAGES},
+    }
+
+
+def compare(report: Dict, baseline: Dict) -> List[str]:
+    """Per-stage deltas against a previous report, for release-to-release diffs"""
+    lines = []
+    for stage, current in report['stages'].items():
+        previous = baseline.get('stages', {}).get(stage)
+        if not previous:
+            continue
+        for metric in ('p50', 'p95', 'p99'):
+            old, new = previous['latency_ms'][metric], current['latency_ms'][metric]
+            if old and new is not None:
+                lines.append(f"{stage} {metric}: {old:.1f} -> {new:.1f} ms ({(new - old) / old:+.1%})")
+        lines.append(
+            f"{stage} throughput: {previous['throughput_rps']} -> {current['throughput_rps']} rps"
+        )
+        lines.append(f"{stage} error_rate: {previous['error_rate']} -> {current['error_rate']}")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--url', default='http://localhost:5000', help='Base URL of a running server')
+    target.add_argument('--in-process', action='store_true', help='Use the Flask test client')
+    parser.add_argument('--rate', type=float, default=10.0, help='Calls per second')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds of traffic to send')
+    parser.add_argument('--arrival', choices=['poisson', 'constant'], default='poisson')
+    parser.add_argument('--concurrency', type=int, default=64, help='Maximum calls in flight')
+    parser.add_argument('--timeout', type=float, default=15.0, help='Per-request timeout (HTTP target)')
+    parser.add_argument('--replay', help='JSONL file of recorded form posts to replay')
+    parser.add_argument('--callers', type=int, default=500, help='Distinct synthetic caller numbers')
+    parser.add_argument('--repeat-ratio', type=float, default=0.1, help='Share of synthetic repeat calls')
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    parser.add_argument('--baseline', help='Previous JSON report to compare against')
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        for line in compare(report, baseline):
+            print(line, file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
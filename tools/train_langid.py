@@ -0,0 +1,114 @@
+"""Train the character n-gram language identifier shipped in utils/langid_model.npz.
+
+Reads one sentence per line from tools/langid_corpus/<language>.txt, adds
+random word windows so short utterances are represented, and fits a
+softmax regression over the hashed n-gram features with plain NumPy
+gradient descent. Re-run after extending the corpus:
+
+    python -m tools.train_langid
+"""
+import argparse
+import os
+import random
+import numpy as np
+from utils.langid import MODEL_PATH, NUM_BUCKETS, featurize, LanguageIdentifier
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'langid_corpus')
+
+
+def load_corpus(corpus_dir: str):
+    corpus = {}
+    for filename in sorted(os.listdir(corpus_dir)):
+        if filename.endswith('.txt'):
+            with open(os.path.join(corpus_dir, filename), 'r', encoding='utf-8') as f:
+                corpus[filename[:-len('.txt')]] = [line.strip() for line in f if line.strip()]
+    return corpus
+
+
+def augment(sentences, windows_per_sentence: int, rng: random.Random):
+    """Whole sentences plus random 1-6 word windows of them"""
+    samples = list(sentences)
+    for sentence in sentences:
+        words = sentence.split()
+        for _ in range(windows_per_sentence):
+            size = rng.randint(1, min(6, len(words)))
+            start = rng.randint(0, len(words) - size)
+            samples.append(' '.join(words[start:start + size]))
+    return samples
+
+
+def train(features, labels, num_languages, epochs, learning_rate, l2):
+    weights = np.zeros((features.shape[1], num_languages), dtype=np.float32)
+    bias = np.zeros(num_languages, dtype=np.float32)
+    targets = np.eye(num_languages, dtype=np.float32)[labels]
+
+    for _ in range(epochs):
+        scores = features @ weights + bias
+        scores -= scores.max(axis=1, keepdims=True)
+        probabilities = np.exp(scores)
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        error = (probabilities - targets) / len(labels)
+        weights -= learning_rate * (features.T @ error + l2 * weights)
+        bias -= learning_rate * error.sum(axis=0)
+    return weights, bias
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=CORPUS_DIR)
+    parser.add_argument('--output', default=MODEL_PATH)
+    parser.add_argument('--windows', type=int, default=8, help='Random word windows per sentence')
+    parser.add_argument('--epochs', type=int, default=400)
+    parser.add_argument('--learning-rate', type=float, default=20.0)
+    parser.add_argument('--l2', type=float, default=1e-4)
+    parser.add_argument('--seed', type=int, default=13)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    corpus = load_corpus(args.corpus)
+    languages = sorted(corpus)
+
+    # Hold out every fifth sentence to report accuracy
+    train_texts, train_labels, test_texts, test_labels = [], [], [], []
+    for index, language in enumerate(languages):
+        sentences = corpus[language]
+        held_out = sentences[::5]
+        kept = [s for i, s in enumerate(sentences) if i % 5]
+        for text in augment(kept, args.windows, rng):
+            train_texts.append(text)
+            train_labels.append(index)
+        for text in augment(held_out, 2, rng):
+            test_texts.append(text)
+            test_labels.append(index)
+
+    weights, bias = train(
+        featurize(train_texts), np.array(train_labels), len(languages),
+        args.epochs, args.learning_rate, args.l2
+    )
+    predicted = (featurize(test_texts) @ weights + bias).argmax(axis=1)
+    print(f"Held-out accuracy: {(predicted == np.array(test_labels)).mean():.3f} on {len(test_texts)} texts")
+
+    # Refit on everything for the shipped model
+    all_texts, all_labels = [], []
+    for index, language in enumerate(languages):
+        for text in augment(corpus[language], args.windows, rng):
+            all_texts.append(text)
+            all_labels.append(index)
+    weights, bias = train(
+        featurize(all_texts), np.array(all_labels), len(languages),
+        args.epochs, args.learning_rate, args.l2
+    )
+
+    np.savez_compressed(
+        args.output,
+        weights=weights.astype(np.float16),
+        bias=bias,
+        languages=np.array(languages),
+        num_buckets=np.array(NUM_BUCKETS),
+    )
+    identifier = LanguageIdentifier(args.output)
+    print(f"Saved {args.output} ({os.path.getsize(args.output)} bytes), languages: {identifier.languages}")
+
+
+if __name__ == '__main__':
+    main()
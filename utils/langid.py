@@ -0,0 +1,107 @@
+"""Character n-gram language identification for English and Swahili.
+
+Texts are turned into hashed character n-gram counts and scored with a
+small linear model (one weight column per language) trained offline by
+``tools/train_langid.py`` and shipped as ``utils/langid_model.npz``. A
+whole batch is hashed with NumPy array arithmetic and scored with one
+matrix multiply, so scoring many transcripts costs little more than one.
+Code-switched text is assigned to the language that dominates it, so Sheng
+(Swahili with English words mixed in) is mostly detected as Swahili. The
+probabilities are the model's confidence in that choice, not the share of
+each language in the text.
+"""
+import os
+import re
+import threading
+from typing import Dict, List, Sequence
+import numpy as np
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'langid_model.npz')
+
+NGRAM_SIZES = (1, 2, 3, 4)
+NUM_BUCKETS = 4096
+SEPARATOR = 0  # byte between texts; n-grams spanning it are dropped
+_HASH_MULTIPLIER = np.uint64(1099511628211)  # FNV-1a 64-bit prime
+_SIZE_SALT = np.uint64(0x9E3779B97F4A7C15)
+
+
+def normalize(text: str) -> str:
+    """Lowercase, keep letters only and pad with spaces as word boundaries"""
+    return ' ' + ' '.join(re.sub(r'[^\w\s]|[\d_]', ' ', text.lower()).split()) + ' '
+
+
+def featurize(texts: Sequence[str], num_buckets: int = NUM_BUCKETS) -> np.ndarray:
+    """L2-normalized hashed n-gram counts, one row per text"""
+    encoded = [normalize(text).encode('utf-8') for text in texts]
+    data = np.frombuffer(bytes([SEPARATOR]).join(encoded), dtype=np.uint8).astype(np.uint64)
+    lengths = np.array([len(e) + 1 for e in encoded], dtype=np.int64)
+    rows = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)[:len(data)]
+    separators = np.concatenate([[0], np.cumsum(data == SEPARATOR)])
+
+    flat = []
+    with np.errstate(over='ignore'):
+        for n in NGRAM_SIZES:
+            count = len(data) - n + 1
+            if count <= 0:
+                continue
+            hashes = np.full(count, n, dtype=np.uint64) * _SIZE_SALT
+            for k in range(n):
+                hashes = (hashes ^ data[k:k + count]) * _HASH_MULTIPLIER
+            # Drop n-grams that straddle two texts
+            valid = separators[n:n + count] == separators[:count]
+            buckets = (hashes[valid] % np.uint64(num_buckets)).astype(np.int64)
+            flat.append(rows[:count][valid] * num_buckets + buckets)
+
+    counts = np.bincount(
+        np.concatenate(flat) if flat else np.zeros(0, dtype=np.int64),
+        minlength=len(texts) * num_buckets
+    ).reshape(len(texts), num_buckets).astype(np.float32)
+    norms = np.linalg.norm(counts, axis=1, keepdims=True)
+    return counts / np.maximum(norms, 1e-12)
+
+
+class LanguageIdentifier:
+    def __init__(self, path: str = MODEL_PATH):
+        with np.load(path) as model:
+            self.weights = model['weights'].astype(np.float32)
+            self.bias = model['bias'].astype(np.float32)
+            self.languages = [str(language) for language in model['languages']]
+            self.num_buckets = int(model['num_buckets'])
+
+    def predict_proba(self, texts: Sequence[str]) -> np.ndarray:
+        """(len(texts), len(languages)) array of probabilities"""
+        if not texts:
+            return np.zeros((0, len(self.languages)), dtype=np.float32)
+        scores = featurize(texts, self.num_buckets) @ self.weights + self.bias
+        scores -= scores.max(axis=1, keepdims=True)
+        exp = np.exp(scores)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def confidences(self, texts: Sequence[str]) -> List[Dict[str, float]]:
+        return [
+            {language: float(p) for language, p in zip(self.languages, row)}
+            for row in self.predict_proba(texts)
+        ]
+
+    def detect(self, texts: Sequence[str], default: str = 'en') -> List[str]:
+        """Most likely language per text; texts without letters get the default"""
+        probabilities = self.predict_proba(texts)
+        best = probabilities.argmax(axis=1) if len(texts) else []
+        return [
+            self.languages[index] if normalize(text).strip() else default
+            for text, index in zip(texts, best)
+        ]
+
+
+_identifier = None
+_identifier_lock = threading.Lock()
+
+
+def get_identifier() -> LanguageIdentifier:
+    """Process-wide identifier, loaded on first use"""
+    global _identifier
+    if _identifier is None:
+        with _identifier_lock:
+            if _identifier is None:
+                _identifier = LanguageIdentifier()
+    return _identifier
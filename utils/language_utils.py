@@ -1,16 +1,18 @@
+from typing import Dict, List
+from utils.langid import get_identifier
+
+
 def detect_language(text: str) -> str:
-    """Simple language detection for Swahili vs English"""
-    swahili_indicators = [
-        'ni', 'na', 'wa', 'ya', 'za', 'la', 'pa', 'kwa', 'katika', 
-        'mimi', 'wewe', 'yeye', 'sisi', 'ninyi', 'wao',
-        'dharura', 'msaada', 'polisi', 'hospitali', 'daktari'
-    ]
-    
-    text_lower = text.lower()
-    swahili_count = sum(1 for word in swahili_indicators if word in text_lower)
-    
-    # Simple heuristic: if more than 2 Swahili indicators, classify as Swahili
-    return 'sw' if swahili_count > 2 else 'en'
+    """Language detection for Swahili vs English (character n-gram model)"""
+    return get_identifier().detect([text])[0]
+
+def detect_languages(texts: List[str]) -> List[str]:
+    """Batch language detection; scores every text in one matrix multiply"""
+    return get_identifier().detect(texts)
+
+def language_confidence(text: str) -> Dict[str, float]:
+    """Per-language probabilities, e.g. {'en': 0.1, 'sw': 0.9}"""
+    return get_identifier().confidences([text])[0]
 
 def get_response_text(message_key: str, language: str = 'en') -> str:
     """Get localized response text"""
@@ -26,6 +28,10 @@ def get_response_text(message_key: str, language: str = 'en') -> str:
         'no_input': {
             'en': "We didn't receive your message. Please call again.",
             'sw': "Hatukupokea ujumbe wako. Tafadhali piga simu tena."
+        },
+        'reference': {
+            'en': "Reference number",
+            'sw': "Nambari ya kumbukumbu"
         }
     }
     
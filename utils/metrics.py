@@ -0,0 +1,439 @@
+"""Minimal Prometheus instrumentation for the hot path.
+
+Metrics are rendered in the Prometheus text exposition format by
+``render()``. A single process keeps its values in memory. Under pre-forked
+gunicorn, ``use_directory()`` (called from gunicorn.conf.py) makes every
+process also write its values to its own memory-mapped file in
+``METRICS_DIR``; whichever worker is scraped adds up the files of all of
+them, so one scrape covers the whole server. Counters and histograms of
+exited workers keep counting towards the totals; their gauges are dropped.
+When ``Config.METRICS_ENABLED`` is false every timer and counter returns
+before touching a lock, so instrumentation costs one attribute check.
+"""
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from config import Config
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Timer:
+    """Context manager and decorator that observes elapsed seconds"""
+
+    def __init__(self, histogram: 'Histogram', labels: Tuple[str, ...]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class _ValueFile:
+    """One process's metric values in a memory-mapped file other processes read.
+
+    Layout: the bytes in use (int64), then entries of key length (int32),
+    UTF-8 key padded to 8 bytes and value (float64). Only the owning process
+    writes, and an entry is complete before the header counts it.
+    """
+    INITIAL_SIZE = 64 * 1024
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'w+b')
+        self._file.truncate(self.INITIAL_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), self.INITIAL_SIZE)
+        self._used = 8
+        struct.pack_into('q', self._map, 0, self._used)
+        self._positions: Dict[str, int] = {}
+
+    def write(self, key: str, value: float):
+        position = self._positions.get(key)
+        if position is None:
+            position = self._append(key)
+        struct.pack_into('d', self._map, position, value)
+
+    def _append(self, key: str) -> int:
+        encoded = key.encode('utf-8')
+        padded = len(encoded) + (-(4 + len(encoded)) % 8)
+        entry = struct.pack(f'i{padded}sd', len(encoded), encoded, 0.0)
+        if self._used + len(entry) > len(self._map):
+            size = max(2 * len(self._map), self._used + len(entry))
+            self._file.truncate(size)
+            self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), size)
+        self._map[self._used:self._used + len(entry)] = entry
+        position = self._used + 4 + padded
+        self._used += len(entry)
+        struct.pack_into('q', self._map, 0, self._used)
+        self._positions[key] = position
+        return position
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    @staticmethod
+    def read(path: str) -> Iterator[Tuple[str, float]]:
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return  # a gauge file removed with its worker
+        used = struct.unpack_from('q', data, 0)[0] if len(data) >= 8 else 0
+        position = 8
+        while position < min(used, len(data)):
+            length = struct.unpack_from('i', data, position)[0]
+            position += 4
+            key = data[position:position + length].decode('utf-8')
+            position += length + (-(4 + length) % 8)
+            yield key, struct.unpack_from('d', data, position)[0]
+            position += 8
+
+
+class Registry:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.directory: Optional[str] = None
+        self._metrics: List = []
+        self._lock = threading.Lock()
+        self._files: Dict[str, _ValueFile] = {}
+        self._pid = None
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def use_directory(self, directory: str):
+        """Share values between processes through files in directory (cleared first)"""
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, '*.db')):
+            os.remove(path)
+        if self.directory is None:
+            os.register_at_fork(after_in_child=self._after_fork)
+        self.directory = directory
+
+    def _after_fork(self):
+        if self.directory is None:
+            return
+        # What the parent counted is in the parent's file; start this process from zero
+        self._lock = threading.Lock()
+        self._files = {}
+        self._pid = None
+        for metric in self._metrics:
+            metric.reset()
+
+    def write(self, kind: str, key: str, value: float):
+        """Mirror a value into this process's file of the given kind"""
+        if self.directory is None:
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._files = {}
+                threading.Thread(target=self._publish_gauges, name='metrics-gauges', daemon=True).start()
+            value_file = self._files.get(kind)
+            if value_file is None:
+                name = f'{kind}_{os.getpid()}_{uuid.uuid4().hex[:8]}.db'
+                value_file = self._files[kind] = _ValueFile(os.path.join(self.directory, name))
+            value_file.write(key, value)
+
+    def _publish_gauges(self):
+        """Callback gauges only run in their own process; write them out periodically"""
+        while True:
+            for metric in list(self._metrics):
+                if isinstance(metric, Gauge):
+                    metric.publish()
+            time.sleep(Config.METRICS_GAUGE_INTERVAL)
+
+    def _collect(self) -> Dict[str, List[float]]:
+        """Every process's values by key"""
+        values: Dict[str, List[float]] = {}
+        for path in glob.glob(os.path.join(self.directory, '*.db')):
+            for key, value in _ValueFile.read(path):
+                values.setdefault(key, []).append(value)
+        return values
+
+    def render(self) -> str:
+        shared = None
+        if self.directory is not None:
+            for metric in list(self._metrics):
+                if isinstance(metric, Gauge):
+                    metric.publish()
+            shared = self._collect()
+        lines = []
+        for metric in list(self._metrics):
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples(shared))
+        return '\n'.join(lines) + '\n'
+
+
+def _key(name: str, labels: Tuple[str, ...], *extra) -> str:
+    return json.dumps([name, list(labels)] + list(extra))
+
+
+def _shared_series(shared: Dict[str, List[float]], name: str) -> Iterator[Tuple[tuple, list, List[float]]]:
+    """(labels, extra, values from every process) of one metric"""
+    for key, values in shared.items():
+        parts = json.loads(key)
+        if parts[0] == name:
+            yield tuple(parts[1]), parts[2:], values
+
+
+def mark_process_dead(pid: int, directory: str = None):
+    """Drop an exited worker's gauges; its counters keep counting towards the totals"""
+    directory = directory or REGISTRY.directory
+    if directory:
+        for path in glob.glob(os.path.join(directory, f'gauge_{pid}_*.db')):
+            os.remove(path)
+
+
+REGISTRY = Registry(enabled=Config.METRICS_ENABLED)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Registry = REGISTRY):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.registry = registry
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def inc(self, *labels: str, amount: float = 1):
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            value = self._values[labels] = self._values.get(labels, 0) + amount
+            if self.registry.directory is not None:
+                self.registry.write('counter', _key(self.name, labels), value)
+
+    def value(self, *labels: str) -> float:
+        """This process's count"""
+        return self._values.get(labels, 0)
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def samples(self, shared: Dict[str, List[float]] = None) -> List[str]:
+        if shared is None:
+            with self._lock:
+                items = sorted(self._values.items())
+        else:
+            items = sorted((labels, sum(values)) for labels, _, values in _shared_series(shared, self.name))
+        return [
+            f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+            for labels, value in items
+        ]
+
+
+class Gauge:
+    """Gauge that is either set directly or read from a callback at scrape time.
+
+    With several processes their values are combined with ``aggregate``,
+    'max' or 'sum'.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Registry = REGISTRY, aggregate: str = 'max'):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.registry = registry
+        self.aggregate = {'max': max, 'sum': sum}[aggregate]
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._callbacks: List[Callable[[], Dict[Tuple[str, ...], float]]] = []
+        registry.register(self)
+
+    def set(self, value: float, *labels: str):
+        if self.registry.enabled:
+            self._values[labels] = value
+            if self.registry.directory is not None:
+                self.registry.write('gauge', _key(self.name, labels), value)
+
+    def set_function(self, fn: Callable[[], Dict[Tuple[str, ...], float]]):
+        """fn returns {label_values: value} and is only called when scraped"""
+        self._callbacks.append(fn)
+
+    def _current(self) -> Dict[Tuple[str, ...], float]:
+        values = dict(self._values)
+        for fn in self._callbacks:
+            try:
+                values.update(fn())
+            except Exception:
+                continue
+        return values
+
+    def publish(self):
+        """Write the callbacks' current values to this process's file"""
+        if self.registry.enabled and self._callbacks:
+            for labels, value in self._current().items():
+                self.registry.write('gauge', _key(self.name, labels), value)
+
+    def reset(self):
+        self._values = {}
+
+    def samples(self, shared: Dict[str, List[float]] = None) -> List[str]:
+        if shared is None:
+            values = self._current()
+        else:
+            values = {labels: self.aggregate(found) for labels, _, found in _shared_series(shared, self.name)}
+        return [
+            f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+            for labels, value in sorted(values.items())
+        ]
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Registry = REGISTRY):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.registry = registry
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # labels -> [bucket counts..., sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def observe(self, value: float, *labels: str):
+        if not self.registry.enabled:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0]
+            series[index] += 1
+            series[-1] += value
+            if self.registry.directory is not None:
+                self.registry.write('counter', _key(self.name, labels, index), series[index])
+                self.registry.write('counter', _key(self.name, labels, 'sum'), series[-1])
+
+    def time(self, *labels: str):
+        """Context manager timing a block"""
+        if not self.registry.enabled:
+            return NULL_TIMER
+        return _Timer(self, labels)
+
+    def count(self, *labels: str) -> int:
+        """This process's observations"""
+        series = self._series.get(labels)
+        return int(sum(series[:-1])) if series else 0
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def samples(self, shared: Dict[str, List[float]] = None) -> List[str]:
+        if shared is None:
+            with self._lock:
+                items = sorted((labels, list(series)) for labels, series in self._series.items())
+        else:
+            merged: Dict[Tuple[str, ...], List[float]] = {}
+            for labels, (slot,), values in _shared_series(shared, self.name):
+                series = merged.setdefault(labels, [0] * len(self.buckets) + [0.0])
+                series[-1 if slot == 'sum' else slot] = sum(values) if slot == 'sum' else int(sum(values))
+            items = sorted(merged.items())
+        lines = []
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series[:-1]):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {series[-1]!r}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+# Shared metrics for the voice pipeline
+
+STAGE_SECONDS = Histogram(
+    'eveshield_stage_seconds', 'Time spent in each processing stage', ['stage']
+)
+REQUEST_SECONDS = Histogram(
+    'eveshield_http_request_seconds', 'Flask request latency', ['endpoint', 'status']
+)
+MODEL_LOAD_SECONDS = Gauge(
+    'eveshield_model_load_seconds', 'Seconds taken to load each model', ['model']
+)
+QUEUE_DEPTH = Gauge(
+    'eveshield_queue_depth', 'Jobs waiting in a work queue', ['queue', 'severity'], aggregate='sum'
+)
+CACHE_REQUESTS = Counter(
+    'eveshield_cache_requests_total', 'Cache lookups by result', ['cache', 'result']
+)
+
+
+def timed(stage: str):
+    """Decorator recording a function's duration under eveshield_stage_seconds"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not REGISTRY.enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                STAGE_SECONDS.observe(time.perf_counter() - start, stage)
+        return wrapper
+    return decorator
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+def use_directory(directory: str):
+    REGISTRY.use_directory(directory)
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
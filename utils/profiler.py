@@ -0,0 +1,183 @@
+"""Low-overhead sampling profiler for live processes.
+
+The sampling thread snapshots every other thread's stack with
+``sys._current_frames()`` at a fixed interval and counts identical stacks.
+Nothing is installed into the interpreter's trace hooks, so the profiled
+code runs at full speed; the cost is one stack walk per thread per sample.
+Results export as collapsed stacks (for flamegraph.pl / speedscope) or as a
+speedscope JSON document.
+"""
+import cProfile
+import hmac
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Tuple
+from config import Config
+
+# Only one capture per process at a time keeps the overhead bounded
+_capture_lock = threading.Lock()
+
+# Sampling faster than this costs more than it tells; slower is barely a profile
+MIN_INTERVAL = 0.001
+MAX_INTERVAL = 1.0
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self.duration = 0.0
+
+    def _snapshot(self, names: Dict[int, str], own_ident: int):
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.append(names.get(ident, f'thread-{ident}'))
+            self.samples[tuple(reversed(stack))] += 1
+
+    def run(self, seconds: float):
+        """Sample all threads for the given number of seconds (blocking)"""
+        if not _capture_lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already being captured in this process")
+        try:
+            return self._sample(seconds)
+        finally:
+            _capture_lock.release()
+
+    def _sample(self, seconds: float):
+        """run() for a caller already holding the capture lock"""
+        own_ident = threading.get_ident()
+        started = time.perf_counter()
+        deadline = started + seconds
+        while time.perf_counter() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            self._snapshot(names, own_ident)
+            self.sample_count += 1
+            time.sleep(self.interval)
+        self.duration = time.perf_counter() - started
+        return self
+
+    def to_collapsed(self) -> str:
+        """Brendan Gregg's collapsed-stack format: one 'a;b;c count' line per stack"""
+        return ''.join(
+            ';'.join(frame.replace(';', ':') for frame in stack) + f' {count}\n'
+            for stack, count in self.samples.most_common()
+        )
+
+    def to_speedscope(self, name: str = 'eveshield') -> str:
+        """speedscope 'sampled' profile with one weight unit per sample interval"""
+        frames, frame_index = [], {}
+        samples, weights = [], []
+        for stack, count in self.samples.items():
+            indices = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    frames.append({'name': frame})
+                indices.append(frame_index[frame])
+            samples.append(indices)
+            weights.append(count * self.interval)
+
+        return json.dumps({
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': sum(weights),
+                'samples': samples,
+                'weights': weights,
+            }],
+            'name': name,
+            'exporter': 'eveshield-sampling-profiler',
+        })
+
+
+def _profile_filename(fmt: str) -> str:
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    suffix = 'speedscope.json' if fmt == 'speedscope' else 'collapsed.txt'
+    return f'profile-{os.getpid()}-{stamp}.{suffix}'
+
+
+def _clamp(value, default: float, low: float, high: float) -> float:
+    value = default if value is None else float(value)
+    return min(max(value, low), high) if math.isfinite(value) else default
+
+
+def _profiler(seconds: float, interval: float = None) -> Tuple['SamplingProfiler', float]:
+    """A profiler with the request's interval and duration held to sane bounds"""
+    seconds = _clamp(seconds, 10.0, 0.1, Config.PROFILE_MAX_SECONDS)
+    return SamplingProfiler(_clamp(interval, Config.PROFILE_INTERVAL, MIN_INTERVAL, MAX_INTERVAL)), seconds
+
+
+def capture(seconds: float, fmt: str = 'collapsed', interval: float = None) -> Tuple[str, str]:
+    """Profile the whole process, blocking the caller; returns (body, filename)"""
+    profiler, seconds = _profiler(seconds, interval)
+    profiler.run(seconds)
+    body = profiler.to_speedscope() if fmt == 'speedscope' else profiler.to_collapsed()
+    return body, _profile_filename(fmt)
+
+
+def start_capture(seconds: float, fmt: str = 'collapsed', interval: float = None) -> str:
+    """Profile in a background thread and write the result to PROFILE_DIR.
+
+    Returns the file name right away, so a single-threaded worker can keep
+    serving the traffic being profiled. The file appears once the capture
+    is complete. The capture lock is taken here, so of two concurrent
+    requests exactly one gets ProfilerBusy.
+    """
+    profiler, seconds = _profiler(seconds, interval)
+    filename = _profile_filename(fmt)
+    if not _capture_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already being captured in this process")
+
+    def run():
+        try:
+            profiler._sample(seconds)
+        finally:
+            _capture_lock.release()
+        body = profiler.to_speedscope() if fmt == 'speedscope' else profiler.to_collapsed()
+        path = os.path.join(Config.PROFILE_DIR, filename)
+        with open(path + '.tmp', 'w') as f:
+            f.write(body)
+        os.replace(path + '.tmp', path)
+
+    try:
+        os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+        threading.Thread(target=run, name='sampling-profiler', daemon=True).start()
+    except BaseException:
+        _capture_lock.release()
+        raise
+    return filename
+
+
+def is_admin(token: str) -> bool:
+    """Profiling is disabled unless ADMIN_TOKEN is configured"""
+    return bool(Config.ADMIN_TOKEN) and hmac.compare_digest(token or '', Config.ADMIN_TOKEN)
+
+
+def save_cprofile(profile: cProfile.Profile, label: str) -> str:
+    """Dump a per-request cProfile to PROFILE_DIR; returns the path"""
+    os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+    path = os.path.join(
+        Config.PROFILE_DIR, f"{label}-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}.prof"
+    )
+    profile.dump_stats(path)
+    return path
@@ -0,0 +1,42 @@
+import gc
+import os
+from config import Config
+
+
+def worker_thread_count() -> int:
+    """Intra-op threads each worker may use without oversubscribing the node"""
+    if Config.TORCH_THREADS_PER_WORKER > 0:
+        return Config.TORCH_THREADS_PER_WORKER
+    cores = os.cpu_count() or 1
+    return max(1, cores // max(1, Config.WEB_WORKERS))
+
+
+def limit_native_threads(threads: int):
+    """Cap OpenMP/MKL pools; must run before torch is first imported"""
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ.setdefault(var, str(threads))
+
+
+def configure_torch_threads(threads: int):
+    """Apply the per-worker thread budget inside a freshly forked worker"""
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Only settable before the first inter-op parallel work in this process
+        pass
+
+
+def freeze_shared_heap():
+    """Move preloaded objects out of the GC's reach before forking.
+
+    Model weights live in tensor storage that workers only read, but a full
+    collection in a child touches every tracked object header and would
+    copy those pages. Freezing keeps them shared copy-on-write.
+    """
+    gc.collect()
+    gc.freeze()
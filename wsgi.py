@@ -0,0 +1,8 @@
+"""WSGI entry point for the phone webhook (see gunicorn.conf.py)"""
+from config import Config
+from app import app, classifier
+
+# With preload_app the master runs this before forking, so the weights are
+# shared copy-on-write. In worker mode the webhook never needs the models.
+if Config.PRELOAD_MODELS and Config.ML_MODE == 'inline':
+    classifier.warm_up()